@@ -0,0 +1,288 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Optional, Tuple
+
+from config import CACHE_EXPIRY, CACHE_ACCESS_RESOLUTION
+
+# (key, value, timestamp, ttl)
+CacheRecord = Tuple[str, Any, float, float]
+
+_NUMBER = r'(-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)'
+# set() 寫入的檔頭，也接受舊版縮排且沒有 ttl 的寫法
+_JSON_HEADER = re.compile(
+    r'\s*\{\s*"timestamp"\s*:\s*' + _NUMBER + r'\s*,\s*(?:"ttl"\s*:\s*' + _NUMBER + r'\s*,\s*)?"data"\s*:'
+)
+JSON_HEADER_BYTES = 128
+
+
+class CacheBackend(ABC):
+    """快取儲存後端介面"""
+
+    @abstractmethod
+    def get_entry(self, key: str) -> Optional[Tuple[Any, float]]:
+        """取得未過期的 (資料, 到期時間)，不存在或已過期時回傳 None"""
+        pass
+
+    def get(self, key: str) -> Optional[Any]:
+        entry = self.get_entry(key)
+        return None if entry is None else entry[0]
+
+    @abstractmethod
+    def set(self, key: str, value: Any, timestamp: float, ttl: float) -> None:
+        pass
+
+    @abstractmethod
+    def delete(self, key: str) -> bool:
+        pass
+
+    @abstractmethod
+    def purge_expired(self) -> int:
+        """刪除所有已過期的項目，回傳刪除數量"""
+        pass
+
+    def set_many(self, records: Iterable[CacheRecord]) -> None:
+        with self.batch():
+            for key, value, timestamp, ttl in records:
+                self.set(key, value, timestamp, ttl)
+
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        """批次寫入，預設不做任何處理"""
+        yield
+
+    def close(self) -> None:
+        pass
+
+
+class JSONFileBackend(CacheBackend):
+    """每個鍵值一個 JSON 檔案 (原本的儲存格式)"""
+
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def _get_cache_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    @staticmethod
+    def parse_header(head: bytes) -> Optional[Tuple[float, float, bool]]:
+        """由檔案開頭解析 (寫入時間, ttl, 是否為目前的緊湊格式)，不是標準檔頭時回傳 None"""
+        match = _JSON_HEADER.match(head.decode('utf-8', 'ignore'))
+        if match is None:
+            return None
+        timestamp, ttl = match.groups()
+        compact = ttl is not None and head.startswith(b'{"timestamp":')
+        return float(timestamp), float(ttl) if ttl is not None else CACHE_EXPIRY, compact
+
+    @classmethod
+    def read_metadata(cls, path: Path) -> Optional[Tuple[float, float]]:
+        """只讀取檔頭取得 (寫入時間, ttl)，不解析資料本身"""
+        with Path(path).open('rb') as f:
+            header = cls.parse_header(f.read(JSON_HEADER_BYTES))
+        return None if header is None else header[:2]
+
+    def get_entry(self, key: str) -> Optional[Tuple[Any, float]]:
+        cache_path = self._get_cache_path(key)
+        try:
+            with cache_path.open('r', encoding='utf-8') as f:
+                cached_data = json.load(f)
+                accessed_at = os.fstat(f.fileno()).st_atime
+        except FileNotFoundError:
+            return None
+
+        now = time.time()
+        expires_at = cached_data['timestamp'] + cached_data.get('ttl', CACHE_EXPIRY)
+        if now > expires_at:
+            return None
+
+        # 以存取時間記錄最近使用，維護工具據此淘汰最久未使用的項目
+        if now - accessed_at > CACHE_ACCESS_RESOLUTION:
+            try:
+                os.utime(cache_path, (now, os.stat(cache_path).st_mtime))
+            except OSError:
+                pass
+        return cached_data['data'], expires_at
+
+    def write_temp_file(self, key: str, value: Any, timestamp: float, ttl: float) -> Path:
+        """將項目寫入同目錄的暫存檔並回傳路徑，由呼叫端以 os.replace 換成正式檔案"""
+        cache_path = self._get_cache_path(key)
+        # 後設資料放在最前面，維護工具只需讀取檔頭即可判斷是否過期
+        cache_data = {
+            'timestamp': timestamp,
+            'ttl': ttl,
+            'data': value
+        }
+
+        tmp_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with tmp_path.open('w', encoding='utf-8') as f:
+            json.dump(cache_data, f, ensure_ascii=False, separators=(',', ':'))
+        return tmp_path
+
+    def set(self, key: str, value: Any, timestamp: float, ttl: float) -> None:
+        # 先寫入暫存檔再替換，讀取端不會看到寫到一半的檔案
+        os.replace(self.write_temp_file(key, value, timestamp, ttl), self._get_cache_path(key))
+
+    def delete(self, key: str) -> bool:
+        try:
+            self._get_cache_path(key).unlink()
+            return True
+        except FileNotFoundError:
+            return False
+
+    def purge_expired(self) -> int:
+        now = time.time()
+        removed = 0
+        for file_path in self.cache_dir.glob('*.json'):
+            try:
+                metadata = self.read_metadata(file_path)
+                if metadata is None:
+                    with file_path.open('r', encoding='utf-8') as f:
+                        cached_data = json.load(f)
+                    metadata = cached_data['timestamp'], cached_data.get('ttl', CACHE_EXPIRY)
+                expires_at = metadata[0] + metadata[1]
+            except (json.JSONDecodeError, KeyError, TypeError, OSError):
+                continue
+            if now > expires_at:
+                file_path.unlink(missing_ok=True)
+                removed += 1
+        return removed
+
+
+class SQLiteBackend(CacheBackend):
+    """單一檔案的 SQLite 儲存，過期時間為索引欄位，資料以 zlib 壓縮"""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS cache (
+        key TEXT PRIMARY KEY,
+        created_at REAL NOT NULL,
+        expires_at REAL NOT NULL,
+        payload BLOB NOT NULL,
+        accessed_at REAL NOT NULL DEFAULT 0
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_cache_expires_at ON cache (expires_at);
+    """
+
+    def __init__(self, db_path: Path, compress_level: int = 6):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.compress_level = compress_level
+        self._local = threading.local()
+
+        conn = self._connection()
+        conn.executescript(self.SCHEMA)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(cache)")}
+        if 'accessed_at' not in columns:
+            # 舊版資料表沒有最近使用時間，以寫入時間代替
+            conn.execute("ALTER TABLE cache ADD COLUMN accessed_at REAL NOT NULL DEFAULT 0")
+            conn.execute("UPDATE cache SET accessed_at = created_at")
+        conn.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 連線不能跨執行緒共用，每個執行緒各自建立
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=30)
+            # auto_vacuum 必須在資料庫檔案初始化 (包括切換成 WAL) 之前設定，對既有的資料庫沒有作用
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            self._local.conn = conn
+            self._local.batch_depth = 0
+        return conn
+
+    def _encode(self, value: Any) -> bytes:
+        raw = json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        return zlib.compress(raw, self.compress_level)
+
+    @staticmethod
+    def _decode(payload: bytes) -> Any:
+        return json.loads(zlib.decompress(payload).decode('utf-8'))
+
+    def get_entry(self, key: str) -> Optional[Tuple[Any, float]]:
+        conn = self._connection()
+        now = time.time()
+        row = conn.execute(
+            "SELECT payload, expires_at, accessed_at FROM cache WHERE key = ? AND expires_at >= ?",
+            (key, now)
+        ).fetchone()
+        if row is None:
+            return None
+        # 最近使用時間最多每 CACHE_ACCESS_RESOLUTION 秒更新一次，避免每次讀取都寫入
+        if now - row[2] > CACHE_ACCESS_RESOLUTION:
+            conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+            if not self._local.batch_depth:
+                conn.commit()
+        return self._decode(row[0]), row[1]
+
+    def set(self, key: str, value: Any, timestamp: float, ttl: float) -> None:
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (key, created_at, expires_at, payload, accessed_at) VALUES (?, ?, ?, ?, ?)",
+            (key, timestamp, timestamp + ttl, self._encode(value), timestamp)
+        )
+        if not self._local.batch_depth:
+            conn.commit()
+
+    def set_many(self, records: Iterable[CacheRecord]) -> None:
+        rows = (
+            (key, timestamp, timestamp + ttl, self._encode(value), timestamp)
+            for key, value, timestamp, ttl in records
+        )
+        with self.batch():
+            self._connection().executemany(
+                "INSERT OR REPLACE INTO cache (key, created_at, expires_at, payload, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        """在同一個交易內完成區塊中的所有寫入"""
+        conn = self._connection()
+        self._local.batch_depth += 1
+        try:
+            yield
+        except BaseException:
+            self._local.batch_depth -= 1
+            if not self._local.batch_depth:
+                conn.rollback()
+            raise
+        else:
+            self._local.batch_depth -= 1
+            if not self._local.batch_depth:
+                conn.commit()
+
+    def delete(self, key: str) -> bool:
+        conn = self._connection()
+        cursor = conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+        if not self._local.batch_depth:
+            conn.commit()
+        return cursor.rowcount > 0
+
+    def purge_expired(self) -> int:
+        conn = self._connection()
+        cursor = conn.execute("DELETE FROM cache WHERE expires_at < ?", (time.time(),))
+        conn.commit()
+        return cursor.rowcount
+
+    def close(self) -> None:
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def create_backend(name: str, cache_dir: Path, db_path: Optional[Path] = None) -> CacheBackend:
+    """依名稱建立快取後端"""
+    if name == 'json':
+        return JSONFileBackend(cache_dir)
+    if name == 'sqlite':
+        return SQLiteBackend(db_path or Path(cache_dir) / 'cache.sqlite3')
+    raise ValueError(f"未知的快取後端: {name}")
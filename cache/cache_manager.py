@@ -1,37 +1,69 @@
-import json
 import time
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Optional
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
 
-from config import CACHE_DIR, CACHE_EXPIRY
+from config import CACHE_DIR, CACHE_EXPIRY, CACHE_BACKEND
+from cache.backends import CacheBackend, create_backend
+from cache.memory_cache import LRUCache
 
 class CacheManager:
-    def __init__(self, cache_dir: Path = CACHE_DIR):
+    def __init__(self, cache_dir: Path = CACHE_DIR, backend: Optional[CacheBackend] = None,
+                 memory_cache: Optional[LRUCache] = None):
         self.cache_dir = cache_dir
-        self.cache_dir.mkdir(parents=True, exist_ok=True)
-
-    def _get_cache_path(self, key: str) -> Path:
-        return self.cache_dir / f"{key}.json"
+        self.backend = backend or create_backend(CACHE_BACKEND, cache_dir)
+        # 可選的記憶體層，命中時不會讀取磁碟
+        self.memory_cache = memory_cache
 
     def get(self, key: str) -> Optional[Any]:
-        cache_path = self._get_cache_path(key)
-        if not cache_path.exists():
-            return None
+        if self.memory_cache is not None:
+            value = self.memory_cache.get(key)
+            if value is not None:
+                return value
 
-        with cache_path.open('r', encoding='utf-8') as f:
-            cached_data = json.load(f)
-            
-        if time.time() - cached_data['timestamp'] > CACHE_EXPIRY:
+        entry = self.backend.get_entry(key)
+        if entry is None:
             return None
-            
-        return cached_data['data']
-
-    def set(self, key: str, value: Any) -> None:
-        cache_path = self._get_cache_path(key)
-        cache_data = {
-            'timestamp': time.time(),
-            'data': value
-        }
-        
-        with cache_path.open('w', encoding='utf-8') as f:
-            json.dump(cache_data, f, ensure_ascii=False, indent=2)
\ No newline at end of file
+
+        value, expires_at = entry
+        if self.memory_cache is not None:
+            self.memory_cache.set(key, value, expires_at)
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        """寫入快取，ttl 未指定時使用預設的 CACHE_EXPIRY"""
+        timestamp = time.time()
+        expiry = CACHE_EXPIRY if ttl is None else ttl
+        self.backend.set(key, value, timestamp, expiry)
+        if self.memory_cache is not None:
+            self.memory_cache.set(key, value, timestamp + expiry)
+
+    def set_many(self, items: Iterable[Tuple[str, Any]], ttl: Optional[float] = None) -> None:
+        """在同一批次中寫入多筆快取"""
+        timestamp = time.time()
+        expiry = CACHE_EXPIRY if ttl is None else ttl
+        items = list(items)
+        self.backend.set_many((key, value, timestamp, expiry) for key, value in items)
+        if self.memory_cache is not None:
+            for key, value in items:
+                self.memory_cache.set(key, value, timestamp + expiry)
+
+    @contextmanager
+    def batch(self) -> Iterator[None]:
+        """區塊內的寫入會合併成一次交易 (僅支援交易的後端有效)"""
+        with self.backend.batch():
+            yield
+
+    def delete(self, key: str) -> bool:
+        if self.memory_cache is not None:
+            self.memory_cache.delete(key)
+        return self.backend.delete(key)
+
+    def purge_expired(self) -> int:
+        return self.backend.purge_expired()
+
+    def stats(self) -> Dict[str, int]:
+        """記憶體層的命中、未命中與淘汰次數"""
+        if self.memory_cache is None:
+            return {}
+        return self.memory_cache.stats()
@@ -0,0 +1,363 @@
+import json
+import os
+import re
+import time
+import zlib
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Optional
+
+from config import (
+    CACHE_EXPIRY, CACHE_MAX_BYTES, CACHE_MAX_ENTRIES, CACHE_SCAN_WORKERS, CACHE_TEMP_FILE_AGE
+)
+from cache.backends import CacheBackend, JSONFileBackend, SQLiteBackend, JSON_HEADER_BYTES
+
+# 查詢結果為空時資料的結尾: "bindings": [] } } }
+_EMPTY_TAIL = re.compile(rb'"bindings"\s*:\s*\[\s*\]\s*\}\s*\}\s*\}\s*$')
+TAIL_BYTES = 64
+# 空結果壓縮後一定小於這個大小，SQLite 只需解壓這些項目
+EMPTY_PAYLOAD_MAX_BYTES = 512
+
+
+def _open_noatime(path, mode: str = 'rb', **kwargs):
+    """開啟檔案但不更新存取時間，避免掃描本身改變 LRU 順序；不是檔案擁有者時 O_NOATIME 不允許使用"""
+    flags = os.O_RDONLY | getattr(os, 'O_NOATIME', 0)
+    try:
+        fd = os.open(path, flags)
+    except PermissionError:
+        if flags == os.O_RDONLY:
+            raise
+        fd = os.open(path, os.O_RDONLY)
+    return open(fd, mode, **kwargs)
+
+
+def _is_empty_result(value) -> bool:
+    results = value.get('results') if isinstance(value, dict) else None
+    return isinstance(results, dict) and results.get('bindings') == []
+
+
+@dataclass
+class EntryInfo:
+    """只由後設資料得到的快取項目資訊"""
+    key: str
+    size: int
+    created_at: float = 0.0
+    expires_at: float = 0.0
+    accessed_at: float = 0.0
+    empty: bool = False
+    corrupt: bool = False
+    # JSON 檔案不是目前的緊湊格式 (舊版縮排或沒有檔頭)，壓縮時會重寫
+    legacy: bool = False
+    path: Optional[Path] = None
+    inode: int = 0
+    mtime_ns: int = 0
+
+
+@dataclass
+class MaintenanceReport:
+    scanned: int = 0
+    bytes_before: int = 0
+    bytes_after: int = 0
+    entries_after: int = 0
+    expired: List[str] = field(default_factory=list)
+    empty: List[str] = field(default_factory=list)
+    corrupt: List[str] = field(default_factory=list)
+    evicted: List[str] = field(default_factory=list)
+    temp_files: int = 0
+    compacted: int = 0
+    dry_run: bool = False
+
+    @property
+    def removed(self) -> int:
+        return len(self.expired) + len(self.empty) + len(self.corrupt) + len(self.evicted)
+
+    def summary(self) -> str:
+        action = "將刪除" if self.dry_run else "已刪除"
+        return (f"掃描 {self.scanned} 筆 ({self.bytes_before} bytes)，{action}: 過期 {len(self.expired)}、"
+                f"空結果 {len(self.empty)}、損毀 {len(self.corrupt)}、超出配額 {len(self.evicted)}、"
+                f"暫存檔 {self.temp_files}；壓縮 {self.compacted}；"
+                f"剩餘 {self.entries_after} 筆 ({self.bytes_after} bytes)")
+
+
+class CacheMaintainer(ABC):
+    """快取維護：清除過期、空結果與損毀的項目，以最近最少使用 (LRU) 淘汰超出配額的項目，並線上壓縮
+
+    掃描只讀取後設資料，不解析查詢結果本身；維護期間其他程序可以繼續讀寫快取。
+    """
+
+    def __init__(self, backend: CacheBackend, max_bytes: Optional[int] = CACHE_MAX_BYTES,
+                 max_entries: Optional[int] = CACHE_MAX_ENTRIES, workers: int = CACHE_SCAN_WORKERS):
+        self.backend = backend
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.workers = workers
+
+    @abstractmethod
+    def scan(self) -> List[EntryInfo]:
+        """讀取所有項目的後設資料"""
+        pass
+
+    @abstractmethod
+    def _remove(self, entries: List[EntryInfo]) -> None:
+        """刪除項目，掃描後被重新寫入的項目不刪除"""
+        pass
+
+    def _remove_temp_files(self, dry_run: bool) -> int:
+        return 0
+
+    def compact(self) -> int:
+        """線上壓縮，回傳處理的數量"""
+        return 0
+
+    def sweep(self, expired: bool = True, empty: bool = False, corrupt: bool = True,
+              enforce_quota: bool = True, compact: bool = False, dry_run: bool = False) -> MaintenanceReport:
+        """掃描並清除項目
+
+        空結果是刻意寫入的 negative cache (較短的 ttl)，預設不刪除。
+        配額以最近使用時間淘汰，記憶體快取命中的讀取不會更新磁碟上的使用時間。
+        """
+        report = MaintenanceReport(dry_run=dry_run)
+        entries = self.scan()
+        report.scanned = len(entries)
+        report.bytes_before = sum(entry.size for entry in entries)
+
+        now = time.time()
+        doomed = []
+        kept = []
+        for entry in entries:
+            if corrupt and entry.corrupt:
+                report.corrupt.append(entry.key)
+            elif expired and not entry.corrupt and entry.expires_at < now:
+                report.expired.append(entry.key)
+            elif empty and entry.empty:
+                report.empty.append(entry.key)
+            else:
+                kept.append(entry)
+                continue
+            doomed.append(entry)
+
+        if enforce_quota:
+            evicted = self._over_quota(kept)
+            report.evicted = [entry.key for entry in evicted]
+            evicted_keys = set(report.evicted)
+            kept = [entry for entry in kept if entry.key not in evicted_keys]
+            doomed.extend(evicted)
+
+        report.temp_files = self._remove_temp_files(dry_run)
+        if not dry_run:
+            self._remove(doomed)
+            if compact:
+                report.compacted = self.compact()
+        report.entries_after = len(kept)
+        report.bytes_after = sum(entry.size for entry in kept)
+        return report
+
+    def _over_quota(self, entries: List[EntryInfo]) -> List[EntryInfo]:
+        """超出配額時，從最久未使用的項目開始淘汰"""
+        total_bytes = sum(entry.size for entry in entries)
+        count = len(entries)
+        evicted = []
+        for entry in sorted(entries, key=lambda entry: entry.accessed_at):
+            over_bytes = self.max_bytes is not None and total_bytes > self.max_bytes
+            over_entries = self.max_entries is not None and count > self.max_entries
+            if not over_bytes and not over_entries:
+                break
+            evicted.append(entry)
+            total_bytes -= entry.size
+            count -= 1
+        return evicted
+
+
+class JSONFileMaintainer(CacheMaintainer):
+    """JSON 檔案後端：只讀取每個檔案開頭與結尾的少量位元組，並以多個執行緒同時掃描"""
+
+    backend: JSONFileBackend
+
+    def _scan_file(self, entry: os.DirEntry) -> Optional[EntryInfo]:
+        try:
+            stat = entry.stat()
+            info = EntryInfo(key=entry.name[:-len('.json')], size=stat.st_size, path=Path(entry.path),
+                             accessed_at=max(stat.st_atime, stat.st_mtime),
+                             inode=stat.st_ino, mtime_ns=stat.st_mtime_ns)
+            with _open_noatime(entry.path) as f:
+                head = f.read(JSON_HEADER_BYTES)
+                f.seek(max(0, stat.st_size - TAIL_BYTES))
+                tail = f.read(TAIL_BYTES)
+        except FileNotFoundError:
+            # 掃描期間被刪除
+            return None
+        except OSError:
+            return EntryInfo(key=entry.name[:-len('.json')], size=0, path=Path(entry.path), corrupt=True)
+
+        header = JSONFileBackend.parse_header(head)
+        if header is None:
+            return self._scan_legacy(info)
+        timestamp, ttl, compact = header
+        info.created_at = timestamp
+        info.expires_at = timestamp + ttl
+        info.legacy = not compact
+        # 寫到一半的檔案不會出現 (set() 以取代的方式寫入)，結尾不完整即為損毀
+        info.corrupt = not tail.rstrip().endswith(b'}')
+        info.empty = bool(_EMPTY_TAIL.search(tail))
+        return info
+
+    @staticmethod
+    def _scan_legacy(info: EntryInfo) -> EntryInfo:
+        """檔頭不是標準格式的檔案才完整解析"""
+        try:
+            with _open_noatime(info.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, UnicodeDecodeError, OSError):
+            info.corrupt = True
+            return info
+        if isinstance(data, dict) and 'timestamp' in data and 'data' in data:
+            timestamp, ttl, value = data['timestamp'], data.get('ttl', CACHE_EXPIRY), data['data']
+        elif isinstance(data, dict):
+            # 直接存放查詢結果的舊檔案，以修改時間作為寫入時間
+            timestamp, ttl, value = info.mtime_ns / 1e9, CACHE_EXPIRY, data
+        else:
+            info.corrupt = True
+            return info
+        try:
+            info.created_at = float(timestamp)
+            info.expires_at = info.created_at + float(ttl)
+        except (TypeError, ValueError):
+            info.corrupt = True
+            return info
+        info.legacy = True
+        info.empty = _is_empty_result(value)
+        return info
+
+    def scan(self) -> List[EntryInfo]:
+        with os.scandir(self.backend.cache_dir) as it:
+            files = [entry for entry in it if entry.name.endswith('.json') and entry.is_file()]
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            return [info for info in pool.map(self._scan_file, files) if info is not None]
+
+    @staticmethod
+    def _unchanged(entry: EntryInfo) -> bool:
+        """掃描後沒有被重新寫入 (set() 會換成新的檔案)"""
+        try:
+            stat = entry.path.stat()
+        except FileNotFoundError:
+            return False
+        return stat.st_ino == entry.inode and stat.st_mtime_ns == entry.mtime_ns
+
+    def _remove(self, entries: List[EntryInfo]) -> None:
+        def remove(entry: EntryInfo) -> None:
+            # 無法讀取的檔案沒有 inode 資訊，直接刪除
+            if self._unchanged(entry) or (entry.corrupt and not entry.inode):
+                entry.path.unlink(missing_ok=True)
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            list(pool.map(remove, entries))
+
+    def _remove_temp_files(self, dry_run: bool) -> int:
+        cutoff = time.time() - CACHE_TEMP_FILE_AGE
+        removed = 0
+        with os.scandir(self.backend.cache_dir) as it:
+            for entry in it:
+                if entry.name.endswith('.tmp') and entry.is_file() and entry.stat().st_mtime < cutoff:
+                    if not dry_run:
+                        Path(entry.path).unlink(missing_ok=True)
+                    removed += 1
+        return removed
+
+    def compact(self) -> int:
+        """將舊版格式的檔案重寫成緊湊、檔頭在前的格式
+
+        先寫入暫存檔，取代前才確認原檔在掃描後沒有被重新寫入，其他寫入者的新資料不會被舊資料覆蓋；
+        讀取端只會看到完整的舊檔或新檔。重寫保留原本的存取與修改時間，不影響 LRU 順序。
+        """
+        def rewrite(entry: EntryInfo) -> bool:
+            try:
+                stat = entry.path.stat()
+                with _open_noatime(entry.path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError, UnicodeDecodeError):
+                return False
+            value = data['data'] if 'timestamp' in data and 'data' in data else data
+            tmp_path = self.backend.write_temp_file(entry.key, value, entry.created_at,
+                                                    entry.expires_at - entry.created_at)
+            try:
+                os.utime(tmp_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+                if not self._unchanged(entry):
+                    return False
+                os.replace(tmp_path, entry.path)
+                return True
+            finally:
+                tmp_path.unlink(missing_ok=True)
+
+        legacy = [entry for entry in self.scan() if entry.legacy and not entry.corrupt]
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            return sum(pool.map(rewrite, legacy))
+
+
+class SQLiteMaintainer(CacheMaintainer):
+    """SQLite 後端：後設資料都是欄位，由單一查詢取得；以短交易分批刪除，不會長時間鎖住資料庫"""
+
+    backend: SQLiteBackend
+    DELETE_BATCH = 500
+    VACUUM_PAGES = 256
+
+    def scan(self) -> List[EntryInfo]:
+        conn = self.backend._connection()
+        entries = {
+            key: EntryInfo(key=key, size=size, created_at=created_at, expires_at=expires_at, accessed_at=accessed_at)
+            for key, created_at, expires_at, accessed_at, size in conn.execute(
+                "SELECT key, created_at, expires_at, accessed_at, length(payload) FROM cache"
+            )
+        }
+        # 只有很小的資料才可能是空結果，只解壓這些項目
+        small = conn.execute("SELECT key, payload FROM cache WHERE length(payload) <= ?", (EMPTY_PAYLOAD_MAX_BYTES,))
+        for key, payload in small:
+            if key not in entries:
+                continue
+            try:
+                value = SQLiteBackend._decode(payload)
+            except (zlib.error, ValueError):
+                entries[key].corrupt = True
+                continue
+            entries[key].empty = _is_empty_result(value)
+        return list(entries.values())
+
+    def _remove(self, entries: List[EntryInfo]) -> None:
+        conn = self.backend._connection()
+        keys = [entry.key for entry in entries]
+        for start in range(0, len(keys), self.DELETE_BATCH):
+            # 過期項目若在掃描後被重新寫入，expires_at 會改變而不會被刪除
+            batch = [(entry.key, entry.expires_at) for entry in entries[start:start + self.DELETE_BATCH]]
+            conn.executemany("DELETE FROM cache WHERE key = ? AND expires_at = ?", batch)
+            conn.commit()
+
+    def compact(self) -> int:
+        """以 incremental_vacuum 分批釋放空頁，每批之間讓出鎖；回傳釋放的頁數"""
+        conn = self.backend._connection()
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            print("資料庫不是以 auto_vacuum = INCREMENTAL 建立，無法線上壓縮")
+            return 0
+        freed = 0
+        free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        while free_pages:
+            # execute() 只執行一步 (釋放一頁)，executescript() 才會執行完整個 pragma
+            conn.executescript(f"PRAGMA incremental_vacuum({self.VACUUM_PAGES})")
+            remaining = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if remaining >= free_pages:
+                # 其他連線正在使用，留待下次
+                break
+            freed += free_pages - remaining
+            free_pages = remaining
+        # PASSIVE 不會等待讀取端
+        conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchall()
+        return freed
+
+
+def create_maintainer(backend: CacheBackend, **kwargs) -> CacheMaintainer:
+    """依後端類型建立維護工具"""
+    if isinstance(backend, JSONFileBackend):
+        return JSONFileMaintainer(backend, **kwargs)
+    if isinstance(backend, SQLiteBackend):
+        return SQLiteMaintainer(backend, **kwargs)
+    raise ValueError(f"不支援的快取後端: {type(backend).__name__}")
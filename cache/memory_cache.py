@@ -0,0 +1,108 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from config import MEMORY_CACHE_ENABLED, MEMORY_CACHE_MAX_ENTRIES, MEMORY_CACHE_MAX_BYTES
+
+
+class LRUCache:
+    """執行緒安全的記憶體 LRU 快取，可依項目數或估計位元組數限制大小
+
+    回傳的資料與快取內部共用同一物件，呼叫端不應修改。
+    """
+
+    def __init__(self, max_entries: Optional[int] = 10000, max_bytes: Optional[int] = None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # key -> (value, expires_at, size)
+        self._entries: 'OrderedDict[str, Tuple[Any, float, int]]' = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _estimate_size(value: Any) -> int:
+        return len(json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, expires_at, size = entry
+            if time.time() > expires_at:
+                del self._entries[key]
+                self._bytes -= size
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any, expires_at: float) -> None:
+        size = self._estimate_size(value) if self.max_bytes is not None else 0
+        # 單一項目超過上限時不放入記憶體
+        if self.max_bytes is not None and size > self.max_bytes:
+            return
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._entries[key] = (value, expires_at, size)
+            self._bytes += size
+            self._evict()
+
+    def _evict(self) -> None:
+        while self._entries and (
+            (self.max_entries is not None and len(self._entries) > self.max_entries) or
+            (self.max_bytes is not None and self._bytes > self.max_bytes)
+        ):
+            _, (_, _, size) = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return False
+            self._bytes -= entry[2]
+            return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+            }
+
+
+_shared_cache: Optional[LRUCache] = None
+_shared_lock = threading.Lock()
+
+
+def get_shared_memory_cache() -> Optional[LRUCache]:
+    """取得行程內共用的記憶體快取，未啟用時回傳 None"""
+    global _shared_cache
+    if not MEMORY_CACHE_ENABLED:
+        return None
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = LRUCache(MEMORY_CACHE_MAX_ENTRIES, MEMORY_CACHE_MAX_BYTES)
+        return _shared_cache
@@ -0,0 +1,43 @@
+import threading
+from typing import Any, Callable, Dict, Optional
+
+
+class _InFlightCall:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class RequestCoalescer:
+    """合併相同鍵值的並行請求，同一時間每個鍵值只會實際執行一次"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, _InFlightCall] = {}
+
+    def run(self, key: str, func: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._in_flight.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = _InFlightCall()
+                self._in_flight[key] = call
+
+        # 已有相同請求在執行中，等待其結果
+        if not is_leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            call.event.set()
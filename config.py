@@ -2,14 +2,108 @@ from pathlib import Path
 
 # Base paths
 PROJECT_ROOT = Path(__file__).parent
-CACHE_DIR = PROJECT_ROOT / "data" / "cache"
-
-# Create cache directory if not exists
-CACHE_DIR.mkdir(parents=True, exist_ok=True)
+CACHE_DIR = PROJECT_ROOT / "data" / "cache"  # created by the cache backend on first use
 
 # API endpoints
 DBPEDIA_ENDPOINT = "https://dbpedia.org/sparql"
 WIKIDATA_ENDPOINT = "https://query.wikidata.org/sparql"
 
+# Query execution
+QUERY_MAX_CONCURRENCY = 5
+# endpoint -> (requests per second, burst size, max parallel requests)
+ENDPOINT_RATE_LIMITS = {
+    WIKIDATA_ENDPOINT: (5.0, 5, 5),  # Wikidata allows 5 parallel queries per IP
+    DBPEDIA_ENDPOINT: (10.0, 10, 8),
+}
+DEFAULT_RATE_LIMIT = (2.0, 2, 2)
+QUERY_MAX_RETRIES = 3
+QUERY_BACKOFF_BASE = 1.0  # seconds, doubled on every retry
+QUERY_BACKOFF_MAX = 60.0
+# Entities per batched VALUES query; shrinks on timeouts and grows back on success
+QUERY_BATCH_SIZE = 50
+QUERY_MIN_BATCH_SIZE = 1
+QUERY_MAX_BATCH_SIZE = 200
+
+# SPARQL HTTP transport: "pooled" (keep-alive pool, gzip, streamed parsing) or "sparqlwrapper"
+SPARQL_TRANSPORT = "pooled"
+SPARQL_TIMEOUT = 60.0  # seconds per socket operation
+SPARQL_USER_AGENT = "KnowledgeGraphBot/1.0"
+SPARQL_MAX_GET_LENGTH = 2048  # longer queries are sent as POST
+SPARQL_READ_CHUNK_SIZE = 64 * 1024
+
+# Hierarchy queries: "closure" (unbounded property path) or "bounded" (level-by-level expansion)
+HIERARCHY_QUERY_MODE = "closure"
+HIERARCHY_MAX_DEPTH = 4
+# Max hops of each relation along one path in bounded mode; unlisted relations are limited only by depth
+HIERARCHY_RELATION_BUDGETS = {
+    'wdt:P2283': 1,  # uses
+    'wdt:P1535': 1,  # used by
+    'wdt:P452': 1,   # industry
+    'wdt:P366': 1,   # has use
+    'wdt:P106': 1,   # occupation
+}
+# Max concepts fetched per entity in bounded mode, by direction; expansion stops and level queries are
+# LIMITed once reached. None for no limit
+HIERARCHY_MAX_RESULTS = {'broader': 100, 'narrower': 50}
+# Label filtering of closure/fuzzy hierarchy queries: "client" downloads every Chinese label and
+# filters in extract_concepts; "server" pushes the CJK and business keyword checks into the query
+# as FILTER(REGEX(...)) and projects only ?itemLabel. extract_concepts still re-checks every label.
+# "stream" (pooled transport) applies the same checks to each binding as the response is parsed, so
+# discarded labels are never collected; its results are cached under separate keys.
+# An entity whose concepts are all filtered out has no bindings, so the fuzzy fallback also runs for it.
+HIERARCHY_LABEL_FILTER = "client"
+
+# Knowledge base used by ConceptTreeManager: "wikidata", "dbpedia", "local" or "federated"
+KNOWLEDGE_BASE = "wikidata"
+DBPEDIA_HIERARCHY_LIMIT = 200
+# Federated mode queries these sources concurrently, in priority order ("local" is skipped without an index)
+FEDERATION_SOURCES = ('wikidata', 'local', 'dbpedia')
+FEDERATION_STRATEGY = "first"  # "first" good answer, or "merge" all answers within the budget
+FEDERATION_LATENCY_BUDGET = 10.0  # seconds; slower calls, minus our own rate-limit and back-off waits, count as breaker failures
+FEDERATION_PREFETCH_TIMEOUT = 120.0
+CIRCUIT_BREAKER_FAILURES = 3  # consecutive failures before a source is skipped
+CIRCUIT_BREAKER_COOLDOWN = 60.0  # seconds before a skipped source gets a trial request
+
+# Offline hierarchy index built by utils/build_local_index.py
+LOCAL_INDEX_PATH = PROJECT_ROOT / "data" / "index" / "hierarchy_index.pkl"
+# Label n-gram index used instead of CONTAINS() fuzzy queries when the file exists
+LABEL_INDEX_PATH = PROJECT_ROOT / "data" / "index" / "label_index.pkl"
+LABEL_INDEX_MAX_CANDIDATES = 5
+# Synonym groups {canonical: [aliases]}; an alias whose own label has no hierarchy falls back to its canonical term
+SYNONYMS_PATH = PROJECT_ROOT / "data" / "synonyms.json"
+
 # Cache settings
-CACHE_EXPIRY = 86400  # 24 hours in seconds
\ No newline at end of file
+CACHE_EXPIRY = 86400  # 24 hours in seconds
+NEGATIVE_CACHE_EXPIRY = 3600  # 1 hour for results without bindings
+CACHE_BACKEND = "json"  # "json" (one file per key) or "sqlite" (single indexed file)
+# Last-access times (used for LRU eviction) are refreshed at most once per this many seconds
+CACHE_ACCESS_RESOLUTION = 300
+
+# Cache maintenance (cache/maintenance.py, utils/clean_cache.py)
+CACHE_MAX_BYTES = None  # evict least recently used entries above this total size; None for no limit
+CACHE_MAX_ENTRIES = None
+CACHE_SCAN_WORKERS = 8
+CACHE_TEMP_FILE_AGE = 3600  # seconds; older leftover *.tmp files from interrupted writes are removed
+
+# In-process LRU tier in front of the cache backend
+MEMORY_CACHE_ENABLED = True
+MEMORY_CACHE_MAX_ENTRIES = 10000
+MEMORY_CACHE_MAX_BYTES = 256 * 1024 * 1024  # None to limit by entry count only
+
+# NER
+NER_MODEL = "zh_core_web_sm"
+# Pipeline components NERProcessor needs; all others are disabled when the model loads
+NER_PIPELINE = ('tok2vec', 'ner')
+NER_BATCH_SIZE = 64
+NER_N_PROCESS = 1  # -1 to use all CPU cores
+
+# Streaming pipeline (pipeline/streaming.py)
+PIPELINE_QUEUE_SIZE = 128  # max items waiting between two stages
+PIPELINE_TREE_WORKERS = 4
+PIPELINE_TREE_BATCH_SIZE = 20  # queued entities prefetched together by one tree worker
+
+# Pipeline service (server.py)
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8765
+SERVICE_MAX_DOCUMENTS = 256  # per /process request
+SERVICE_MAX_BODY_BYTES = 16 * 1024 * 1024
@@ -1,5 +1,15 @@
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any, Tuple
+from dataclasses import dataclass
+from typing import List, Dict, Any, Tuple, Iterable, Optional
+
+from .query_executor import QueryExecutor
+
+@dataclass
+class ConceptNode:
+    name: str
+    level: int
+    children: List['ConceptNode']
+    parent: Optional['ConceptNode'] = None
 
 class KnowledgeBase(ABC):
     @abstractmethod
@@ -8,4 +18,51 @@ class KnowledgeBase(ABC):
 
     @abstractmethod
     def get_concepts(self, entity_name: str) -> Tuple[List[str], List[str]]:
-        pass
\ No newline at end of file
+        pass
+
+    def get_concepts_many(self, entity_names: Iterable[str],
+                          max_concurrency: Optional[int] = None) -> Dict[str, Tuple[List[str], List[str]]]:
+        """並行查詢多個實體的上位與下位概念"""
+        names = list(dict.fromkeys(entity_names))
+        executor = QueryExecutor(max_concurrency) if max_concurrency else QueryExecutor()
+        return dict(zip(names, executor.map(self.get_concepts, names)))
+
+    def prefetch(self, entity_names: Iterable[str], directions: Iterable[str] = ('broader', 'narrower')) -> None:
+        """預先填入快取，沒有批次查詢的知識庫不需要實作"""
+
+    def build_concept_tree(self, entity_name: str) -> ConceptNode:
+        """建立概念樹"""
+        broader_concepts, narrower_concepts = self.get_concepts(entity_name)
+        
+        # 建立層級關係
+        if broader_concepts:
+            # 從最上層開始建立樹
+            root = ConceptNode(name=broader_concepts[0], level=0, children=[])
+            current = root
+            
+            # 建立中間層級
+            for concept in broader_concepts[1:]:
+                node = ConceptNode(name=concept, level=current.level + 1, children=[])
+                node.parent = current
+                current.children = [node]
+                current = node
+            
+            # 添加當前實體
+            entity_node = ConceptNode(name=entity_name, level=current.level + 1, children=[])
+            entity_node.parent = current
+            current.children = [entity_node]
+            
+            # 添加下位概念
+            for concept in sorted(narrower_concepts):
+                node = ConceptNode(name=concept, level=entity_node.level + 1, children=[])
+                node.parent = entity_node
+                entity_node.children.append(node)
+        else:
+            # 如果沒有上位概念，直接從當前實體開始
+            root = ConceptNode(name=entity_name, level=0, children=[])
+            for concept in sorted(narrower_concepts):
+                node = ConceptNode(name=concept, level=1, children=[])
+                node.parent = root
+                root.children.append(node)
+        
+        return root
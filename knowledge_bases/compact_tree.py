@@ -0,0 +1,132 @@
+from array import array
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .base import ConceptNode
+
+
+class CompactTree:
+    """以平行整數陣列表示的概念樹
+
+    節點名稱只儲存一次 (names)，每個節點以 parent / first_child / next_sibling
+    三個陣列描述結構，所有走訪都以迴圈完成，不受遞迴深度限制。節點 0 為根節點。
+    """
+
+    __slots__ = ('names', '_name_ids', 'name_ids', 'parent', 'first_child',
+                 'next_sibling', 'last_child', 'level')
+
+    def __init__(self):
+        self.names: List[str] = []
+        self._name_ids: Dict[str, int] = {}
+        self.name_ids = array('i')
+        self.parent = array('i')
+        self.first_child = array('i')
+        self.next_sibling = array('i')
+        self.last_child = array('i')
+        self.level = array('i')
+
+    def __len__(self) -> int:
+        return len(self.parent)
+
+    def _intern(self, name: str) -> int:
+        name_id = self._name_ids.get(name)
+        if name_id is None:
+            name_id = len(self.names)
+            self._name_ids[name] = name_id
+            self.names.append(name)
+        return name_id
+
+    def add_node(self, name: str, parent: int = -1) -> int:
+        """新增節點並接在父節點的最後一個子節點之後"""
+        node = len(self.parent)
+        self.name_ids.append(self._intern(name))
+        self.parent.append(parent)
+        self.first_child.append(-1)
+        self.next_sibling.append(-1)
+        self.last_child.append(-1)
+        self.level.append(0 if parent < 0 else self.level[parent] + 1)
+
+        if parent >= 0:
+            if self.first_child[parent] < 0:
+                self.first_child[parent] = node
+            else:
+                self.next_sibling[self.last_child[parent]] = node
+            self.last_child[parent] = node
+        return node
+
+    def name(self, node: int) -> str:
+        return self.names[self.name_ids[node]]
+
+    def children(self, node: int) -> Iterator[int]:
+        child = self.first_child[node]
+        while child >= 0:
+            yield child
+            child = self.next_sibling[child]
+
+    def iter_preorder(self, node: int = 0) -> Iterator[int]:
+        if not len(self):
+            return
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            yield current
+            stack.extend(reversed(list(self.children(current))))
+
+    @classmethod
+    def from_dict(cls, tree: Dict[str, Any]) -> 'CompactTree':
+        """由 tree_to_dict 格式建立"""
+        compact = cls()
+        stack = [(tree, -1)]
+        while stack:
+            node, parent = stack.pop()
+            index = compact.add_node(node['name'], parent)
+            for child in reversed(node.get('children', [])):
+                stack.append((child, index))
+        return compact
+
+    def to_dict(self, node: int = 0) -> Dict[str, Any]:
+        """輸出 tree_to_dict 格式，level 以輸出起點為 0 重新計算"""
+        base_level = self.level[node]
+        built: Dict[int, Dict[str, Any]] = {}
+        for current in self.iter_preorder(node):
+            item = {'name': self.name(current), 'level': self.level[current] - base_level, 'children': []}
+            built[current] = item
+            if current != node:
+                built[self.parent[current]]['children'].append(item)
+        return built[node]
+
+    @classmethod
+    def from_concept_node(cls, root: ConceptNode) -> 'CompactTree':
+        compact = cls()
+        stack: List[Tuple[ConceptNode, int]] = [(root, -1)]
+        while stack:
+            node, parent = stack.pop()
+            index = compact.add_node(node.name, parent)
+            for child in reversed(node.children):
+                stack.append((child, index))
+        return compact
+
+    def to_concept_node(self, node: int = 0) -> ConceptNode:
+        base_level = self.level[node]
+        built: Dict[int, ConceptNode] = {}
+        for current in self.iter_preorder(node):
+            parent: Optional[ConceptNode] = built.get(self.parent[current]) if current != node else None
+            item = ConceptNode(name=self.name(current), level=self.level[current] - base_level,
+                               children=[], parent=parent)
+            built[current] = item
+            if parent is not None:
+                parent.children.append(item)
+        return built[node]
+
+    def render(self, node: int = 0, indent: str = "", is_last: bool = True) -> str:
+        """與 WikidataClient.print_tree 相同的輸出格式，子節點依名稱排序"""
+        lines = []
+        stack = [(node, indent, is_last)]
+        while stack:
+            current, indent, is_last = stack.pop()
+            marker = "└───" if is_last else "├───"
+            lines.append(f"{indent}{marker} {self.name(current)}")
+            child_indent = indent + ("    " if is_last else "│   ")
+            children = sorted(self.children(current), key=self.name)
+            for i in range(len(children) - 1, -1, -1):
+                stack.append((children[i], child_indent, i == len(children) - 1))
+        return "\n".join(lines)
@@ -0,0 +1,84 @@
+import re
+from typing import Any, Dict, List, Tuple
+from utils.keyword_matcher import KeywordMatcher
+
+# 定義相關領域的關鍵詞
+BUSINESS_KEYWORDS = frozenset({
+    '商業', '經濟', '市場', '消費', '服務', '產業', '管理',
+    '營銷', '行銷', '銷售', '客戶', '顧客', '價值', '品牌',
+    '產品', '療程', '美容', '診所', '門診', '保健', '健康',
+    '治療', '醫療', '照護', '護理', '專科', '門診', '臨床',
+    '整形', '整型', '美容', '皮膚', '醫美', '外科', '手術',
+    '注射', '雷射', '微整', '抗衰', '年輕', '美學'
+})
+
+CJK_PATTERN = '[\u4e00-\u9fff]'
+# XPath 正規表示式 (SPARQL REGEX) 的特殊字元
+_SPARQL_REGEX_META = frozenset('\\|.-^?*+{}()[]$')
+
+
+def _sparql_regex_literal(pattern: str) -> str:
+    """將正規表示式放進 SPARQL 字串常值"""
+    return '"' + pattern.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def keyword_alternation(keywords) -> str:
+    """關鍵詞的 REGEX 交替式，較長的關鍵詞在前"""
+    escaped = (''.join('\\' + ch if ch in _SPARQL_REGEX_META else ch for ch in keyword)
+               for keyword in sorted(set(keywords), key=lambda keyword: (-len(keyword), keyword)))
+    return '|'.join(escaped)
+
+
+class ConceptFilterMixin:
+    """從上下位查詢結果中挑出中文且與商業相關的概念"""
+
+    business_keywords = BUSINESS_KEYWORDS
+    business_matcher = KeywordMatcher(BUSINESS_KEYWORDS)
+
+    def is_chinese(self, text: str) -> bool:
+        # 檢查是否包含中文字符
+        return bool(re.search(CJK_PATTERN, text))
+
+    def is_business_related(self, text: str) -> bool:
+        """檢查概念是否與商業價值或消費者行為相關"""
+        return self.business_matcher.contains_any(text)
+
+    def label_filter_condition(self, variable: str = '?itemLabel') -> str:
+        """與 is_chinese 及 is_business_related 相同的 SPARQL 篩選條件"""
+        conditions = [f"REGEX(STR({variable}), {_sparql_regex_literal(keyword_alternation(self.business_keywords))})"]
+        # 關鍵詞都是中文時，符合關鍵詞即包含中文字，不需要另外檢查
+        if not all(self.is_chinese(keyword) for keyword in self.business_keywords):
+            conditions.insert(0, f"REGEX(STR({variable}), {_sparql_regex_literal(CJK_PATTERN)})")
+        return ' && '.join(conditions)
+
+    def extract_concepts(self, broader_results: Dict[str, Any],
+                         narrower_results: Dict[str, Any]) -> Tuple[List[str], List[str]]:
+        """返回上位概念和下位概念的元組"""
+        broader_concepts = []
+        narrower_concepts = []
+        
+        # 處理上位概念
+        depths = {}
+        for result in broader_results['results']['bindings']:
+            if 'itemLabel' in result:
+                label = result['itemLabel']['value']
+                if self.is_chinese(label) and self.is_business_related(label):
+                    broader_concepts.append(label)
+                    if 'depth' in result:
+                        depths[label] = max(depths.get(label, 0), int(result['depth']['value']))
+        
+        if depths:
+            # 有深度資訊時，距離實體最遠 (最一般) 的概念在最上層
+            broader_concepts = sorted(set(broader_concepts), key=lambda label: (-depths[label], label))
+        else:
+            # 反轉上位概念順序，使最一般的概念在最上層
+            broader_concepts = list(reversed(sorted(set(broader_concepts))))
+        
+        # 處理下位概念
+        for result in narrower_results['results']['bindings']:
+            if 'itemLabel' in result:
+                label = result['itemLabel']['value']
+                if self.is_chinese(label) and self.is_business_related(label):
+                    narrower_concepts.append(label)
+        
+        return (broader_concepts, sorted(list(set(narrower_concepts))))
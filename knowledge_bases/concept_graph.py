@@ -0,0 +1,255 @@
+import json
+from array import array
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+# 每個實體的樹以路徑前綴樹上的樹葉路徑表示，依前序排列；共用的上位概念路徑只儲存一次
+TreeView = array
+
+
+class ConceptGraph:
+    """跨實體共用的概念圖：節點名稱只儲存一次，邊不重複，各實體的概念樹為圖上的視圖
+
+    從根節點出發的每條路徑在前綴樹中只有一個編號，視圖只記錄樹葉的路徑，
+    大小與樹葉數成正比而不是與深度成正比。路徑、節點與邊以參照計數維護，
+    移除或取代視圖時立即釋放不再使用的部分；prune() 只負責回收編號。
+    """
+
+    def __init__(self):
+        self.names: List[str] = []
+        self._ids: Dict[str, int] = {}
+        self._children: List[List[int]] = []
+        self._parents: List[List[int]] = []
+        # 邊 -> 使用此邊的路徑數；節點 -> 停在此節點的路徑數
+        self._edges: Dict[Tuple[int, int], int] = {}
+        self._node_refs = array('i')
+        self._live_nodes = 0
+        # 路徑前綴樹：(父路徑, 節點) -> 路徑，根路徑的父路徑為 -1
+        self._path_ids: Dict[Tuple[int, int], int] = {}
+        self._path_parent = array('i')
+        self._path_node = array('i')
+        self._path_refs = array('i')  # 包含此路徑的視圖數
+        self.views: Dict[str, Dict[str, TreeView]] = {}
+
+    def __len__(self) -> int:
+        return self._live_nodes
+
+    @property
+    def edge_count(self) -> int:
+        return len(self._edges)
+
+    def intern(self, name: str) -> int:
+        node = self._ids.get(name)
+        if node is None:
+            node = len(self.names)
+            self._ids[name] = node
+            self.names.append(name)
+            self._children.append([])
+            self._parents.append([])
+            self._node_refs.append(0)
+        return node
+
+    def node_id(self, name: str) -> Optional[int]:
+        node = self._ids.get(name)
+        return node if node is not None and self._node_refs[node] else None
+
+    def children(self, name: str) -> List[str]:
+        node = self.node_id(name)
+        return [] if node is None else [self.names[child] for child in self._children[node]]
+
+    def parents(self, name: str) -> List[str]:
+        node = self.node_id(name)
+        return [] if node is None else [self.names[parent] for parent in self._parents[node]]
+
+    def _path(self, parent_path: int, node: int) -> int:
+        path = self._path_ids.get((parent_path, node))
+        if path is None:
+            path = len(self._path_node)
+            self._path_ids[parent_path, node] = path
+            self._path_parent.append(parent_path)
+            self._path_node.append(node)
+            self._path_refs.append(0)
+        return path
+
+    def _view_paths(self, leaves: Iterable[int]) -> Set[int]:
+        """視圖包含的所有路徑，即各樹葉到根的路徑聯集"""
+        paths: Set[int] = set()
+        for path in leaves:
+            while path >= 0 and path not in paths:
+                paths.add(path)
+                path = self._path_parent[path]
+        return paths
+
+    def _acquire(self, paths: Iterable[int]) -> None:
+        for path in paths:
+            self._path_refs[path] += 1
+            if self._path_refs[path] > 1:
+                continue
+            node = self._path_node[path]
+            self._node_refs[node] += 1
+            if self._node_refs[node] == 1:
+                self._live_nodes += 1
+            parent_path = self._path_parent[path]
+            if parent_path >= 0 and self._path_node[parent_path] != node:
+                edge = (self._path_node[parent_path], node)
+                if edge in self._edges:
+                    self._edges[edge] += 1
+                else:
+                    self._edges[edge] = 1
+                    self._children[edge[0]].append(node)
+                    self._parents[node].append(edge[0])
+
+    def _release(self, paths: Iterable[int]) -> None:
+        for path in paths:
+            self._path_refs[path] -= 1
+            if self._path_refs[path]:
+                continue
+            node = self._path_node[path]
+            self._node_refs[node] -= 1
+            if not self._node_refs[node]:
+                self._live_nodes -= 1
+            parent_path = self._path_parent[path]
+            if parent_path >= 0 and self._path_node[parent_path] != node:
+                edge = (self._path_node[parent_path], node)
+                self._edges[edge] -= 1
+                if not self._edges[edge]:
+                    del self._edges[edge]
+                    self._children[edge[0]].remove(node)
+                    self._parents[node].remove(edge[0])
+
+    def _set_view(self, category: str, entity: str, leaves: TreeView) -> None:
+        # 先取得新視圖再釋放舊視圖，兩者共用的路徑不會被釋放後又重建
+        self._acquire(self._view_paths(leaves))
+        category_views = self.views.setdefault(category, {})
+        old = category_views.get(entity)
+        category_views[entity] = leaves
+        if old is not None:
+            self._release(self._view_paths(old))
+
+    def upsert_tree(self, category: str, entity: str, tree: Dict[str, Any]) -> None:
+        """加入或更新一個實體的概念樹 (tree_to_dict 格式)"""
+        leaves = array('i')
+        # 以堆疊走訪，避免深層樹超過遞迴上限
+        stack = [(tree, -1)]
+        while stack:
+            node, parent_path = stack.pop()
+            path = self._path(parent_path, self.intern(node['name']))
+            children = node.get('children', [])
+            if not children:
+                leaves.append(path)
+            for child in reversed(children):
+                stack.append((child, path))
+        self._set_view(category, entity, array('i', dict.fromkeys(leaves)))
+
+    def upsert_trees(self, trees: Dict[str, Dict[str, Dict[str, Any]]]) -> None:
+        for category, category_trees in trees.items():
+            for entity, tree in category_trees.items():
+                self.upsert_tree(category, entity, tree)
+
+    def remove_entity(self, category: str, entity: str) -> bool:
+        category_views = self.views.get(category)
+        if not category_views or entity not in category_views:
+            return False
+        self._release(self._view_paths(category_views.pop(entity)))
+        if not category_views:
+            del self.views[category]
+        return True
+
+    def tree_view(self, category: str, entity: str) -> Optional[Dict[str, Any]]:
+        """將實體的視圖還原成 tree_to_dict 格式"""
+        leaves = self.views.get(category, {}).get(entity)
+        if leaves is None:
+            return None
+
+        # 樹葉依前序排列，依序接上尚未建立的祖先即可還原子節點順序
+        built: Dict[int, Dict[str, Any]] = {}
+        root = None
+        for leaf in leaves:
+            chain = []
+            path = leaf
+            while path >= 0 and path not in built:
+                chain.append(path)
+                path = self._path_parent[path]
+            parent = built.get(path)
+            for path in reversed(chain):
+                node = {'name': self.names[self._path_node[path]],
+                        'level': 0 if parent is None else parent['level'] + 1, 'children': []}
+                built[path] = node
+                if parent is None:
+                    root = node
+                else:
+                    parent['children'].append(node)
+                parent = node
+        return root
+
+    def iter_views(self) -> Iterator[Tuple[str, str]]:
+        for category, category_views in self.views.items():
+            for entity in category_views:
+                yield category, entity
+
+    def to_trees(self) -> Dict[str, Dict[str, Any]]:
+        """輸出與 generate_trees 相同格式的所有概念樹"""
+        return {
+            category: {entity: self.tree_view(category, entity) for entity in category_views}
+            for category, category_views in self.views.items()
+        }
+
+    def prune(self) -> int:
+        """回收已釋放的節點與路徑編號，回傳移除的節點數"""
+        removed = len(self.names) - self._live_nodes
+        if not removed and self._path_refs.count(0) == 0:
+            return 0
+
+        # 路徑的父路徑編號一定較小，依編號順序重建即可
+        old_names, old_parent, old_node, old_refs = self.names, self._path_parent, self._path_node, self._path_refs
+        old_views = self.views
+        self.__init__()
+        node_remap: Dict[int, int] = {}
+        path_remap: Dict[int, int] = {-1: -1}
+        for path, refs in enumerate(old_refs):
+            if not refs:
+                continue
+            node = old_node[path]
+            if node not in node_remap:
+                node_remap[node] = self.intern(old_names[node])
+            path_remap[path] = self._path(path_remap[old_parent[path]], node_remap[node])
+        for category, category_views in old_views.items():
+            for entity, leaves in category_views.items():
+                self._set_view(category, entity, array('i', (path_remap[leaf] for leaf in leaves)))
+        return removed
+
+    def save(self, path: Path) -> None:
+        self.prune()
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        data = {
+            'nodes': self.names,
+            'paths': [value for parent, node in zip(self._path_parent, self._path_node) for value in (parent, node)],
+            'views': {
+                category: {entity: list(leaves) for entity, leaves in category_views.items()}
+                for category, category_views in self.views.items()
+            },
+        }
+        with path.open('w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+
+    @classmethod
+    def load(cls, path: Path) -> 'ConceptGraph':
+        with Path(path).open('r', encoding='utf-8') as f:
+            data = json.load(f)
+
+        graph = cls()
+        for name in data['nodes']:
+            graph.intern(name)
+        paths = data['paths']
+        for i in range(0, len(paths), 2):
+            graph._path(paths[i], paths[i + 1])
+        for category, category_views in data['views'].items():
+            for entity, leaves in category_views.items():
+                graph._set_view(category, entity, array('i', leaves))
+        return graph
+
+    @classmethod
+    def load_if_exists(cls, path: Path) -> 'ConceptGraph':
+        return cls.load(path) if Path(path).exists() else cls()
+
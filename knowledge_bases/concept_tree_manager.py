@@ -1,15 +1,49 @@
-from typing import Dict, List, Any
+from typing import TYPE_CHECKING, Dict, List, Any, Optional, Set, Tuple
+import asyncio
 import json
+import threading
 from pathlib import Path
-from .wikidata_client import WikidataClient
+from .concept_graph import ConceptGraph
+from .compact_tree import CompactTree
+from .tree_store import TreeStoreReader, save_trees_binary, load_trees_binary
+from .query_executor import QueryExecutor
+from config import QUERY_MAX_CONCURRENCY
+from tree_merge.merger import TreeMerger
 import re
 
+if TYPE_CHECKING:
+    from .base import KnowledgeBase
+
+# try_build_entity_tree 查詢失敗時的回傳值，與「查詢成功但沒有結果」的 None 區分
+BUILD_FAILED = object()
+
 class ConceptTreeManager:
-    def __init__(self):
-        self.wikidata_client = WikidataClient()
+    def __init__(self, knowledge_base: Optional['KnowledgeBase'] = None):
+        # 未指定時依 KNOWLEDGE_BASE 設定在第一次查詢時才建立，只讀寫概念樹時不需要載入 SPARQL 客戶端與快取
+        self._knowledge_base = knowledge_base
+        self._knowledge_base_lock = threading.Lock()
         self.trees_dir = Path('data/trees')
         self.trees_dir.mkdir(parents=True, exist_ok=True)
         self.concept_trees = {}
+        # 跨實體、跨執行共用的概念圖
+        self.concept_graph = ConceptGraph()
+
+    @property
+    def knowledge_base(self) -> 'KnowledgeBase':
+        if self._knowledge_base is None:
+            # 並行的請求可能同時第一次查詢，只建立一個
+            with self._knowledge_base_lock:
+                if self._knowledge_base is None:
+                    from .federated import create_knowledge_base
+                    self._knowledge_base = create_knowledge_base()
+        return self._knowledge_base
+
+    @knowledge_base.setter
+    def knowledge_base(self, knowledge_base: 'KnowledgeBase'):
+        self._knowledge_base = knowledge_base
+
+    # 舊名稱，保留給既有的呼叫端
+    wikidata_client = knowledge_base
 
     def build_trees(self, categorized_entities):
         """為所有類別建立概念樹"""
@@ -41,6 +75,13 @@ class ConceptTreeManager:
             }
         }
         
+        # 以批次查詢預先填入快取，減少逐一查詢的往返次數
+        self.knowledge_base.prefetch(
+            [re.sub(r'\([^)]*\)', '', entity).strip()
+             for entities in categorized_entities.values() for entity in entities],
+            directions=('broader',)
+        )
+        
         for category, entities in categorized_entities.items():
             if not entities:
                 continue
@@ -84,7 +125,7 @@ class ConceptTreeManager:
     def _get_broader_concepts(self, entity_name, keywords):
         """獲取實體的上位概念"""
         concepts = []
-        results = self.wikidata_client.query_hierarchy(entity_name, 'broader')
+        results = self.knowledge_base.query_hierarchy(entity_name, 'broader')
         
         if results:
             for result in results:
@@ -129,33 +170,102 @@ class ConceptTreeManager:
         
         return tree
 
+    def try_build_entity_tree(self, entity: str) -> Any:
+        """建立單一實體的概念樹，沒有結果時回傳 None，查詢失敗時回傳 BUILD_FAILED"""
+        try:
+            tree = self.knowledge_base.build_concept_tree(entity)
+        except Exception as e:
+            print(f"處理實體 '{entity}' 時發生錯誤: {str(e)}")
+            return BUILD_FAILED
+        if tree.children:  # 只保存有結果的樹
+            return self.tree_to_dict(tree)
+        return None
+
+    def build_entity_tree(self, entity: str) -> Optional[Dict[str, Any]]:
+        """建立單一實體的概念樹，沒有結果或發生錯誤時回傳 None"""
+        tree = self.try_build_entity_tree(entity)
+        return None if tree is BUILD_FAILED else tree
+
     def generate_trees(self, entities: Dict[str, List[str]]) -> Dict[str, Any]:
         """為每個分類的實體生成概念樹"""
         trees = {}
+        self.knowledge_base.prefetch(entity for _, entity in self._pending_entities(entities))
         
         for category, entity_list in entities.items():
             if category != 'other':
                 category_trees = {}
                 for entity in entity_list:
-                    try:
-                        tree = self.wikidata_client.build_concept_tree(entity)
-                        if tree.children:  # 只保存有結果的樹
-                            category_trees[entity] = self.tree_to_dict(tree)
-                    except Exception as e:
-                        print(f"處理實體 '{entity}' 時發生錯誤: {str(e)}")
+                    tree = self.build_entity_tree(entity)
+                    if tree:
+                        category_trees[entity] = tree
                 
                 if category_trees:
                     trees[category] = category_trees
         
+        self.concept_graph.upsert_trees(trees)
+        return trees
+
+    def build_trees_bulk(self, entities: Dict[str, List[str]],
+                         max_concurrency: int = QUERY_MAX_CONCURRENCY) -> Tuple[Dict[str, Any], Set[Tuple[str, str]]]:
+        """並行建立概念樹但不加入概念圖，回傳 (概念樹, 查詢失敗的 (類別, 實體))
+
+        失敗的實體與沒有結果的實體不同，呼叫端應在之後重試而不是記錄為已完成。
+        """
+        pending = self._pending_entities(entities)
+        self.knowledge_base.prefetch(entity for _, entity in pending)
+        executor = QueryExecutor(max_concurrency)
+        results = executor.map(self.try_build_entity_tree, [entity for _, entity in pending])
+        failed = {pair for pair, tree in zip(pending, results) if tree is BUILD_FAILED}
+        return self._collect_trees(pending, results), failed
+
+    def generate_trees_bulk(self, entities: Dict[str, List[str]],
+                            max_concurrency: int = QUERY_MAX_CONCURRENCY) -> Dict[str, Any]:
+        """並行為所有實體生成概念樹，結果與 generate_trees 相同"""
+        trees, _ = self.build_trees_bulk(entities, max_concurrency)
+        self.concept_graph.upsert_trees(trees)
+        return trees
+
+    async def generate_trees_async(self, entities: Dict[str, List[str]],
+                                   max_concurrency: int = QUERY_MAX_CONCURRENCY) -> Dict[str, Any]:
+        """generate_trees_bulk 的 asyncio 版本"""
+        pending = self._pending_entities(entities)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.knowledge_base.prefetch, [entity for _, entity in pending])
+        executor = QueryExecutor(max_concurrency)
+        results = await executor.map_async(self.build_entity_tree, [entity for _, entity in pending])
+        trees = self._collect_trees(pending, results)
+        self.concept_graph.upsert_trees(trees)
         return trees
 
+    @staticmethod
+    def _pending_entities(entities: Dict[str, List[str]]) -> List[Tuple[str, str]]:
+        return [
+            (category, entity)
+            for category, entity_list in entities.items()
+            if category != 'other'
+            for entity in entity_list
+        ]
+
+    @staticmethod
+    def _collect_trees(pending: List[Tuple[str, str]], results: List[Optional[Dict[str, Any]]]) -> Dict[str, Any]:
+        trees = {}
+        for (category, entity), tree in zip(pending, results):
+            if tree and tree is not BUILD_FAILED:
+                trees.setdefault(category, {})[entity] = tree
+        return trees
+
+    def merge_category_trees(self, trees: Dict[str, Any]) -> Dict[str, TreeMerger]:
+        """將每個類別中各實體的概念樹合併，來源名稱為實體名稱"""
+        merged = {}
+        for category, category_trees in trees.items():
+            merger = merged[category] = TreeMerger()
+            for entity, tree in category_trees.items():
+                merger.add_tree(tree, entity)
+        return merged
+
     def tree_to_dict(self, node) -> Dict[str, Any]:
         """將樹節點轉換為字典格式"""
-        return {
-            'name': node.name,
-            'level': node.level,
-            'children': [self.tree_to_dict(child) for child in node.children]
-        }
+        return CompactTree.from_concept_node(node).to_dict()
 
     def save_trees(self, trees: Dict[str, Any], filename: str):
         """儲存概念樹到檔案"""
@@ -168,4 +278,28 @@ class ConceptTreeManager:
             with open(self.trees_dir / filename, 'r', encoding='utf-8') as f:
                 return json.load(f)
         except FileNotFoundError:
-            return {}
\ No newline at end of file
+            return {}
+
+    def save_trees_binary(self, trees: Dict[str, Any], filename: str = 'concept_trees.bin'):
+        """以二進位格式儲存概念樹，讀取時不需解析整個檔案"""
+        save_trees_binary(trees, self.trees_dir / filename)
+
+    def load_trees_binary(self, filename: str = 'concept_trees.bin') -> Dict[str, Any]:
+        """從二進位檔載入全部概念樹"""
+        try:
+            return load_trees_binary(self.trees_dir / filename)
+        except FileNotFoundError:
+            return {}
+
+    def open_trees_binary(self, filename: str = 'concept_trees.bin') -> TreeStoreReader:
+        """開啟二進位檔，可只讀取單一類別或實體的概念樹"""
+        return TreeStoreReader(self.trees_dir / filename)
+
+    def load_graph(self, filename: str = 'concept_graph.json') -> ConceptGraph:
+        """載入先前執行累積的概念圖，之後生成的樹會增量加入"""
+        self.concept_graph = ConceptGraph.load_if_exists(self.trees_dir / filename)
+        return self.concept_graph
+
+    def save_graph(self, filename: str = 'concept_graph.json'):
+        """儲存概念圖，共用的上位概念只會出現一次"""
+        self.concept_graph.save(self.trees_dir / filename)
\ No newline at end of file
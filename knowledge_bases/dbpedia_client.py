@@ -1,18 +1,38 @@
-from SPARQLWrapper import SPARQLWrapper, JSON
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 import hashlib
 
 from .base import KnowledgeBase
-from config import DBPEDIA_ENDPOINT
+from .concept_filter import ConceptFilterMixin
+from .query_executor import RetryPolicy, get_endpoint_limiter
+from .sparql_transport import get_transport, project_values
+from config import DBPEDIA_ENDPOINT, SPARQL_TRANSPORT, NEGATIVE_CACHE_EXPIRY, DBPEDIA_HIERARCHY_LIMIT
 from cache.cache_manager import CacheManager
+from cache.memory_cache import get_shared_memory_cache
+from utils.text_processor import to_traditional
 
-class DBpediaClient(KnowledgeBase):
+# 上位: 分類 (含上一層分類) 與本體類型；下位: 以實體為分類或類型的資源
+BROADER_PATH = '(dct:subject/skos:broader?)|dbo:type|rdf:type'
+NARROWER_PATH = 'dct:subject|skos:broader|dbo:type|rdf:type'
+
+class DBpediaClient(ConceptFilterMixin, KnowledgeBase):
     def __init__(self):
-        self.endpoint = SPARQLWrapper(DBPEDIA_ENDPOINT)
-        self.endpoint.setReturnFormat(JSON)
-        self.cache = CacheManager()
-        # 設定 User-Agent 避免被封鎖
-        self.endpoint.addCustomHttpHeader('User-Agent', 'KnowledgeGraphBot/1.0 (kevin@example.com)')
+        self._endpoint = None
+        self.cache = CacheManager(memory_cache=get_shared_memory_cache())
+        self.rate_limiter = get_endpoint_limiter(DBPEDIA_ENDPOINT)
+        self.retry_policy = RetryPolicy()
+        self.transport = (get_transport(DBPEDIA_ENDPOINT, 'KnowledgeGraphBot/1.0 (kevin@example.com)')
+                          if SPARQL_TRANSPORT == 'pooled' else None)
+
+    @property
+    def endpoint(self):
+        if self._endpoint is None:
+            # 延後匯入，第一次查詢時才載入 SPARQLWrapper
+            from SPARQLWrapper import SPARQLWrapper, JSON
+            self._endpoint = SPARQLWrapper(DBPEDIA_ENDPOINT)
+            self._endpoint.setReturnFormat(JSON)
+            # 設定 User-Agent 避免被封鎖
+            self._endpoint.addCustomHttpHeader('User-Agent', 'KnowledgeGraphBot/1.0 (kevin@example.com)')
+        return self._endpoint
 
     def query_concept_hierarchy(self, entity_name: str) -> Dict[str, Any]:
         cache_key = f"dbpedia_{hashlib.md5(entity_name.encode()).hexdigest()}"
@@ -38,12 +58,70 @@ class DBpediaClient(KnowledgeBase):
         LIMIT 10
         """ % entity_name
 
-        self.endpoint.setQuery(query)
-        results = self.endpoint.query().convert()
+        results = self.retry_policy.call(self._send_query, query)
         
         self.cache.set(cache_key, results)
         return results
 
+    def query_hierarchy(self, entity_name: str, direction: str = 'broader') -> Dict[str, Any]:
+        """查詢實體的上位或下位概念，回傳與 WikidataClient 相同的 ?item ?itemLabel 格式"""
+        query = self._build_hierarchy_query(entity_name, direction)
+        cache_key = f"dbpedia_query_{hashlib.md5(' '.join(query.split()).encode('utf-8')).hexdigest()}"
+        
+        cached_result = self.cache.get(cache_key)
+        if cached_result is not None:
+            return cached_result
+        
+        results = self.retry_policy.call(self._send_query, query)
+        # 中文維基百科的標籤多為簡體，轉成繁體後才能與商業關鍵詞比對
+        for binding in results['results']['bindings']:
+            if 'itemLabel' in binding:
+                binding['itemLabel']['value'] = to_traditional(binding['itemLabel']['value'])
+        
+        if results['results']['bindings']:
+            self.cache.set(cache_key, results)
+        else:
+            self.cache.set(cache_key, results, ttl=NEGATIVE_CACHE_EXPIRY)
+        return results
+
+    def _build_hierarchy_query(self, entity_name: str, direction: str = 'broader') -> str:
+        name = entity_name.replace('\\', '\\\\').replace('"', '\\"')
+        if direction == 'broader':
+            path = f"?entity {BROADER_PATH} ?item ."
+        else:
+            path = f"?item {NARROWER_PATH} ?entity ."
+        
+        return f"""
+        PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
+        PREFIX rdf: <http://www.w3.org/1999/02/22-rdf-syntax-ns#>
+        PREFIX dbo: <http://dbpedia.org/ontology/>
+        PREFIX dct: <http://purl.org/dc/terms/>
+        PREFIX skos: <http://www.w3.org/2004/02/skos/core#>
+        
+        SELECT DISTINCT ?item ?itemLabel
+        WHERE {{
+          ?entity rdfs:label "{name}"@zh .
+          {path}
+          ?item rdfs:label ?itemLabel .
+          FILTER(LANG(?itemLabel) = "zh")
+        }}
+        LIMIT {DBPEDIA_HIERARCHY_LIMIT}
+        """
+
+    def get_concepts(self, entity_name: str) -> Tuple[List[str], List[str]]:
+        """返回上位概念和下位概念的元組"""
+        return self.extract_concepts(
+            self.query_hierarchy(entity_name, 'broader'),
+            self.query_hierarchy(entity_name, 'narrower')
+        )
+
+    def _send_query(self, query: str) -> Dict[str, Any]:
+        with self.rate_limiter:
+            if self.transport is not None:
+                return self.transport.query(query, project_values)
+            self.endpoint.setQuery(query)
+            return self.endpoint.query().convert()
+
     def get_broader_concepts(self, entity_name: str) -> List[str]:
         try:
             results = self.query_concept_hierarchy(entity_name)
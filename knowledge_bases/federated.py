@@ -0,0 +1,249 @@
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .base import KnowledgeBase
+from .query_executor import throttle_wait_time
+from config import (
+    KNOWLEDGE_BASE, FEDERATION_SOURCES, FEDERATION_STRATEGY, FEDERATION_LATENCY_BUDGET,
+    FEDERATION_PREFETCH_TIMEOUT, CIRCUIT_BREAKER_FAILURES, CIRCUIT_BREAKER_COOLDOWN, LOCAL_INDEX_PATH
+)
+
+
+class CircuitBreaker:
+    """連續失敗或過慢 failure_threshold 次後斷開，cooldown 秒內不再送出請求
+
+    冷卻結束後進入半開狀態，只放行一個試探請求：成功則恢復，失敗則再次斷開。
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = CIRCUIT_BREAKER_FAILURES,
+                 cooldown: float = CIRCUIT_BREAKER_COOLDOWN, slow_call_threshold: Optional[float] = None):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.slow_call_threshold = slow_call_threshold
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if time.monotonic() - self.opened_at < self.cooldown:
+                    return False
+                self.state = self.HALF_OPEN
+                self._probing = False
+            # 半開狀態同時只允許一個試探請求
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record(self, elapsed: float, error: Optional[BaseException] = None) -> None:
+        """記錄一次呼叫的結果，超過 slow_call_threshold 的呼叫視為失敗"""
+        slow = self.slow_call_threshold is not None and elapsed > self.slow_call_threshold
+        with self._lock:
+            if error is None and not slow:
+                self.state = self.CLOSED
+                self.failures = 0
+                self._probing = False
+                return
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+                self._probing = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'state': self.state, 'failures': self.failures}
+
+
+def _has_concepts(concepts: Tuple[List[str], List[str]]) -> bool:
+    broader, narrower = concepts
+    return bool(broader or narrower)
+
+
+def _has_bindings(results: Dict[str, Any]) -> bool:
+    return bool(results and results.get('results', {}).get('bindings'))
+
+
+def _merge_concepts(answers: List[Tuple[List[str], List[str]]]) -> Tuple[List[str], List[str]]:
+    """依來源優先順序合併：上位概念保留第一個來源的層級順序，其餘來源的新概念接在後面"""
+    broader: Dict[str, None] = {}
+    narrower = set()
+    for answer_broader, answer_narrower in answers:
+        broader.update(dict.fromkeys(answer_broader))
+        narrower.update(answer_narrower)
+    return list(broader), sorted(narrower)
+
+
+def _merge_results(answers: List[Dict[str, Any]]) -> Dict[str, Any]:
+    variables: Dict[str, None] = {}
+    bindings = []
+    for results in answers:
+        variables.update(dict.fromkeys(results.get('head', {}).get('vars', [])))
+        bindings.extend(results.get('results', {}).get('bindings', []))
+    return {"head": {"vars": list(variables)}, "results": {"bindings": bindings}}
+
+
+class FederatedKnowledgeBase(KnowledgeBase):
+    """同時向多個知識庫查詢
+
+    strategy 為 "first" 時回傳最先完成的有效答案，"merge" 時合併 latency_budget 秒內完成的所有答案；
+    超過時間仍未完成的來源不再等待。每個來源有各自的斷路器，失敗或過慢的來源在冷卻期間直接略過。
+    sources 依優先順序排列，合併與同時完成時以前面的來源為準。
+    """
+
+    def __init__(self, sources: Iterable[Tuple[str, KnowledgeBase]], strategy: str = FEDERATION_STRATEGY,
+                 latency_budget: float = FEDERATION_LATENCY_BUDGET,
+                 failure_threshold: int = CIRCUIT_BREAKER_FAILURES, cooldown: float = CIRCUIT_BREAKER_COOLDOWN,
+                 prefetch_timeout: Optional[float] = FEDERATION_PREFETCH_TIMEOUT, max_workers: int = 16):
+        if strategy not in ('first', 'merge'):
+            raise ValueError(f"未知的合併策略: {strategy}")
+        self.sources: Dict[str, KnowledgeBase] = dict(sources)
+        if not self.sources:
+            raise ValueError("至少需要一個知識庫")
+        self.strategy = strategy
+        self.latency_budget = latency_budget
+        self.prefetch_timeout = prefetch_timeout
+        self.breakers = {
+            name: CircuitBreaker(failure_threshold, cooldown, slow_call_threshold=latency_budget)
+            for name in self.sources
+        }
+        # 超過時間預算的查詢會在背景繼續執行，因此使用常駐的執行緒池而不是每次建立
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='federated')
+
+    def _submit(self, name: str, func: Callable[..., Any], *args, record_slow: bool = True) -> Future:
+        """在執行緒池中呼叫來源，結果記錄到該來源的斷路器；record_slow 為 False 時只記錄錯誤"""
+        breaker = self.breakers[name]
+
+        def call():
+            start = time.monotonic()
+            throttled = throttle_wait_time()
+
+            def elapsed() -> float:
+                if not record_slow:
+                    return 0.0
+                # 扣除等待自身限流與重試退避的時間，冷快取或大量查詢時的節流不算是來源過慢
+                return time.monotonic() - start - (throttle_wait_time() - throttled)
+
+            try:
+                result = func(*args)
+            except BaseException as e:
+                breaker.record(elapsed(), e)
+                raise
+            # 逾時才完成的呼叫在這裡記錄為過慢
+            breaker.record(elapsed())
+            return result
+
+        return self._pool.submit(call)
+
+    def _fan_out(self, method: str, args: Tuple, is_good: Callable[[Any], bool],
+                 merge: Callable[[List[Any]], Any]) -> Any:
+        futures = {
+            self._submit(name, getattr(source, method), *args): name
+            for name, source in self.sources.items()
+            if self.breakers[name].allow()
+        }
+        order = {name: index for index, name in enumerate(self.sources)}
+        answers: Dict[str, Any] = {}
+        deadline = time.monotonic() + self.latency_budget
+        pending = set(futures)
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in sorted(done, key=lambda future: order[futures[future]]):
+                if future.exception() is not None:
+                    print(f"知識庫 {futures[future]} 查詢錯誤: {future.exception()}")
+                    continue
+                answer = future.result()
+                if self.strategy == 'first' and is_good(answer):
+                    return answer
+                answers[futures[future]] = answer
+
+        good = [answers[name] for name in sorted(answers, key=order.get) if is_good(answers[name])]
+        if good:
+            return merge(good)
+        if not answers:
+            # 所有來源都失敗、逾時或被斷路器略過，與「查無結果」區分，呼叫端可以稍後重試
+            raise RuntimeError(f"沒有知識庫在 {self.latency_budget} 秒內完成 {method} 查詢")
+        # 沒有有效答案時回傳任一個已完成的 (空) 結果
+        return next(iter(answers.values()))
+
+    def query_hierarchy(self, entity_name: str, direction: str = 'broader') -> Dict[str, Any]:
+        return self._fan_out('query_hierarchy', (entity_name, direction), _has_bindings, _merge_results)
+
+    def get_concepts(self, entity_name: str) -> Tuple[List[str], List[str]]:
+        """返回上位概念和下位概念的元組"""
+        return self._fan_out('get_concepts', (entity_name,), _has_concepts, _merge_concepts)
+
+    def prefetch(self, entity_names: Iterable[str], directions: Iterable[str] = ('broader', 'narrower')) -> None:
+        """各來源同時預先填入快取，最多等待 prefetch_timeout 秒
+
+        只送給有實作批次預先查詢的來源；沿用 KnowledgeBase.prefetch 的來源什麼都不做，
+        不能讓 "first" 模式以為已經完成。strategy 為 "first" 時任一批次來源完成即返回，
+        其餘來源在背景繼續填入快取。批次查詢本來就比單一查詢久，只有錯誤會記錄到斷路器。
+        """
+        names = list(entity_names)
+        directions = tuple(directions)
+        pending = {
+            self._submit(name, source.prefetch, names, directions, record_slow=False)
+            for name, source in self.sources.items()
+            if type(source).prefetch is not KnowledgeBase.prefetch and self.breakers[name].allow()
+        }
+        deadline = None if self.prefetch_timeout is None else time.monotonic() + self.prefetch_timeout
+        while pending:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    print(f"預先查詢錯誤: {future.exception()}")
+                elif self.strategy == 'first':
+                    return
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        """各來源斷路器的狀態"""
+        return {name: breaker.snapshot() for name, breaker in self.breakers.items()}
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False)
+
+
+def create_source(name: str) -> Optional[KnowledgeBase]:
+    """依名稱建立單一知識庫，本地索引不存在時回傳 None"""
+    if name == 'wikidata':
+        from .wikidata_client import WikidataClient
+        return WikidataClient()
+    if name == 'dbpedia':
+        from .dbpedia_client import DBpediaClient
+        return DBpediaClient()
+    if name == 'local':
+        if not LOCAL_INDEX_PATH.exists():
+            return None
+        from .local_client import LocalKnowledgeBase
+        return LocalKnowledgeBase()
+    raise ValueError(f"未知的知識庫: {name}")
+
+
+def create_knowledge_base(name: str = KNOWLEDGE_BASE) -> KnowledgeBase:
+    """建立設定中的知識庫，"federated" 會組合 FEDERATION_SOURCES 中可用的來源"""
+    if name != 'federated':
+        source = create_source(name)
+        if source is None:
+            raise FileNotFoundError(f"找不到本地索引: {LOCAL_INDEX_PATH}")
+        return source
+    sources = [(source_name, create_source(source_name)) for source_name in FEDERATION_SOURCES]
+    return FederatedKnowledgeBase((source_name, source) for source_name, source in sources if source is not None)
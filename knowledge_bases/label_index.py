@@ -0,0 +1,119 @@
+import pickle
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .local_index import HierarchyIndex
+
+
+class LabelIndex:
+    """中文標籤與別名的字元 n-gram 倒排索引，在本地完成子字串與模糊比對"""
+
+    def __init__(self, n: int = 2):
+        self.n = n
+        # label id -> (標籤, qid)
+        self.entries: List[Tuple[str, str]] = []
+        self._postings: Dict[str, array] = {}
+        self._seen = set()
+
+    def _grams(self, text: str) -> List[str]:
+        if len(text) <= self.n:
+            return [text]
+        return [text[i:i + self.n] for i in range(len(text) - self.n + 1)]
+
+    def add(self, qid: str, label: str) -> None:
+        if not label or (qid, label) in self._seen:
+            return
+        self._seen.add((qid, label))
+        label_id = len(self.entries)
+        self.entries.append((label, qid))
+        for gram in set(self._grams(label)):
+            postings = self._postings.get(gram)
+            if postings is None:
+                postings = self._postings[gram] = array('i')
+            postings.append(label_id)
+
+    def add_many(self, pairs: Iterable[Tuple[str, str]]) -> None:
+        for qid, label in pairs:
+            self.add(qid, label)
+
+    def _substring_candidates(self, text: str) -> Iterable[int]:
+        if len(text) < self.n:
+            # 查詢字串比 n-gram 還短時只能逐一比對
+            return range(len(self.entries))
+        postings = sorted((self._postings.get(gram, array('i')) for gram in set(self._grams(text))), key=len)
+        if not postings or not postings[0]:
+            return []
+        candidates = set(postings[0])
+        for other in postings[1:]:
+            candidates.intersection_update(other)
+            if not candidates:
+                break
+        return candidates
+
+    def search(self, text: str, limit: int = 10, min_score: float = 0.5) -> List[Tuple[str, str, float]]:
+        """回傳 [(qid, 標籤, 分數)]，優先子字串比對，沒有結果時改用 n-gram 相似度"""
+        text = text.strip()
+        if not text:
+            return []
+
+        matches = {}
+        for label_id in self._substring_candidates(text):
+            label, qid = self.entries[label_id]
+            if text in label:
+                # 標籤越接近查詢字串分數越高，完全相同為 1
+                score = len(text) / len(label)
+                if score > matches.get(qid, (None, 0.0))[1]:
+                    matches[qid] = (label, score)
+
+        if not matches:
+            grams = set(self._grams(text))
+            overlap: Dict[int, int] = {}
+            for gram in grams:
+                for label_id in self._postings.get(gram, ()):
+                    overlap[label_id] = overlap.get(label_id, 0) + 1
+            for label_id, shared in overlap.items():
+                label, qid = self.entries[label_id]
+                # Dice 係數
+                score = 2 * shared / (len(grams) + len(set(self._grams(label))))
+                if score >= min_score and score > matches.get(qid, (None, 0.0))[1]:
+                    matches[qid] = (label, score)
+
+        ranked = sorted(matches.items(), key=lambda item: (-item[1][1], len(item[1][0]), item[0]))
+        return [(qid, label, score) for qid, (label, score) in ranked[:limit]]
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def save(self, path: Path) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open('wb') as f:
+            pickle.dump({'n': self.n, 'entries': self.entries, 'postings': self._postings},
+                        f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path: Path) -> 'LabelIndex':
+        with Path(path).open('rb') as f:
+            state = pickle.load(f)
+        index = cls(state['n'])
+        index.entries = state['entries']
+        index._postings = state['postings']
+        index._seen = {(qid, label) for label, qid in index.entries}
+        return index
+
+    @classmethod
+    def load_if_exists(cls, path: Path) -> Optional['LabelIndex']:
+        return cls.load(path) if Path(path).exists() else None
+
+    @classmethod
+    def from_hierarchy_index(cls, hierarchy: HierarchyIndex, n: int = 2) -> 'LabelIndex':
+        """以離線索引中的標籤與別名建立"""
+        index = cls(n)
+        for node, label in enumerate(hierarchy.labels):
+            if label:
+                index.add(hierarchy.qids[node], label)
+        for node, aliases in hierarchy.aliases.items():
+            for alias in aliases:
+                index.add(hierarchy.qids[node], alias)
+        return index
@@ -0,0 +1,45 @@
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Tuple
+
+from .base import KnowledgeBase
+from .concept_filter import ConceptFilterMixin
+from .local_index import HierarchyIndex, WIKIDATA_ENTITY_PREFIX
+from config import LOCAL_INDEX_PATH, HIERARCHY_MAX_DEPTH
+
+class LocalKnowledgeBase(ConceptFilterMixin, KnowledgeBase):
+    """以本地索引回答上下位查詢，不需要連線到 SPARQL 端點"""
+
+    def __init__(self, index: Optional[HierarchyIndex] = None, index_path: Path = LOCAL_INDEX_PATH,
+                 max_depth: Optional[int] = HIERARCHY_MAX_DEPTH):
+        self.index = index if index is not None else HierarchyIndex.load(index_path)
+        self.max_depth = max_depth
+
+    def _item_uri(self, node: int) -> str:
+        key = self.index.qids[node]
+        return key if '://' in key else WIKIDATA_ENTITY_PREFIX + key
+
+    def query_hierarchy(self, entity_name: str, direction: str = 'broader') -> Dict[str, Any]:
+        """查詢實體的上位或下位概念，回傳與 SPARQL JSON 相同的格式"""
+        nodes = self.index.lookup(entity_name)
+        bindings = []
+        for node, depth, path in self.index.traverse(nodes, direction, self.max_depth):
+            binding = {
+                'item': {'type': 'uri', 'value': self._item_uri(node)},
+                'depth': {'type': 'literal', 'value': str(depth)},
+                'path': {'type': 'literal', 'value': ' '.join(
+                    f"wdt:{relation}/{self.index.qids[step]}" for relation, step in path
+                )},
+            }
+            label = self.index.labels[node]
+            if label:
+                binding['itemLabel'] = {'type': 'literal', 'xml:lang': 'zh', 'value': label}
+            bindings.append(binding)
+        
+        return {"head": {"vars": ["item", "itemLabel", "depth", "path"]}, "results": {"bindings": bindings}}
+
+    def get_concepts(self, entity_name: str) -> Tuple[List[str], List[str]]:
+        """返回上位概念和下位概念的元組"""
+        return self.extract_concepts(
+            self.query_hierarchy(entity_name, 'broader'),
+            self.query_hierarchy(entity_name, 'narrower')
+        )
@@ -0,0 +1,280 @@
+import bz2
+import gzip
+import json
+import pickle
+import re
+from array import array
+from collections import deque
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+# 索引保留的關係，順序即為邊上儲存的關係編號
+INDEX_RELATIONS = ('P279', 'P31', 'P361')
+
+# DBpedia 等非 Wikidata 資料的對應關係
+PREDICATE_RELATIONS = {
+    'http://www.wikidata.org/prop/direct/P279': 'P279',
+    'http://www.wikidata.org/prop/direct/P31': 'P31',
+    'http://www.wikidata.org/prop/direct/P361': 'P361',
+    'http://www.w3.org/2000/01/rdf-schema#subClassOf': 'P279',
+    'http://www.w3.org/2004/02/skos/core#broader': 'P279',
+    'http://www.w3.org/1999/02/22-rdf-syntax-ns#type': 'P31',
+    'http://purl.org/dc/terms/subject': 'P31',
+}
+LABEL_PREDICATES = {
+    'http://www.w3.org/2000/01/rdf-schema#label',
+    'http://schema.org/name',
+}
+ALIAS_PREDICATES = {
+    'http://www.w3.org/2004/02/skos/core#altLabel',
+}
+
+LABEL_LANGUAGES = ('zh', 'zh-hant', 'zh-tw', 'zh-hk')
+
+WIKIDATA_ENTITY_PREFIX = 'http://www.wikidata.org/entity/'
+
+_NT_LINE = re.compile(r'^<([^>]*)>\s+<([^>]*)>\s+(?:<([^>]*)>|"((?:[^"\\]|\\.)*)"(?:@([A-Za-z0-9-]+)|\^\^<[^>]*>)?)\s*\.\s*$')
+_NT_ESCAPE = re.compile(r'\\(u[0-9A-Fa-f]{4}|U[0-9A-Fa-f]{8}|.)')
+_NT_SIMPLE_ESCAPES = {'t': '\t', 'n': '\n', 'r': '\r', 'b': '\b', 'f': '\f', '"': '"', "'": "'", '\\': '\\'}
+
+
+def _open_dump(path: Path):
+    path = Path(path)
+    if path.suffix == '.gz':
+        return gzip.open(path, 'rt', encoding='utf-8')
+    if path.suffix == '.bz2':
+        return bz2.open(path, 'rt', encoding='utf-8')
+    return path.open('r', encoding='utf-8')
+
+
+def _unescape_nt(text: str) -> str:
+    def replace(match):
+        escape = match.group(1)
+        if escape[0] in 'uU' and len(escape) > 1:
+            return chr(int(escape[1:], 16))
+        return _NT_SIMPLE_ESCAPES.get(escape, escape)
+    return _NT_ESCAPE.sub(replace, text)
+
+
+def _node_key(iri: str) -> str:
+    """Wikidata 實體以 QID 表示，其他資料來源保留完整 IRI"""
+    if iri.startswith(WIKIDATA_ENTITY_PREFIX):
+        return iri[len(WIKIDATA_ENTITY_PREFIX):]
+    return iri
+
+
+class HierarchyIndexBuilder:
+    """逐筆加入標籤與關係，最後建立唯讀的 HierarchyIndex"""
+
+    def __init__(self, languages: Tuple[str, ...] = LABEL_LANGUAGES):
+        self.languages = languages
+        self._ids: Dict[str, int] = {}
+        self._qids: List[str] = []
+        # node -> (語言優先順序, 標籤)
+        self._labels: Dict[int, Tuple[int, str]] = {}
+        self._aliases: Dict[int, List[str]] = {}
+        self._sources = array('i')
+        self._targets = array('i')
+        self._relations = array('B')
+
+    def _intern(self, key: str) -> int:
+        node = self._ids.get(key)
+        if node is None:
+            node = len(self._qids)
+            self._ids[key] = node
+            self._qids.append(key)
+        return node
+
+    def add_label(self, key: str, label: str, language: str = 'zh') -> None:
+        if language not in self.languages:
+            return
+        node = self._intern(key)
+        rank = self.languages.index(language)
+        current = self._labels.get(node)
+        if current is None or rank < current[0]:
+            self._labels[node] = (rank, label)
+            # 被取代的標籤保留為別名
+            if current is not None and current[1] != label:
+                self.add_alias(key, current[1], language)
+        elif label != current[1]:
+            self.add_alias(key, label, language)
+
+    def add_alias(self, key: str, alias: str, language: str = 'zh') -> None:
+        if language not in self.languages:
+            return
+        aliases = self._aliases.setdefault(self._intern(key), [])
+        if alias not in aliases:
+            aliases.append(alias)
+
+    def add_edge(self, key: str, relation: str, target: str) -> None:
+        if relation not in INDEX_RELATIONS:
+            return
+        self._sources.append(self._intern(key))
+        self._targets.append(self._intern(target))
+        self._relations.append(INDEX_RELATIONS.index(relation))
+
+    def add_json_dump(self, path: Path) -> None:
+        """讀取 Wikidata JSON dump (整個陣列每行一個實體，或 JSON Lines)"""
+        with _open_dump(path) as f:
+            for line in f:
+                line = line.strip().rstrip(',')
+                if not line or line in ('[', ']'):
+                    continue
+                self.add_entity(json.loads(line))
+
+    def add_entity(self, entity: Dict) -> None:
+        key = entity.get('id')
+        if not key:
+            return
+        for language, label in entity.get('labels', {}).items():
+            self.add_label(key, label['value'], language)
+        for language, aliases in entity.get('aliases', {}).items():
+            for alias in aliases:
+                self.add_alias(key, alias['value'], language)
+        for relation in INDEX_RELATIONS:
+            for claim in entity.get('claims', {}).get(relation, []):
+                snak = claim.get('mainsnak', {})
+                if snak.get('snaktype') != 'value':
+                    continue
+                target = snak.get('datavalue', {}).get('value', {})
+                if isinstance(target, dict) and target.get('id'):
+                    self.add_edge(key, relation, target['id'])
+
+    def add_ntriples_dump(self, path: Path) -> None:
+        """讀取 N-Triples dump，只保留標籤、別名與索引的關係"""
+        with _open_dump(path) as f:
+            for line in f:
+                match = _NT_LINE.match(line)
+                if not match:
+                    continue
+                subject, predicate, obj_iri, literal, language = match.groups()
+                if obj_iri is not None:
+                    relation = PREDICATE_RELATIONS.get(predicate)
+                    if relation:
+                        self.add_edge(_node_key(subject), relation, _node_key(obj_iri))
+                elif predicate in LABEL_PREDICATES:
+                    self.add_label(_node_key(subject), _unescape_nt(literal), language or '')
+                elif predicate in ALIAS_PREDICATES:
+                    self.add_alias(_node_key(subject), _unescape_nt(literal), language or '')
+
+    def add_dump(self, path: Path) -> None:
+        name = Path(path).name
+        for suffix in ('.gz', '.bz2'):
+            if name.endswith(suffix):
+                name = name[:-len(suffix)]
+        if name.endswith('.nt'):
+            self.add_ntriples_dump(path)
+        else:
+            self.add_json_dump(path)
+
+    def build(self) -> 'HierarchyIndex':
+        count = len(self._qids)
+        labels = [None] * count
+        for node, (_, label) in self._labels.items():
+            labels[node] = label
+        aliases = {node: tuple(values) for node, values in self._aliases.items()}
+
+        # 去除重複的邊
+        edges = sorted(set(zip(self._sources, self._targets, self._relations)))
+        parents = _build_csr(count, ((s, t, r) for s, t, r in edges))
+        children = _build_csr(count, sorted((t, s, r) for s, t, r in edges))
+        return HierarchyIndex(list(self._qids), labels, aliases, parents, children)
+
+
+def _build_csr(count: int, edges: Iterable[Tuple[int, int, int]]) -> Tuple[array, array, array]:
+    """由已依起點排序的邊建立 CSR 鄰接陣列 (offsets, targets, relations)"""
+    offsets = array('i', [0]) * (count + 1)
+    targets = array('i')
+    relations = array('B')
+    for source, target, relation in edges:
+        offsets[source + 1] += 1
+        targets.append(target)
+        relations.append(relation)
+    for i in range(count):
+        offsets[i + 1] += offsets[i]
+    return offsets, targets, relations
+
+
+class HierarchyIndex:
+    """以陣列儲存的上下位關係索引，可完全離線查詢"""
+
+    def __init__(self, qids: List[str], labels: List[Optional[str]], aliases: Dict[int, Tuple[str, ...]],
+                 parents: Tuple[array, array, array], children: Tuple[array, array, array]):
+        self.qids = qids
+        self.labels = labels
+        self.aliases = aliases
+        self._parents = parents
+        self._children = children
+        self._label_ids: Dict[str, List[int]] = {}
+        for node, label in enumerate(labels):
+            if label:
+                self._label_ids.setdefault(label, []).append(node)
+        for node, values in aliases.items():
+            for alias in values:
+                ids = self._label_ids.setdefault(alias, [])
+                if node not in ids:
+                    ids.append(node)
+
+    def __len__(self) -> int:
+        return len(self.qids)
+
+    def lookup(self, label: str) -> List[int]:
+        """以標籤或別名找出節點"""
+        return self._label_ids.get(label, [])
+
+    def _neighbors(self, csr: Tuple[array, array, array], node: int) -> Iterator[Tuple[int, str]]:
+        offsets, targets, relations = csr
+        for i in range(offsets[node], offsets[node + 1]):
+            yield targets[i], INDEX_RELATIONS[relations[i]]
+
+    def parents(self, node: int) -> List[Tuple[int, str]]:
+        return list(self._neighbors(self._parents, node))
+
+    def children(self, node: int) -> List[Tuple[int, str]]:
+        return list(self._neighbors(self._children, node))
+
+    def traverse(self, nodes: Iterable[int], direction: str = 'broader',
+                 max_depth: Optional[int] = None) -> List[Tuple[int, int, List[Tuple[str, int]]]]:
+        """廣度優先展開上位或下位節點，回傳 (節點, 深度, 路徑)，路徑為 [(關係, 節點), ...]"""
+        csr = self._parents if direction == 'broader' else self._children
+        queue = deque((node, 0, []) for node in nodes)
+        visited = {node for node, _, _ in queue}
+        found = []
+        while queue:
+            node, depth, path = queue.popleft()
+            if max_depth is not None and depth >= max_depth:
+                continue
+            for neighbor, relation in self._neighbors(csr, node):
+                if neighbor in visited:
+                    continue
+                visited.add(neighbor)
+                neighbor_path = path + [(relation, neighbor)]
+                found.append((neighbor, depth + 1, neighbor_path))
+                queue.append((neighbor, depth + 1, neighbor_path))
+        return found
+
+    def save(self, path: Path) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        state = {
+            'qids': self.qids,
+            'labels': self.labels,
+            'aliases': self.aliases,
+            'parents': self._parents,
+            'children': self._children,
+        }
+        with path.open('wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @classmethod
+    def load(cls, path: Path) -> 'HierarchyIndex':
+        with Path(path).open('rb') as f:
+            state = pickle.load(f)
+        return cls(state['qids'], state['labels'], state['aliases'], state['parents'], state['children'])
+
+    @classmethod
+    def from_dumps(cls, paths: Iterable[Path]) -> 'HierarchyIndex':
+        builder = HierarchyIndexBuilder()
+        for path in paths:
+            builder.add_dump(path)
+        return builder.build()
@@ -0,0 +1,216 @@
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from config import (
+    ENDPOINT_RATE_LIMITS, DEFAULT_RATE_LIMIT, QUERY_MAX_CONCURRENCY,
+    QUERY_MAX_RETRIES, QUERY_BACKOFF_BASE, QUERY_BACKOFF_MAX,
+    QUERY_BATCH_SIZE, QUERY_MIN_BATCH_SIZE, QUERY_MAX_BATCH_SIZE
+)
+
+
+# 每個執行緒累計在限流與重試退避上等待的秒數，用來從呼叫耗時中扣除自身節流造成的等待
+_throttle_wait = threading.local()
+
+
+def _record_throttle_wait(seconds: float) -> None:
+    _throttle_wait.total = getattr(_throttle_wait, 'total', 0.0) + seconds
+
+
+def throttle_wait_time() -> float:
+    """目前執行緒到目前為止在限流器與重試退避上等待的總秒數"""
+    return getattr(_throttle_wait, 'total', 0.0)
+
+
+class TokenBucket:
+    """權杖桶限流：平均每秒 rate 個請求，最多累積 capacity 個"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class EndpointLimiter:
+    """單一端點的限流器，同時限制請求速率與並行數量"""
+
+    def __init__(self, rate: float, burst: float, max_parallel: int):
+        self.bucket = TokenBucket(rate, burst)
+        self._slots = threading.BoundedSemaphore(max_parallel)
+
+    def __enter__(self):
+        start = time.monotonic()
+        self._slots.acquire()
+        self.bucket.acquire()
+        _record_throttle_wait(time.monotonic() - start)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._slots.release()
+        return False
+
+
+_limiters: Dict[str, EndpointLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_endpoint_limiter(endpoint_url: str) -> EndpointLimiter:
+    """取得端點共用的限流器，同一行程內所有用戶端共用配額"""
+    with _limiters_lock:
+        limiter = _limiters.get(endpoint_url)
+        if limiter is None:
+            rate, burst, max_parallel = ENDPOINT_RATE_LIMITS.get(endpoint_url, DEFAULT_RATE_LIMIT)
+            limiter = EndpointLimiter(rate, burst, max_parallel)
+            _limiters[endpoint_url] = limiter
+        return limiter
+
+
+def get_status_code(error: BaseException) -> Optional[int]:
+    """從各種 HTTP 例外中取出狀態碼"""
+    code = getattr(error, 'code', None)
+    if isinstance(code, int):
+        return code
+    response = getattr(error, 'response', None)
+    status = getattr(response, 'status_code', None)
+    if isinstance(status, int):
+        return status
+    # SPARQLWrapper 會將 500 轉成 EndPointInternalError
+    if type(error).__name__ == 'EndPointInternalError':
+        return 500
+    return None
+
+
+def _get_retry_after(error: BaseException) -> Optional[float]:
+    headers = getattr(error, 'headers', None)
+    if headers is None:
+        headers = getattr(getattr(error, 'response', None), 'headers', None)
+    if not headers:
+        return None
+    value = headers.get('Retry-After')
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def is_timeout_error(error: BaseException) -> bool:
+    """查詢是否因為過大而逾時 (Wikidata 逾時會回傳 500，URL 過長為 414)"""
+    status = get_status_code(error)
+    if status is not None:
+        return status in (414, 500, 502, 503, 504)
+    if isinstance(error, TimeoutError):
+        return True
+    return isinstance(getattr(error, 'reason', None), TimeoutError)
+
+
+class RetryPolicy:
+    """針對 429 與 5xx 回應的指數退避重試"""
+
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(self, max_retries: int = QUERY_MAX_RETRIES, backoff_base: float = QUERY_BACKOFF_BASE,
+                 max_backoff: float = QUERY_BACKOFF_MAX):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.max_backoff = max_backoff
+
+    def is_retryable(self, error: BaseException) -> bool:
+        status = get_status_code(error)
+        if status is not None:
+            return status in self.RETRY_STATUSES
+        # 連線逾時或中斷也值得重試
+        return isinstance(error, (TimeoutError, ConnectionError)) or type(error).__name__ == 'URLError'
+
+    def delay(self, attempt: int, error: BaseException) -> float:
+        retry_after = _get_retry_after(error)
+        if retry_after is not None:
+            return min(retry_after, self.max_backoff)
+        backoff = min(self.max_backoff, self.backoff_base * (2 ** attempt))
+        return backoff * random.uniform(0.5, 1.0)
+
+    def call(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        return self.call_if(self.is_retryable, func, *args, **kwargs)
+
+    def call_if(self, should_retry: Callable[[BaseException], bool], func: Callable[..., Any], *args, **kwargs) -> Any:
+        """只重試 should_retry 為真的錯誤，其餘錯誤直接拋出"""
+        attempt = 0
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                if attempt >= self.max_retries or not should_retry(e):
+                    raise
+                delay = self.delay(attempt, e)
+                time.sleep(delay)
+                _record_throttle_wait(delay)
+                attempt += 1
+
+
+class AdaptiveBatchSize:
+    """自適應批次大小：逾時時減半，成功時逐步放大"""
+
+    def __init__(self, initial: int = QUERY_BATCH_SIZE, minimum: int = QUERY_MIN_BATCH_SIZE,
+                 maximum: int = QUERY_MAX_BATCH_SIZE):
+        self.minimum = minimum
+        self.maximum = maximum
+        self._size = max(minimum, min(initial, maximum))
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def on_success(self) -> None:
+        with self._lock:
+            self._size = min(self.maximum, self._size + max(1, self._size // 4))
+
+    def on_timeout(self) -> None:
+        with self._lock:
+            self._size = max(self.minimum, self._size // 2)
+
+
+class QueryExecutor:
+    """以執行緒池並行執行多個阻塞式查詢"""
+
+    def __init__(self, max_concurrency: int = QUERY_MAX_CONCURRENCY):
+        self.max_concurrency = max_concurrency
+
+    def map(self, func: Callable[[Any], Any], items: Iterable[Any]) -> List[Any]:
+        """依輸入順序回傳結果"""
+        items = list(items)
+        if not items:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(items))) as pool:
+            return list(pool.map(func, items))
+
+    async def map_async(self, func: Callable[[Any], Any], items: Iterable[Any]) -> List[Any]:
+        """asyncio 版本，阻塞式查詢在執行緒池中執行，並以 semaphore 限制並行數量"""
+        items = list(items)
+        if not items:
+            return []
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(items))) as pool:
+            async def run(item):
+                async with semaphore:
+                    return await loop.run_in_executor(pool, func, item)
+
+            return await asyncio.gather(*(run(item) for item in items))
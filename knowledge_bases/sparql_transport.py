@@ -0,0 +1,308 @@
+import codecs
+import http.client
+import io
+import json
+import queue
+import threading
+import zlib
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
+from urllib.error import HTTPError
+from urllib.parse import urlencode, urlsplit
+
+from config import (
+    ENDPOINT_RATE_LIMITS, DEFAULT_RATE_LIMIT,
+    SPARQL_TIMEOUT, SPARQL_USER_AGENT, SPARQL_MAX_GET_LENGTH, SPARQL_READ_CHUNK_SIZE
+)
+
+# 回傳 None 表示捨棄該筆結果，否則回傳 (可能經過投影的) binding
+BindingFilter = Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]
+
+# 重用的連線可能已被伺服器關閉，這些錯誤會以新連線重送一次
+_STALE_CONNECTION_ERRORS = (http.client.RemoteDisconnected, http.client.BadStatusLine,
+                            BrokenPipeError, ConnectionResetError)
+
+
+def project_values(binding: Dict[str, Any]) -> Dict[str, Any]:
+    """只保留每個變數的 value，捨棄 type、xml:lang 與 datatype"""
+    return {var: {'value': term['value']} for var, term in binding.items()}
+
+
+class _JsonStream:
+    """在逐段到達的文字上解析 JSON，一次只保留尚未處理的部分"""
+
+    _WHITESPACE = ' \t\r\n'
+
+    def __init__(self, chunks: Iterable[str]):
+        self._chunks = iter(chunks)
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        if self._eof:
+            return False
+        for chunk in self._chunks:
+            if chunk:
+                # 已處理的部分不再保留
+                self._buffer = self._buffer[self._pos:] + chunk
+                self._pos = 0
+                return True
+        self._eof = True
+        return False
+
+    def peek(self) -> str:
+        """下一個非空白字元，不移動位置；資料結束時回傳空字串"""
+        while True:
+            buffer, pos = self._buffer, self._pos
+            while pos < len(buffer) and buffer[pos] in self._WHITESPACE:
+                pos += 1
+            self._pos = pos
+            if pos < len(buffer):
+                return buffer[pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, char: str) -> None:
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"SPARQL JSON 格式錯誤: 預期 {char!r}，實際為 {found!r}")
+        self._pos += 1
+
+    def skip(self, char: str) -> bool:
+        if self.peek() == char:
+            self._pos += 1
+            return True
+        return False
+
+    def value(self) -> Any:
+        """解析下一個完整的 JSON 值"""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if self._fill():
+                    continue
+                raise
+            # 值剛好位於緩衝區結尾時 (例如數字)，可能還有後續字元
+            if end < len(self._buffer) or not self._fill():
+                self._pos = end
+                return value
+
+
+def iter_results(chunks: Iterable[str]) -> Iterator[Tuple[str, Any]]:
+    """逐步解析 SPARQL JSON 結果
+
+    每筆 binding 解析完成即產生 ('binding', binding)，其餘欄位產生 ('head', {...})、
+    ('results', {鍵: 值}) 與 ('<鍵>', 值)，整個 bindings 陣列不會同時存在記憶體中。
+    """
+    stream = _JsonStream(chunks)
+    stream.expect('{')
+    while not stream.skip('}'):
+        key = stream.value()
+        stream.expect(':')
+        if key == 'results':
+            stream.expect('{')
+            while not stream.skip('}'):
+                results_key = stream.value()
+                stream.expect(':')
+                if results_key == 'bindings':
+                    stream.expect('[')
+                    if not stream.skip(']'):
+                        while True:
+                            yield 'binding', stream.value()
+                            if stream.skip(']'):
+                                break
+                            stream.expect(',')
+                else:
+                    yield 'results', {results_key: stream.value()}
+                stream.skip(',')
+        else:
+            yield key, stream.value()
+        stream.skip(',')
+
+
+def parse_results(chunks: Iterable[str], binding_filter: Optional[BindingFilter] = None) -> Dict[str, Any]:
+    """解析 SPARQL JSON 結果，binding 在到達時即經過 binding_filter 篩選"""
+    results: Dict[str, Any] = {'head': {}, 'results': {'bindings': []}}
+    bindings = results['results']['bindings']
+    for key, value in iter_results(chunks):
+        if key == 'binding':
+            if binding_filter is not None:
+                value = binding_filter(value)
+            if value is not None:
+                bindings.append(value)
+        elif key == 'results':
+            results['results'].update(value)
+        else:
+            results[key] = value
+    return results
+
+
+class SparqlTransport:
+    """SPARQL 端點的 HTTP 傳輸層
+
+    維持一個 keep-alive 連線池，回應要求 gzip 壓縮並一邊接收一邊解壓、解析，
+    不會先把整份 JSON 讀進記憶體。http.client 的連線不是執行緒安全的，每個請求從池中借出一條連線。
+    """
+
+    def __init__(self, endpoint_url: str, user_agent: str = SPARQL_USER_AGENT,
+                 timeout: float = SPARQL_TIMEOUT, pool_size: int = 2,
+                 chunk_size: int = SPARQL_READ_CHUNK_SIZE, max_get_length: int = SPARQL_MAX_GET_LENGTH):
+        parts = urlsplit(endpoint_url)
+        if parts.scheme not in ('http', 'https'):
+            raise ValueError(f"不支援的端點網址: {endpoint_url}")
+        self.endpoint_url = endpoint_url
+        self.user_agent = user_agent
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.chunk_size = chunk_size
+        self.max_get_length = max_get_length
+        self._scheme = parts.scheme
+        self._host = parts.hostname
+        self._port = parts.port
+        self._path = parts.path or '/'
+        self._pool: queue.LifoQueue = queue.LifoQueue(pool_size)
+        self.connections_opened = 0
+
+    def _new_connection(self) -> http.client.HTTPConnection:
+        self.connections_opened += 1
+        if self._scheme == 'https':
+            return http.client.HTTPSConnection(self._host, self._port, timeout=self.timeout)
+        return http.client.HTTPConnection(self._host, self._port, timeout=self.timeout)
+
+    def _acquire(self) -> Tuple[http.client.HTTPConnection, bool]:
+        """回傳 (連線, 是否為重用的連線)"""
+        try:
+            return self._pool.get_nowait(), True
+        except queue.Empty:
+            return self._new_connection(), False
+
+    def _release(self, connection: http.client.HTTPConnection, reusable: bool) -> None:
+        if reusable:
+            try:
+                self._pool.put_nowait(connection)
+                return
+            except queue.Full:
+                pass
+        connection.close()
+
+    def _finish(self, connection: http.client.HTTPConnection, response: http.client.HTTPResponse,
+                completed: bool) -> None:
+        """讀完回應的剩餘部分 (例如 chunked 結尾) 後歸還連線；未讀完的連線直接關閉"""
+        if completed:
+            try:
+                response.read()
+            except (http.client.HTTPException, OSError):
+                completed = False
+        self._release(connection, completed and not response.will_close)
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                return
+
+    def _headers(self) -> Dict[str, str]:
+        return {
+            'Accept': 'application/sparql-results+json',
+            'Accept-Encoding': 'gzip',
+            'User-Agent': self.user_agent,
+        }
+
+    def _send(self, connection: http.client.HTTPConnection, query: str) -> http.client.HTTPResponse:
+        encoded = urlencode({'query': query})
+        headers = self._headers()
+        # 短查詢用 GET，過長的批次查詢改用 POST 避免 414
+        if len(self._path) + len(encoded) + 1 <= self.max_get_length:
+            connection.request('GET', f"{self._path}?{encoded}", headers=headers)
+        else:
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+            connection.request('POST', self._path, body=encoded.encode('ascii'), headers=headers)
+        return connection.getresponse()
+
+    def _open(self, query: str) -> Tuple[http.client.HTTPConnection, http.client.HTTPResponse]:
+        connection, reused = self._acquire()
+        try:
+            response = self._send(connection, query)
+        except _STALE_CONNECTION_ERRORS:
+            connection.close()
+            if not reused:
+                raise
+            # 閒置的連線已被伺服器關閉，改用新連線重送
+            connection = self._new_connection()
+            try:
+                response = self._send(connection, query)
+            except BaseException:
+                connection.close()
+                raise
+        except BaseException:
+            connection.close()
+            raise
+
+        if response.status >= 400:
+            body = response.read()
+            self._release(connection, not response.will_close)
+            # 與 urllib/SPARQLWrapper 相同的例外，RetryPolicy 依 code 與 Retry-After 判斷是否重試
+            raise HTTPError(self.endpoint_url, response.status, response.reason, response.headers, io.BytesIO(body))
+        return connection, response
+
+    def _iter_text(self, response: http.client.HTTPResponse) -> Iterator[str]:
+        """邊讀邊解壓、解碼回應內容"""
+        gzipped = (response.getheader('Content-Encoding') or '').lower() == 'gzip'
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) if gzipped else None
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        while True:
+            data = response.read1(self.chunk_size)
+            if not data:
+                break
+            if decompressor is not None:
+                data = decompressor.decompress(data)
+            yield decoder.decode(data)
+        if decompressor is not None:
+            yield decoder.decode(decompressor.flush())
+        yield decoder.decode(b'', final=True)
+
+    def iter_bindings(self, query: str, binding_filter: Optional[BindingFilter] = None) -> Iterator[Dict[str, Any]]:
+        """逐筆產生查詢結果的 binding，提前停止時連線會被關閉而不放回連線池"""
+        connection, response = self._open(query)
+        completed = False
+        try:
+            for key, value in iter_results(self._iter_text(response)):
+                if key != 'binding':
+                    continue
+                if binding_filter is not None:
+                    value = binding_filter(value)
+                if value is not None:
+                    yield value
+            completed = True
+        finally:
+            self._finish(connection, response, completed)
+
+    def query(self, query: str, binding_filter: Optional[BindingFilter] = None) -> Dict[str, Any]:
+        """送出查詢並回傳與 SPARQLWrapper convert() 相同格式的結果"""
+        connection, response = self._open(query)
+        completed = False
+        try:
+            results = parse_results(self._iter_text(response), binding_filter)
+            completed = True
+            return results
+        finally:
+            self._finish(connection, response, completed)
+
+
+_transports: Dict[Tuple[str, str], SparqlTransport] = {}
+_transports_lock = threading.Lock()
+
+
+def get_transport(endpoint_url: str, user_agent: str = SPARQL_USER_AGENT) -> SparqlTransport:
+    """取得端點與 User-Agent 共用的傳輸層，連線池大小與端點允許的並行請求數相同"""
+    with _transports_lock:
+        transport = _transports.get((endpoint_url, user_agent))
+        if transport is None:
+            _, _, max_parallel = ENDPOINT_RATE_LIMITS.get(endpoint_url, DEFAULT_RATE_LIMIT)
+            transport = SparqlTransport(endpoint_url, user_agent=user_agent, pool_size=max_parallel)
+            _transports[endpoint_url, user_agent] = transport
+        return transport
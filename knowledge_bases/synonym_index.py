@@ -0,0 +1,126 @@
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from utils.text_processor import normalize_entity
+
+from .local_index import HierarchyIndex
+
+
+class SynonymIndex:
+    """同義詞表與反向索引：詞彙 → 代表詞
+
+    每組同義詞有一個代表詞，查詢前先換成代表詞，同一概念的所有寫法共用快取鍵值與 SPARQL 查詢。
+    反向索引以 normalize_entity 的結果為鍵，全形、簡繁與括號補充說明的差異不影響對應。
+    """
+
+    def __init__(self, groups: Optional[Dict[str, Iterable[str]]] = None):
+        # 代表詞 -> 同義詞 (依加入順序)
+        self.groups: Dict[str, List[str]] = {}
+        # 正規化詞彙 -> 包含此詞彙的代表詞，第一個為主要代表詞
+        self._reverse: Dict[str, List[str]] = {}
+        for canonical, aliases in (groups or {}).items():
+            self.add_group(canonical, aliases)
+        self.resolve_chains()
+
+    def __len__(self) -> int:
+        return len(self.groups)
+
+    def _index(self, term: str, canonical: str) -> None:
+        canonicals = self._reverse.setdefault(normalize_entity(term), [])
+        if canonical not in canonicals:
+            canonicals.append(canonical)
+
+    def add_group(self, canonical: str, aliases: Iterable[str]) -> None:
+        group = self.groups.setdefault(canonical, [])
+        self._index(canonical, canonical)
+        for alias in aliases:
+            if alias and alias != canonical and alias not in group:
+                group.append(alias)
+                self._index(alias, canonical)
+
+    def resolve_chains(self) -> None:
+        """代表詞本身也是另一組的同義詞時，將串連的組視為同一概念，以最早加入的代表詞為主要代表詞
+
+        之後 canonical() 是冪等的：canonical(canonical(x)) == canonical(x)。
+        直接呼叫 add_group() 加入同義詞後需要再呼叫一次。
+        """
+        order = {canonical: index for index, canonical in enumerate(self.groups)}
+        parent: Dict[str, str] = {}
+
+        def find(canonical: str) -> str:
+            parent.setdefault(canonical, canonical)
+            while parent[canonical] != canonical:
+                parent[canonical] = parent[parent[canonical]]
+                canonical = parent[canonical]
+            return canonical
+
+        for canonical in self.groups:
+            root, other = find(canonical), find(self._reverse[normalize_entity(canonical)][0])
+            if root != other:
+                if order[root] > order[other]:
+                    root, other = other, root
+                parent[other] = root
+
+        for canonicals in self._reverse.values():
+            root = find(canonicals[0])
+            if canonicals[0] != root:
+                if root in canonicals:
+                    canonicals.remove(root)
+                canonicals.insert(0, root)
+
+    def canonical(self, term: str) -> str:
+        """詞彙的代表詞，不在同義詞表中時原樣回傳"""
+        canonicals = self._reverse.get(normalize_entity(term))
+        return canonicals[0] if canonicals else term
+
+    def related_terms(self, term: str) -> Set[str]:
+        """詞彙本身加上所有包含它的同義詞組"""
+        related = {term}
+        for canonical in self._reverse.get(normalize_entity(term), ()):
+            related.add(canonical)
+            related.update(self.groups[canonical])
+        return related
+
+    def merge(self, other: 'SynonymIndex') -> None:
+        for canonical, aliases in other.groups.items():
+            self.add_group(canonical, aliases)
+        self.resolve_chains()
+
+    def add_bindings(self, results: Dict[str, Any], canonical_var: str = 'name', alias_var: str = 'alias') -> int:
+        """由 SPARQL 結果 (例如 skos:altLabel 查詢) 加入同義詞，回傳處理的筆數"""
+        count = 0
+        for binding in results.get('results', {}).get('bindings', []):
+            canonical = binding.get(canonical_var, {}).get('value')
+            alias = binding.get(alias_var, {}).get('value')
+            if canonical and alias:
+                self.add_group(canonical, [alias])
+                count += 1
+        self.resolve_chains()
+        return count
+
+    def save(self, path: Path) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open('w', encoding='utf-8') as f:
+            json.dump(self.groups, f, ensure_ascii=False, indent=2)
+
+    @classmethod
+    def load(cls, path: Path) -> 'SynonymIndex':
+        with Path(path).open('r', encoding='utf-8') as f:
+            return cls(json.load(f))
+
+    @classmethod
+    def load_if_exists(cls, path: Path) -> 'SynonymIndex':
+        return cls.load(path) if Path(path).exists() else cls()
+
+    @classmethod
+    def from_hierarchy_index(cls, hierarchy: HierarchyIndex) -> 'SynonymIndex':
+        """以離線索引中各節點的標籤為代表詞、別名為同義詞"""
+        index = cls()
+        for node, aliases in hierarchy.aliases.items():
+            label = hierarchy.labels[node]
+            if label:
+                index.add_group(label, aliases)
+        index.resolve_chains()
+        return index
@@ -0,0 +1,203 @@
+import mmap
+import os
+import struct
+import sys
+from array import array
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .compact_tree import CompactTree
+
+# 檔案格式 (little-endian，各區段以 8 bytes 對齊):
+#   標頭      MAGIC, 字串數, 樹數, 節點總數
+#   字串表    uint32 offsets[字串數 + 1]，接著 UTF-8 內容
+#   樹目錄    每棵樹 4 個 uint32: 類別字串, 實體字串, 起始節點, 節點數，依類別連續排列；
+#             沒有任何樹的類別以實體字串為 NO_ENTITY 的一筆記錄保留
+#   節點陣列  int32 name_ids[節點總數]，int32 parents[節點總數]
+# 每棵樹的節點依前序排列，parents 為樹內的父節點位置，根節點為 -1
+MAGIC = b'KGTREE01'
+NO_ENTITY = 0xFFFFFFFF
+_HEADER = struct.Struct('<8sIII')
+_ALIGN = 8
+_NATIVE_LITTLE = sys.byteorder == 'little'
+
+
+def _pad(size: int) -> int:
+    return -size % _ALIGN
+
+
+def _to_bytes(values: array) -> bytes:
+    if not _NATIVE_LITTLE:
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+class _StringTable:
+    def __init__(self):
+        self.strings: List[str] = []
+        self._ids: Dict[str, int] = {}
+
+    def intern(self, text: str) -> int:
+        string_id = self._ids.get(text)
+        if string_id is None:
+            string_id = len(self.strings)
+            self._ids[text] = string_id
+            self.strings.append(text)
+        return string_id
+
+
+def save_trees_binary(trees: Dict[str, Dict[str, Dict[str, Any]]], path: Path) -> None:
+    """以二進位格式儲存 generate_trees 格式的概念樹"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    table = _StringTable()
+    directory = array('I')
+    name_ids = array('i')
+    parents = array('i')
+    for category, category_trees in trees.items():
+        category_id = table.intern(category)
+        if not category_trees:
+            directory.extend((category_id, NO_ENTITY, len(name_ids), 0))
+        for entity, tree in category_trees.items():
+            start = len(name_ids)
+            stack = [(tree, -1)]
+            while stack:
+                node, parent_pos = stack.pop()
+                position = len(name_ids) - start
+                name_ids.append(table.intern(node['name']))
+                parents.append(parent_pos)
+                for child in reversed(node.get('children', [])):
+                    stack.append((child, position))
+            directory.extend((category_id, table.intern(entity), start, len(name_ids) - start))
+
+    encoded = [text.encode('utf-8') for text in table.strings]
+    offsets = array('I', [0])
+    for data in encoded:
+        offsets.append(offsets[-1] + len(data))
+    blob = b''.join(encoded)
+
+    tmp_path = path.with_name(path.name + '.tmp')
+    with tmp_path.open('wb') as f:
+        f.write(_HEADER.pack(MAGIC, len(table.strings), len(directory) // 4, len(name_ids)))
+        f.write(b'\0' * _pad(_HEADER.size))
+        for section in (_to_bytes(offsets) + blob, _to_bytes(directory), _to_bytes(name_ids), _to_bytes(parents)):
+            f.write(section)
+            f.write(b'\0' * _pad(len(section)))
+    os.replace(tmp_path, path)
+
+
+class TreeStoreReader:
+    """以 mmap 隨機存取二進位概念樹，只解碼實際讀取的樹"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._file = self.path.open('rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._buffer = memoryview(self._mmap)
+
+        magic, string_count, tree_count, node_count = _HEADER.unpack_from(self._buffer, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"不是概念樹二進位檔: {self.path}")
+
+        position = _HEADER.size + _pad(_HEADER.size)
+        self._offsets = self._view(position, 'I', string_count + 1)
+        position += (string_count + 1) * 4
+        self._blob_start = position
+        position += self._offsets[string_count]
+        position += _pad(position)
+        self._directory = self._view(position, 'I', tree_count * 4)
+        position += tree_count * 16
+        position += _pad(position)
+        self._name_ids = self._view(position, 'i', node_count)
+        position += node_count * 4
+        position += _pad(position)
+        self._parents = self._view(position, 'i', node_count)
+
+        self._strings: Dict[int, str] = {}
+        # (類別, 實體) -> 樹編號，只解碼類別與實體名稱
+        self._index: Dict[str, Dict[str, int]] = {}
+        for tree in range(tree_count):
+            category_trees = self._index.setdefault(self._string(self._directory[tree * 4]), {})
+            entity_id = self._directory[tree * 4 + 1]
+            if entity_id != NO_ENTITY:
+                category_trees[self._string(entity_id)] = tree
+
+    def _view(self, start: int, typecode: str, count: int):
+        view = self._buffer[start:start + count * 4]
+        if _NATIVE_LITTLE:
+            return view.cast(typecode)
+        values = array(typecode, view.tobytes())
+        values.byteswap()
+        return values
+
+    def _string(self, string_id: int) -> str:
+        text = self._strings.get(string_id)
+        if text is None:
+            start = self._blob_start + self._offsets[string_id]
+            end = self._blob_start + self._offsets[string_id + 1]
+            text = self._strings[string_id] = bytes(self._buffer[start:end]).decode('utf-8')
+        return text
+
+    def categories(self) -> List[str]:
+        return list(self._index)
+
+    def entities(self, category: str) -> List[str]:
+        return list(self._index.get(category, {}))
+
+    def __contains__(self, key: Tuple[str, str]) -> bool:
+        category, entity = key
+        return entity in self._index.get(category, {})
+
+    def __len__(self) -> int:
+        return sum(len(entities) for entities in self._index.values())
+
+    def compact_tree(self, category: str, entity: str) -> Optional[CompactTree]:
+        tree = self._index.get(category, {}).get(entity)
+        if tree is None:
+            return None
+        start = self._directory[tree * 4 + 2]
+        count = self._directory[tree * 4 + 3]
+        compact = CompactTree()
+        for position in range(count):
+            compact.add_node(self._string(self._name_ids[start + position]), self._parents[start + position])
+        return compact
+
+    def tree(self, category: str, entity: str) -> Optional[Dict[str, Any]]:
+        """讀取單一實體的概念樹 (tree_to_dict 格式)"""
+        compact = self.compact_tree(category, entity)
+        return compact.to_dict() if compact is not None and len(compact) else None
+
+    def category_trees(self, category: str) -> Dict[str, Dict[str, Any]]:
+        return {entity: self.tree(category, entity) for entity in self.entities(category)}
+
+    def iter_trees(self) -> Iterator[Tuple[str, str, Dict[str, Any]]]:
+        for category, entities in self._index.items():
+            for entity in entities:
+                yield category, entity, self.tree(category, entity)
+
+    def to_trees(self) -> Dict[str, Dict[str, Any]]:
+        return {category: self.category_trees(category) for category in self._index}
+
+    def close(self) -> None:
+        for name in ('_offsets', '_directory', '_name_ids', '_parents'):
+            view = getattr(self, name, None)
+            if isinstance(view, memoryview):
+                view.release()
+        self._buffer.release()
+        self._mmap.close()
+        self._file.close()
+
+    def __enter__(self) -> 'TreeStoreReader':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def load_trees_binary(path: Path) -> Dict[str, Dict[str, Any]]:
+    """讀取全部概念樹"""
+    with TreeStoreReader(path) as reader:
+        return reader.to_trees()
@@ -1,231 +1,561 @@
-from SPARQLWrapper import SPARQLWrapper, JSON
 from typing import List, Dict, Any, Tuple, Set
 import hashlib
 import re
-from dataclasses import dataclass
+import threading
+from collections import deque
 from typing import List, Optional
 
-from .base import KnowledgeBase
-from config import WIKIDATA_ENDPOINT
+from .base import KnowledgeBase, ConceptNode
+from .compact_tree import CompactTree
+from .concept_filter import ConceptFilterMixin
+from .label_index import LabelIndex
+from .synonym_index import SynonymIndex
+from .query_executor import AdaptiveBatchSize, RetryPolicy, get_endpoint_limiter, is_timeout_error
+from .sparql_transport import BindingFilter, get_transport, project_values
+from config import (
+    WIKIDATA_ENDPOINT, CACHE_EXPIRY, NEGATIVE_CACHE_EXPIRY, SPARQL_TRANSPORT,
+    HIERARCHY_QUERY_MODE, HIERARCHY_MAX_DEPTH, HIERARCHY_RELATION_BUDGETS, HIERARCHY_MAX_RESULTS,
+    HIERARCHY_LABEL_FILTER,
+    LABEL_INDEX_PATH, LABEL_INDEX_MAX_CANDIDATES, SYNONYMS_PATH
+)
 from cache.cache_manager import CacheManager
+from cache.memory_cache import get_shared_memory_cache
+from cache.request_coalescer import RequestCoalescer
 
-@dataclass
-class ConceptNode:
-    name: str
-    level: int
-    children: List['ConceptNode']
-    parent: Optional['ConceptNode'] = None
+# 上下位查詢使用的關係類型
+HIERARCHY_RELATIONS = [
+    'wdt:P279',  # subclass of
+    'wdt:P31',   # instance of
+    'wdt:P361',  # part of
+    'wdt:P1269', # facet of
+    'wdt:P2283', # uses
+    'wdt:P1535', # used by
+    'wdt:P452',  # industry
+    'wdt:P366',  # has use
+    'wdt:P106'   # occupation
+]
 
-class WikidataClient(KnowledgeBase):
-    def __init__(self):
+WIKIDATA_ENTITY_PREFIX = 'http://www.wikidata.org/entity/'
+WIKIDATA_DIRECT_PREFIX = 'http://www.wikidata.org/prop/direct/'
+WIKIDATA_ID = re.compile(r'[QPL][1-9]\d*')
+
+class WikidataClient(ConceptFilterMixin, KnowledgeBase):
+    def __init__(self, label_index: Optional[LabelIndex] = None, synonym_index: Optional[SynonymIndex] = None):
         self.endpoint_url = "https://query.wikidata.org/sparql"
-        self.cache_manager = CacheManager()
+        self.cache_manager = CacheManager(memory_cache=get_shared_memory_cache())
+        self._coalescer = RequestCoalescer()
+        self.rate_limiter = get_endpoint_limiter(WIKIDATA_ENDPOINT)
+        self.retry_policy = RetryPolicy()
+        self.batch_size = AdaptiveBatchSize()
+        self.hierarchy_mode = HIERARCHY_QUERY_MODE
+        self.max_depth = HIERARCHY_MAX_DEPTH
+        self.relation_budgets = dict(HIERARCHY_RELATION_BUDGETS)
+        self.max_results = dict(HIERARCHY_MAX_RESULTS)
+        self.label_filter = HIERARCHY_LABEL_FILTER
+        # 有本地標籤索引時，模糊匹配改在本地進行
+        self.label_index = label_index if label_index is not None else LabelIndex.load_if_exists(LABEL_INDEX_PATH)
         
-        # 設定 User-Agent 避免被封鎖
-        self.endpoint = SPARQLWrapper(WIKIDATA_ENDPOINT)
-        self.endpoint.setReturnFormat(JSON)
-        self.endpoint.addCustomHttpHeader('User-Agent', 'KnowledgeGraphBot/1.0')
-        
-        # 定義相關領域的關鍵詞
-        self.business_keywords = {
-            '商業', '經濟', '市場', '消費', '服務', '產業', '管理', 
-            '營銷', '行銷', '銷售', '客戶', '顧客', '價值', '品牌',
-            '產品', '療程', '美容', '診所', '門診', '保健', '健康',
-            '治療', '醫療', '照護', '護理', '專科', '門診', '臨床',
-            '整形', '整型', '美容', '皮膚', '醫美', '外科', '手術',
-            '注射', '雷射', '微整', '抗衰', '年輕', '美學'
-        }
-
-        # 定義同義詞對應
-        self.synonyms = {
-            "醫美": ["醫學美容", "醫療美容", "美容醫學", "美容醫療", "整形美容", "美容外科", "整形手術"],
-            "整型外科": ["整形外科", "整形", "整型", "美容外科", "整形美容"],
-            "皮膚科": ["皮膚醫學", "皮膚醫療", "皮膚美容"],
-        }
-
-    def is_chinese(self, text: str) -> bool:
-        # 檢查是否包含中文字符
-        return bool(re.search('[\u4e00-\u9fff]', text))
-
-    def is_business_related(self, text: str) -> bool:
-        """檢查概念是否與商業價值或消費者行為相關"""
-        return any(keyword in text for keyword in self.business_keywords)
+        # 共用的 keep-alive 連線池；設定為 "sparqlwrapper" 時改用 SPARQLWrapper
+        self.transport = get_transport(WIKIDATA_ENDPOINT, 'KnowledgeGraphBot/1.0') if SPARQL_TRANSPORT == 'pooled' else None
+        # SPARQLWrapper 不是執行緒安全的，每個執行緒使用各自的實例
+        self._local = threading.local()
+        
+        # 同義詞表 (data/synonyms.json)，查詢前將各種寫法換成代表詞
+        self.synonym_index = synonym_index if synonym_index is not None else SynonymIndex.load_if_exists(SYNONYMS_PATH)
 
     def find_related_terms(self, entity_name: str) -> Set[str]:
         """查找相關詞彙"""
-        related_terms = {entity_name}
-        
-        # 檢查同義詞
-        for key, values in self.synonyms.items():
-            if entity_name in [key] + values:
-                related_terms.add(key)
-                related_terms.update(values)
-        
-        return related_terms
+        return self.synonym_index.related_terms(entity_name)
+
+    def canonical_name(self, entity_name: str) -> str:
+        """同義詞的代表詞，不在同義詞表中時原樣回傳"""
+        return self.synonym_index.canonical(entity_name)
+
+    def label_variants(self, entity_name: str) -> List[str]:
+        """依序嘗試的標籤：原始寫法優先，查無結果時才改用同義詞的代表詞"""
+        return list(dict.fromkeys([entity_name, self.canonical_name(entity_name)]))
 
     def query_hierarchy(self, entity_name, direction='broader'):
         """查詢實體的上位或下位概念"""
-        # 首先嘗試使用實體名稱直接查詢
-        query = self._build_hierarchy_query(entity_name, direction)
-        results = self._execute_query(query)
+        if self.hierarchy_mode == 'bounded':
+            # 只取建樹需要的數量，下位概念通常遠多於上位概念
+            ancestors = self.expand_hierarchy(entity_name, direction, max_results=self.max_results.get(direction))
+            return self._ancestors_to_results(ancestors)
+        
+        # 首先嘗試使用實體名稱直接查詢，原始寫法有自己的標籤時不換成代表詞
+        for name in self.label_variants(entity_name):
+            results = self._execute_query(self._build_hierarchy_query(name, direction), self._hierarchy_filter())
+            if self._has_bindings(results):
+                return results
         
         # 如果沒有結果，嘗試使用模糊匹配
-        if not results:
+        if self.label_index is not None:
+            # 在本地解析出候選 QID，避免在伺服器端執行 CONTAINS 全表掃描
+            qids = self.resolve_label_candidates(entity_name)
+            if qids:
+                results = self._execute_query(self._build_qid_hierarchy_query(qids, direction), self._hierarchy_filter())
+        else:
             query = self._build_fuzzy_query(entity_name, direction)
-            results = self._execute_query(query)
+            results = self._execute_query(query, self._hierarchy_filter())
             
         return results
+
+    def resolve_label_candidates(self, entity_name: str) -> List[str]:
+        """以本地標籤索引找出與名稱相符的候選 QID"""
+        if self.label_index is None:
+            return []
+        # 本地索引也可能收錄其他資料來源的 IRI，只保留能寫成 wd:QID 的候選，避免產生無效的查詢
+        candidates = self.label_index.search(entity_name, limit=LABEL_INDEX_MAX_CANDIDATES)
+        return list(dict.fromkeys(qid for qid in (self._to_qid(key) for key, _, _ in candidates) if qid))
     
+    def expand_hierarchy(self, entity_name, direction='broader', max_depth=None,
+                         relation_budgets=None, max_results=None) -> List[Dict[str, Any]]:
+        """逐層展開上位或下位概念，取代無上限的遞移閉包查詢
+
+        每一層只查詢一次直接關係，深度超過 max_depth 或某種關係在路徑上的使用次數
+        超過 relation_budgets 時停止展開；取得 max_results 個概念後提早結束。
+        回傳每個概念的 qid、label、depth 以及從實體出發的 path [(relation, qid), ...]。
+        """
+        max_depth = self.max_depth if max_depth is None else max_depth
+        budgets = self.relation_budgets if relation_budgets is None else relation_budgets
+        
+        # 第 0 層：以標籤找出實體，原始寫法找不到時才改用同義詞的代表詞
+        frontier = {}
+        for name in self.label_variants(entity_name):
+            query = f"""
+            SELECT DISTINCT ?entity WHERE {{
+              ?entity rdfs:label "{self._escape_literal(name)}"@zh .
+            }}
+            """
+            for binding in self._execute_query(query)['results']['bindings']:
+                qid = self._to_qid(binding['entity']['value'])
+                if qid:
+                    frontier[qid] = ([], dict(budgets))
+            if frontier:
+                break
+        
+        if not frontier:
+            for qid in self.resolve_label_candidates(entity_name):
+                frontier[qid] = ([], dict(budgets))
+        
+        visited = set(frontier)
+        ancestors = []
+        
+        for depth in range(1, max_depth + 1):
+            if not frontier:
+                break
+            
+            next_frontier = {}
+            sources = list(frontier)
+            for start in range(0, len(sources), self.batch_size.size):
+                chunk = sources[start:start + self.batch_size.size]
+                relations = {
+                    relation for qid in chunk for relation in HIERARCHY_RELATIONS
+                    if frontier[qid][1].get(relation, 1) > 0
+                }
+                if not relations:
+                    continue
+                
+                limit = None if max_results is None else max_results - len(ancestors)
+                results = self._execute_query(self._build_level_query(chunk, sorted(relations), direction, limit))
+                for binding in results['results']['bindings']:
+                    source = self._to_qid(binding['source']['value'])
+                    item = self._to_qid(binding['item']['value'])
+                    relation = 'wdt:' + binding['relation']['value'][len(WIKIDATA_DIRECT_PREFIX):]
+                    if not source or not item or item in visited or source not in frontier:
+                        continue
+                    
+                    path, remaining = frontier[source]
+                    if remaining.get(relation, 1) <= 0:
+                        continue
+                    
+                    visited.add(item)
+                    remaining = dict(remaining)
+                    if relation in remaining:
+                        remaining[relation] -= 1
+                    item_path = path + [(relation, item)]
+                    next_frontier[item] = (item_path, remaining)
+                    ancestors.append({
+                        'qid': item,
+                        'label': binding.get('itemLabel', {}).get('value'),
+                        'depth': depth,
+                        'path': item_path,
+                    })
+                    
+                    if max_results is not None and len(ancestors) >= max_results:
+                        return ancestors
+            
+            frontier = next_frontier
+        
+        return ancestors
+
+    def _build_level_query(self, qids: List[str], relations: List[str], direction='broader',
+                           limit: Optional[int] = None):
+        """查詢一組節點的直接上位或下位概念，limit 為這一層最多需要的結果數"""
+        sources = ' '.join(f"wd:{qid}" for qid in qids)
+        values = ' '.join(relations)
+        if direction == 'broader':
+            triple = "?source ?relation ?item ."
+        else:
+            triple = "?item ?relation ?source ."
+        
+        return f"""
+            SELECT DISTINCT ?source ?relation ?item ?itemLabel WHERE {{
+              VALUES ?source {{ {sources} }}
+              VALUES ?relation {{ {values} }}
+              {triple}
+              OPTIONAL {{
+                ?item rdfs:label ?itemLabel .
+                FILTER(LANG(?itemLabel) = "zh")
+              }}
+            }}{'' if limit is None else f' LIMIT {limit}'}
+            """
+
+    @staticmethod
+    def _to_qid(uri: str) -> Optional[str]:
+        """Wikidata 實體 IRI 或本地索引中的 QID 轉成 QID，其他 IRI 回傳 None"""
+        qid = uri[len(WIKIDATA_ENTITY_PREFIX):] if uri.startswith(WIKIDATA_ENTITY_PREFIX) else uri
+        return qid if WIKIDATA_ID.fullmatch(qid) else None
+
+    @staticmethod
+    def _ancestors_to_results(ancestors: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """將 expand_hierarchy 的結果轉成 SPARQL JSON 格式，附加 depth 與 path"""
+        bindings = []
+        for ancestor in ancestors:
+            binding = {
+                'item': {'type': 'uri', 'value': WIKIDATA_ENTITY_PREFIX + ancestor['qid']},
+                'depth': {'type': 'literal', 'value': str(ancestor['depth'])},
+                'path': {'type': 'literal', 'value': ' '.join(f"{rel}/{qid}" for rel, qid in ancestor['path'])},
+            }
+            if ancestor['label']:
+                binding['itemLabel'] = {'type': 'literal', 'xml:lang': 'zh', 'value': ancestor['label']}
+            bindings.append(binding)
+        
+        return {"head": {"vars": ["item", "itemLabel", "depth", "path"]}, "results": {"bindings": bindings}}
+
     def _build_hierarchy_query(self, entity_name, direction='broader'):
         """建立 SPARQL 查詢"""
-        # 擴展關係類型
-        relations = [
-            'wdt:P279',  # subclass of
-            'wdt:P31',   # instance of
-            'wdt:P361',  # part of
-            'wdt:P1269', # facet of
-            'wdt:P2283', # uses
-            'wdt:P1535', # used by
-            'wdt:P452',  # industry
-            'wdt:P366',  # has use
-            'wdt:P106'   # occupation
-        ]
-        
-        relation_paths = ' | '.join(relations)
+        relation_paths = ' | '.join(HIERARCHY_RELATIONS)
+        literal = self._escape_literal(entity_name)
         
         if direction == 'broader':
             query = f"""
-            SELECT DISTINCT ?item ?itemLabel WHERE {{
-              ?entity rdfs:label "{entity_name}"@zh .
+            SELECT DISTINCT {self._item_projection()} WHERE {{
+              ?entity rdfs:label "{literal}"@zh .
               ?entity ({relation_paths})* ?item .
               ?item rdfs:label ?itemLabel .
-              FILTER(LANG(?itemLabel) = "zh")
+              {self._label_filter()}
             }}
             """
         else:
             query = f"""
-            SELECT DISTINCT ?item ?itemLabel WHERE {{
-              ?entity rdfs:label "{entity_name}"@zh .
+            SELECT DISTINCT {self._item_projection()} WHERE {{
+              ?entity rdfs:label "{literal}"@zh .
               ?item ({relation_paths})* ?entity .
               ?item rdfs:label ?itemLabel .
-              FILTER(LANG(?itemLabel) = "zh")
+              {self._label_filter()}
             }}
             """
         
         return query
     
+    @staticmethod
+    def _escape_literal(text: str) -> str:
+        return text.replace('\\', '\\\\').replace('"', '\\"')
+
+    def _build_batch_hierarchy_query(self, entity_names: List[str], direction='broader'):
+        """以 VALUES 區塊一次查詢多個實體的上位或下位概念"""
+        relation_paths = ' | '.join(HIERARCHY_RELATIONS)
+        values = ' '.join(f'"{self._escape_literal(name)}"@zh' for name in entity_names)
+        
+        if direction == 'broader':
+            path = f"?entity ({relation_paths})* ?item ."
+        else:
+            path = f"?item ({relation_paths})* ?entity ."
+        
+        return f"""
+            SELECT DISTINCT ?name {self._item_projection()} WHERE {{
+              VALUES ?name {{ {values} }}
+              ?entity rdfs:label ?name .
+              {path}
+              ?item rdfs:label ?itemLabel .
+              {self._label_filter()}
+            }}
+            """
+
+    @staticmethod
+    def _split_batch_results(results, entity_names: List[str]) -> Dict[str, Dict[str, Any]]:
+        """將批次查詢結果依 ?name 拆回每個實體各自的結果"""
+        split = {name: [] for name in entity_names}
+        for binding in results.get('results', {}).get('bindings', []):
+            name = binding.get('name', {}).get('value')
+            if name in split:
+                split[name].append({k: v for k, v in binding.items() if k != 'name'})
+        
+        variables = [var for var in results.get('head', {}).get('vars', ['item', 'itemLabel']) if var != 'name']
+        return {
+            name: {"head": {"vars": variables}, "results": {"bindings": bindings}}
+            for name, bindings in split.items()
+        }
+
+    def query_hierarchy_many(self, entity_names, direction='broader') -> Dict[str, Dict[str, Any]]:
+        """批次查詢多個實體，結果寫入與單一查詢相同的快取鍵值；查詢失敗的實體回傳空結果"""
+        # 以原始寫法批次查詢；查無結果的寫法在下方改用代表詞，同一概念的代表詞只查詢一次 (共用快取)
+        names = list(dict.fromkeys(entity_names))
+        if self.hierarchy_mode == 'bounded':
+            return {name: self._query_hierarchy_or_empty(name, direction) for name in names}
+        
+        resolved = {}
+        pending = deque()
+        
+        for name in names:
+            cached = self.cache_manager.get(self._hierarchy_cache_key(name, direction))
+            if cached is not None:
+                resolved[name] = cached
+            else:
+                pending.append(name)
+        
+        size = self.batch_size.size
+        while pending:
+            chunk = [pending.popleft() for _ in range(min(size, len(pending)))]
+            query = self._build_batch_hierarchy_query(chunk, direction)
+            # 429 與連線錯誤由 RetryPolicy 退避後重試；還能縮小的批次逾時時不重試，直接縮小
+            shrinkable = len(chunk) > self.batch_size.minimum
+            try:
+                results = self._fetch(query, self._hierarchy_filter(), retry_timeouts=not shrinkable)
+            except Exception as e:
+                if shrinkable and is_timeout_error(e):
+                    # 批次過大導致逾時，縮小批次後重新排入；每次都比失敗的批次小，已是下限時不再縮小
+                    self.batch_size.on_timeout()
+                    size = max(self.batch_size.minimum, min(self.batch_size.size, len(chunk) // 2))
+                    pending.extendleft(reversed(chunk))
+                else:
+                    # 交由下方的單一查詢處理 (含重試)
+                    print(f"批次查詢錯誤: {str(e)}")
+                continue
+            
+            self.batch_size.on_success()
+            size = self.batch_size.size
+            with self.cache_manager.batch():
+                for name, entity_results in self._split_batch_results(results, chunk).items():
+                    cache_key = self._hierarchy_cache_key(name, direction)
+                    if self._has_bindings(entity_results):
+                        self.cache_manager.set(cache_key, entity_results)
+                    else:
+                        self.cache_manager.set(cache_key, entity_results, ttl=NEGATIVE_CACHE_EXPIRY)
+                    resolved[name] = entity_results
+        
+        # 沒有結果或批次失敗的實體走原本的查詢流程 (包含代表詞與模糊匹配)
+        for name in names:
+            if not self._has_bindings(resolved.get(name)):
+                resolved[name] = self._query_hierarchy_or_empty(name, direction, resolved.get(name))
+        
+        return resolved
+
+    def _query_hierarchy_or_empty(self, entity_name, direction, fallback=None) -> Dict[str, Any]:
+        """批次查詢用的單一查詢，失敗時沒有寫入快取，之後的單一查詢會重試"""
+        try:
+            return self.query_hierarchy(entity_name, direction)
+        except Exception as e:
+            print(f"查詢執行錯誤: {str(e)}")
+            return fallback or {"head": {"vars": []}, "results": {"bindings": []}}
+
+    def harvest_synonyms(self, entity_names) -> int:
+        """以 skos:altLabel 查詢實體的中文別名並加入同義詞表，回傳新增的別名數"""
+        names = list(dict.fromkeys(entity_names))
+        added = 0
+        for start in range(0, len(names), self.batch_size.size):
+            chunk = names[start:start + self.batch_size.size]
+            values = ' '.join(f'"{self._escape_literal(name)}"@zh' for name in chunk)
+            query = f"""
+            SELECT DISTINCT ?name ?alias WHERE {{
+              VALUES ?name {{ {values} }}
+              ?item rdfs:label ?name .
+              ?item skos:altLabel ?alias .
+              FILTER(LANG(?alias) IN ("zh", "zh-hant", "zh-tw", "zh-hk"))
+            }}
+            """
+            try:
+                added += self.synonym_index.add_bindings(self._execute_query(query))
+            except Exception as e:
+                print(f"查詢執行錯誤: {str(e)}")
+        return added
+
+    def prefetch(self, entity_names, directions=('broader', 'narrower')) -> None:
+        """預先以批次查詢填入快取，之後的單一查詢會直接命中快取"""
+        names = list(entity_names)
+        # 逐層展開模式的查詢各自不同，沒有可預先批次處理的部分
+        if not names or self.hierarchy_mode == 'bounded':
+            return
+        for direction in directions:
+            self.query_hierarchy_many(names, direction)
+
+    def get_concepts_many(self, entity_names, max_concurrency=None) -> Dict[str, Tuple[List[str], List[str]]]:
+        names = list(dict.fromkeys(entity_names))
+        self.prefetch(names)
+        return super().get_concepts_many(names, max_concurrency)
+
+    def _build_qid_hierarchy_query(self, qids: List[str], direction='broader'):
+        """以已解析的 QID 查詢上位或下位概念 (取代 CONTAINS 模糊查詢)"""
+        values = ' '.join(f"wd:{qid}" for qid in qids)
+        if direction == 'broader':
+            path = "?entity wdt:P279* ?item ."
+        else:
+            path = "?item wdt:P279* ?entity ."
+        
+        return f"""
+            SELECT DISTINCT {self._item_projection()} WHERE {{
+              VALUES ?entity {{ {values} }}
+              {path}
+              ?item rdfs:label ?itemLabel .
+              {self._label_filter()}
+            }}
+            """
+
     def _build_fuzzy_query(self, entity_name, direction='broader'):
         """使用模糊匹配的查詢"""
+        literal = self._escape_literal(entity_name)
         if direction == 'broader':
             query = f"""
-            SELECT DISTINCT ?item ?itemLabel WHERE {{
+            SELECT DISTINCT {self._item_projection()} WHERE {{
               ?entity rdfs:label ?label .
-              FILTER(CONTAINS(?label, "{entity_name}") && LANG(?label) = "zh")
+              FILTER(CONTAINS(?label, "{literal}") && LANG(?label) = "zh")
               ?entity wdt:P279* ?item .
               ?item rdfs:label ?itemLabel .
-              FILTER(LANG(?itemLabel) = "zh")
+              {self._label_filter()}
             }}
             """
         else:
             query = f"""
-            SELECT DISTINCT ?item ?itemLabel WHERE {{
+            SELECT DISTINCT {self._item_projection()} WHERE {{
               ?entity rdfs:label ?label .
-              FILTER(CONTAINS(?label, "{entity_name}") && LANG(?label) = "zh")
+              FILTER(CONTAINS(?label, "{literal}") && LANG(?label) = "zh")
               ?item wdt:P279* ?entity .
               ?item rdfs:label ?itemLabel .
-              FILTER(LANG(?itemLabel) = "zh")
+              {self._label_filter()}
             }}
             """
         
         return query
 
-    def _execute_query(self, query):
-        self.endpoint.setQuery(query)
-        try:
-            results = self.endpoint.query().convert()
-            return results
-        except Exception as e:
-            print(f"查詢執行錯誤: {str(e)}")
-            return {"results": {"bindings": []}}
+    def _item_projection(self) -> str:
+        """上下位查詢取回的變數，server 模式只需要 ?itemLabel"""
+        return '?itemLabel' if self.label_filter == 'server' else '?item ?itemLabel'
+
+    def _label_filter(self) -> str:
+        """上下位查詢對 ?itemLabel 的篩選，server 模式在伺服器端先做中文與商業關鍵詞檢查"""
+        if self.label_filter == 'server':
+            return f'FILTER(LANG(?itemLabel) = "zh" && {self.label_filter_condition("?itemLabel")})'
+        return 'FILTER(LANG(?itemLabel) = "zh")'
+
+    @staticmethod
+    def _has_bindings(results) -> bool:
+        return bool(results and results.get('results', {}).get('bindings'))
+
+    def _hierarchy_filter(self) -> Optional[BindingFilter]:
+        """stream 模式下上下位查詢在接收時即篩選的函式，其餘模式回傳 None"""
+        return self._keep_concept_binding if self.label_filter == 'stream' else None
+
+    def _keep_concept_binding(self, binding: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """與 extract_concepts 相同的條件，不符合的 binding 不會進入結果與快取"""
+        label = binding.get('itemLabel', {}).get('value')
+        if label is None or not (self.is_chinese(label) and self.is_business_related(label)):
+            return None
+        return project_values(binding)
+
+    def _query_fingerprint(self, query: str, filtered: bool = False) -> str:
+        """以正規化後的查詢字串產生快取鍵值，接收時篩選過的結果使用不同的鍵值"""
+        normalized = ' '.join(query.split())
+        prefix = 'wikidata_filtered_' if filtered else 'wikidata_query_'
+        return f"{prefix}{hashlib.md5(normalized.encode('utf-8')).hexdigest()}"
+
+    def _hierarchy_cache_key(self, entity_name, direction='broader') -> str:
+        """單一實體上下位查詢的快取鍵值，批次查詢的結果也寫入這裡"""
+        return self._query_fingerprint(self._build_hierarchy_query(entity_name, direction),
+                                       self._hierarchy_filter() is not None)
+
+    def hierarchy_cache_record(self, entity_name, direction, results) -> Tuple[str, Dict[str, Any], float]:
+        """將外部取得的上下位查詢結果轉成目前的 (快取鍵值, 資料, ttl)，格式與 _fetch_and_cache 寫入的相同"""
+        binding_filter = self._hierarchy_filter() or project_values
+        bindings = [kept for kept in map(binding_filter, results['results']['bindings']) if kept is not None]
+        results = dict(results, results={'bindings': bindings})
+        ttl = CACHE_EXPIRY if bindings else NEGATIVE_CACHE_EXPIRY
+        return self._hierarchy_cache_key(entity_name, direction), results, ttl
+
+    def _execute_query(self, query, binding_filter: Optional[BindingFilter] = None):
+        """先查快取，未命中時才送出 SPARQL 查詢；相同的並行查詢只會送出一次"""
+        cache_key = self._query_fingerprint(query, binding_filter is not None)
+        cached = self.cache_manager.get(cache_key)
+        if cached is not None:
+            return cached
+
+        return self._coalescer.run(cache_key, lambda: self._fetch_and_cache(cache_key, query, binding_filter))
+
+    def _fetch_and_cache(self, cache_key, query, binding_filter: Optional[BindingFilter] = None):
+        # 等待期間其他請求可能已寫入快取
+        cached = self.cache_manager.get(cache_key)
+        if cached is not None:
+            return cached
+
+        # 查詢失敗時例外交由呼叫端處理，不寫入快取，也不與「查無結果」混淆
+        results = self._fetch(query, binding_filter)
+
+        if self._has_bindings(results):
+            self.cache_manager.set(cache_key, results)
+        else:
+            # 查無結果使用較短的有效期限 (negative cache)
+            self.cache_manager.set(cache_key, results, ttl=NEGATIVE_CACHE_EXPIRY)
+        return results
+
+    @property
+    def endpoint(self):
+        return self._get_endpoint()
+
+    def _create_endpoint(self):
+        # 延後匯入，只建立樹或讀取快取時不需要載入 SPARQLWrapper
+        from SPARQLWrapper import SPARQLWrapper, JSON
+        endpoint = SPARQLWrapper(WIKIDATA_ENDPOINT)
+        endpoint.setReturnFormat(JSON)
+        # 設定 User-Agent 避免被封鎖
+        endpoint.addCustomHttpHeader('User-Agent', 'KnowledgeGraphBot/1.0')
+        return endpoint
+
+    def _get_endpoint(self):
+        endpoint = getattr(self._local, 'endpoint', None)
+        if endpoint is None:
+            endpoint = self._create_endpoint()
+            self._local.endpoint = endpoint
+        return endpoint
+
+    def _fetch(self, query, binding_filter: Optional[BindingFilter] = None, retry_timeouts: bool = True):
+        if retry_timeouts:
+            return self.retry_policy.call(self._send_query, query, binding_filter)
+        return self.retry_policy.call_if(lambda e: self.retry_policy.is_retryable(e) and not is_timeout_error(e),
+                                         self._send_query, query, binding_filter)
+
+    def _send_query(self, query, binding_filter: Optional[BindingFilter] = None):
+        with self.rate_limiter:
+            if self.transport is not None:
+                # 只保留各變數的 value，其餘欄位在接收時即捨棄，快取的結果也因此較小；
+                # binding_filter 不保留的 binding 在解析時即丟棄，不會累積在記憶體中
+                return self.transport.query(query, binding_filter or project_values)
+            endpoint = self._get_endpoint()
+            endpoint.setQuery(query)
+            results = endpoint.query().convert()
+        if binding_filter is not None:
+            # SPARQLWrapper 先解析完整回應，只能在之後篩選
+            bindings = results['results']['bindings']
+            results['results']['bindings'] = [kept for kept in map(binding_filter, bindings) if kept is not None]
+        return results
 
     def get_concepts(self, entity_name: str) -> Tuple[List[str], List[str]]:
         """返回上位概念和下位概念的元組"""
         broader_results = self.query_hierarchy(entity_name, 'broader')
         narrower_results = self.query_hierarchy(entity_name, 'narrower')
         
-        broader_concepts = []
-        narrower_concepts = []
-        
-        # 處理上位概念
-        for result in broader_results['results']['bindings']:
-            if 'itemLabel' in result:
-                label = result['itemLabel']['value']
-                if self.is_chinese(label) and self.is_business_related(label):
-                    broader_concepts.append(label)
-        
-        # 反轉上位概念順序，使最一般的概念在最上層
-        broader_concepts = list(reversed(sorted(set(broader_concepts))))
-        
-        # 處理下位概念
-        for result in narrower_results['results']['bindings']:
-            if 'itemLabel' in result:
-                label = result['itemLabel']['value']
-                if self.is_chinese(label) and self.is_business_related(label):
-                    narrower_concepts.append(label)
-        
-        return (broader_concepts, sorted(list(set(narrower_concepts))))
-
-    def build_concept_tree(self, entity_name: str) -> ConceptNode:
-        """建立概念樹"""
-        broader_concepts, narrower_concepts = self.get_concepts(entity_name)
-        
-        # 建立層級關係
-        if broader_concepts:
-            # 從最上層開始建立樹
-            root = ConceptNode(name=broader_concepts[0], level=0, children=[])
-            current = root
-            
-            # 建立中間層級
-            for concept in broader_concepts[1:]:
-                node = ConceptNode(name=concept, level=current.level + 1, children=[])
-                node.parent = current
-                current.children = [node]
-                current = node
-            
-            # 添加當前實體
-            entity_node = ConceptNode(name=entity_name, level=current.level + 1, children=[])
-            entity_node.parent = current
-            current.children = [entity_node]
-            
-            # 添加下位概念
-            for concept in sorted(narrower_concepts):
-                node = ConceptNode(name=concept, level=entity_node.level + 1, children=[])
-                node.parent = entity_node
-                entity_node.children.append(node)
-        else:
-            # 如果沒有上位概念，直接從當前實體開始
-            root = ConceptNode(name=entity_name, level=0, children=[])
-            for concept in sorted(narrower_concepts):
-                node = ConceptNode(name=concept, level=1, children=[])
-                node.parent = root
-                root.children.append(node)
-        
-        return root
+        return self.extract_concepts(broader_results, narrower_results)
 
     def print_tree(self, node: ConceptNode, indent: str = "", is_last: bool = True) -> str:
         """格式化輸出概念樹"""
-        result = []
-        
-        if node.level >= 0:
-            marker = "└───" if is_last else "├───"
-            prefix = indent + marker
-            result.append(f"{prefix} {node.name}")
-            indent += "    " if is_last else "│   "
-        
-        # 處理子節點
-        children = sorted(node.children, key=lambda x: x.name)
-        for i, child in enumerate(children):
-            is_last_child = i == len(children) - 1
-            result.append(self.print_tree(child, indent, is_last_child))
-        
-        return "\n".join(filter(None, result))
\ No newline at end of file
+        # 以陣列表示的樹迭代輸出，深層的樹不會超過遞迴上限
+        return CompactTree.from_concept_node(node).render(0, indent, is_last)
\ No newline at end of file
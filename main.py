@@ -1,24 +1,50 @@
+import argparse
+
 from ner.ner_processor import NERProcessor
 from ner.entity_filter import EntityFilter
 from knowledge_bases.concept_tree_manager import ConceptTreeManager
+from pipeline.incremental import IncrementalProcessor, load_documents
+from pipeline.streaming import StreamingPipeline
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Extract medical entities and build concept trees')
+    parser.add_argument('--input', help='text file or directory of .txt files (default: built-in sample text)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only reprocess new or changed documents and entities, patching stored outputs')
+    return parser.parse_args()
 
 def main():
+    args = parse_args()
     # 範例文本
     text = """王正坤醫師，藝群醫學美容集團董事長、藝群皮膚科診所院長、Dr.FreeVenus藝群保養品創辦人(玻尿酸精華液領導品牌)、藝群國際企業董事長，學歷：台北醫學大學醫學系、成功大學管理學碩士、長榮大學企管博士，經歷：中華民國行政院政務顧問、台灣醫用雷射光電學會理事長、台灣美容醫療促進協會理事長、台南市醫師公會理事長、成功大學EMBA校友總會理事長、大台南觀光聯盟理事長、亞洲皮膚科醫學會院士(AADV)、成功大學EMBA企管碩士班老師(授課連鎖企業經營管理)、成功大學附設醫院皮膚科兼任主治醫師(授課美容醫學)、長榮大學經營管理博士班老師(授課品牌管理、供應鏈管理)、中華醫事科技大學講座教授(醫學美容、醫務管理)、長榮大學校友會全國總會理事長、中華民國醫師公會全國聯合會常務理事、中華民國醫師公會全國聯合會常務監事、台灣皮膚科醫學會常務理事、國際醫療衛生促進協會監事長、衛生福利部美容醫學教育訓練委員、衛生福利部醫療器材評估專家、醫策會病人安全委員、台南市政府市政顧問、台南市安南醫院BOT委員、台南市政府公害糾紛調處委員會委員、台南市政府醫事審議委員會委員、台南市政府教育審議委員會委員、台南地方法院醫療專業調解委員、台南地方法院醫事類專家諮詢委員，得獎：台灣醫療典範獎、台灣醫療服務傑出獎、國家品牌玉山獎傑出企業領導人、台灣100大MVP經理人、衛生福利部AED「救命天使」獎、終身成就獎-台南市醫師公會、勞動部績優企業獎、台南地區傑出總經理CEO、美國BGS(Beta Gamma Sigma)國際商學會榮譽會員、台北醫學大學傑出校友、長榮大學傑出校友、中華民國斐陶斐榮譽學會榮譽會員。"""  # 您的完整文本
     
-    # 1. NER 處理
+    documents = load_documents(args.input) if args.input else {'sample': text}
     ner_processor = NERProcessor()
-    entities = ner_processor.process_text(text)
-    ner_processor.save_results(entities, 'ner_results.json')
-    
-    # 2. 實體過濾和分類
     entity_filter = EntityFilter()
-    categorized_entities = entity_filter.filter_medical_entities(entities)
-    
-    # 3. 生成概念樹
     tree_manager = ConceptTreeManager()
-    concept_trees = tree_manager.generate_trees(categorized_entities)
+    
+    if args.incremental:
+        # 只重新計算新增或變動的文件與實體，並就地更新已儲存的結果
+        report = IncrementalProcessor(ner_processor, entity_filter, tree_manager).run(documents)
+        print(report.summary())
+        print("\nNER 結果已更新到 data/ner/ner_results.json")
+        print("概念樹已更新到 data/trees/concept_trees.json 與 concept_trees.bin")
+        print("清單已儲存到 data/trees/manifest.json")
+        return
+    
+    # 1~3. NER、實體過濾與分類、生成概念樹，以串流方式同時進行
+    tree_manager.load_graph('concept_graph.json')
+    pipeline = StreamingPipeline(ner_processor, entity_filter, tree_manager)
+    results, concept_trees = pipeline.collect(documents.values())
+    entities = [entity for result in results for entity in result.entities]
+    categorized_entities = {}
+    for result in results:
+        for category, names in result.categorized.items():
+            categorized_entities[category] = list(dict.fromkeys(categorized_entities.get(category, []) + names))
+    ner_processor.save_results(entities, 'ner_results.json')
     tree_manager.save_trees(concept_trees, 'concept_trees.json')
+    tree_manager.save_trees_binary(concept_trees, 'concept_trees.bin')
+    tree_manager.save_graph('concept_graph.json')
     
     # 4. 輸出結果
     print("\n分類後的實體:")
@@ -29,6 +55,8 @@ def main():
                 print(f"- {entity}")
     
     print("\n生成的概念樹已儲存到 data/trees/concept_trees.json")
+    print("二進位格式已儲存到 data/trees/concept_trees.bin")
+    print("累積的概念圖已儲存到 data/trees/concept_graph.json")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,5 +1,6 @@
 from typing import List, Dict, Any
 import re
+from utils.keyword_matcher import KeywordMatcher
 
 class EntityFilter:
     def __init__(self):
@@ -10,24 +11,20 @@ class EntityFilter:
             'title': ['醫師', '院長', '主治醫師', '理事長'],
             'specialty': ['皮膚科', '醫學美容', '整形外科']
         }
+        self.category_matcher = KeywordMatcher.from_categories(self.categories)
 
     def categorize_entity(self, entity: Dict[str, Any]) -> str:
-        text = entity['text']
-        
-        for category, keywords in self.categories.items():
-            if any(keyword in text for keyword in keywords):
-                return category
-        
-        return 'other'
+        # 多個類別同時符合時，以 categories 中較前面的類別為準
+        return self.category_matcher.first_category(entity['text']) or 'other'
 
     def filter_medical_entities(self, entities: List[Dict[str, Any]]) -> Dict[str, List[str]]:
         categorized = {category: [] for category in self.categories.keys()}
         categorized['other'] = []
+        seen = set()
         
         for entity in entities:
-            if entity.get('is_medical', False):
-                category = self.categorize_entity(entity)
-                if entity['text'] not in categorized[category]:
-                    categorized[category].append(entity['text'])
+            if entity.get('is_medical', False) and entity['text'] not in seen:
+                seen.add(entity['text'])
+                categorized[self.categorize_entity(entity)].append(entity['text'])
         
         return categorized
\ No newline at end of file
@@ -1,34 +1,68 @@
-import spacy
-from typing import List, Dict, Any
+import threading
+from typing import List, Dict, Any, Iterable, Iterator, Optional
 import json
 from pathlib import Path
+from config import NER_MODEL, NER_PIPELINE, NER_BATCH_SIZE, NER_N_PROCESS
+from utils.keyword_matcher import KeywordMatcher
+
+_shared_nlp = None
+_shared_nlp_lock = threading.Lock()
+
+
+def get_shared_nlp():
+    """整個程序共用的 spaCy 模型，第一次使用時才匯入 spaCy 並載入"""
+    global _shared_nlp
+    if _shared_nlp is not None:
+        return _shared_nlp
+    with _shared_nlp_lock:
+        if _shared_nlp is None:
+            import spacy
+            nlp = spacy.load(NER_MODEL)
+            # 只保留實體抽取需要的元件，其餘元件 (tagger、parser 等) 不執行
+            nlp.select_pipes(enable=[name for name in NER_PIPELINE if name in nlp.pipe_names])
+            _shared_nlp = nlp
+        return _shared_nlp
+
 
 class NERProcessor:
-    def __init__(self):
-        self.nlp = spacy.load("zh_core_web_sm")
+    def __init__(self, nlp=None):
+        self._nlp = nlp
         self.medical_keywords = {
             '醫學', '醫療', '美容', '皮膚', '診所', '醫師', '醫院',
             '保養品', '玻尿酸', '雷射', '整形', '醫美'
         }
+        self.medical_matcher = KeywordMatcher(self.medical_keywords)
+
+    @property
+    def nlp(self):
+        if self._nlp is None:
+            self._nlp = get_shared_nlp()
+        return self._nlp
 
     def process_text(self, text: str) -> List[Dict[str, Any]]:
-        doc = self.nlp(text)
+        return self._extract_entities(self.nlp(text))
+
+    def process_texts(self, texts: Iterable[str], batch_size: int = NER_BATCH_SIZE,
+                      n_process: int = NER_N_PROCESS) -> Iterator[List[Dict[str, Any]]]:
+        """以 nlp.pipe 批次處理多篇文本，依輸入順序逐篇產生實體列表"""
+        for doc in self.nlp.pipe(texts, batch_size=batch_size, n_process=n_process):
+            yield self._extract_entities(doc)
+
+    def _extract_entities(self, doc) -> List[Dict[str, Any]]:
         entities = []
         
         # 增加基於規則的實體識別
         for token in doc:
             # 檢查是否包含醫療相關關鍵詞
-            for keyword in self.medical_keywords:
-                if keyword in token.text:
-                    entity_info = {
-                        'text': token.text,
-                        'label': 'MEDICAL',
-                        'start': token.idx,
-                        'end': token.idx + len(token.text),
-                        'is_medical': True
-                    }
-                    entities.append(entity_info)
-                    break
+            if self.medical_matcher.contains_any(token.text):
+                entity_info = {
+                    'text': token.text,
+                    'label': 'MEDICAL',
+                    'start': token.idx,
+                    'end': token.idx + len(token.text),
+                    'is_medical': True
+                }
+                entities.append(entity_info)
         
         # 合併 spaCy 的 NER 結果
         for ent in doc.ents:
@@ -37,7 +71,7 @@ class NERProcessor:
                 'label': ent.label_,
                 'start': ent.start_char,
                 'end': ent.end_char,
-                'is_medical': any(keyword in ent.text for keyword in self.medical_keywords)
+                'is_medical': self.medical_matcher.contains_any(ent.text)
             }
             entities.append(entity_info)
         
@@ -57,3 +91,11 @@ class NERProcessor:
         
         with open(output_dir / filename, 'w', encoding='utf-8') as f:
             json.dump(entities, f, ensure_ascii=False, indent=2)
+
+    def load_results(self, filename: str) -> Any:
+        """讀取 save_results 儲存的結果，檔案不存在時回傳空串列"""
+        try:
+            with open(Path('data/ner') / filename, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return []
@@ -0,0 +1,145 @@
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from utils.text_processor import normalize_entity
+
+
+class RegisteredEntity:
+    """正規化後的一個實體，記錄所有出現過的寫法、類別與文件"""
+
+    __slots__ = ('key', 'surface', 'variants', 'categories', 'documents', 'tree', 'has_tree', 'queued')
+
+    def __init__(self, key: str, surface: str):
+        self.key = key
+        self.surface = surface
+        self.variants: Set[str] = {surface}
+        # 依第一次出現的順序保留類別
+        self.categories: Dict[str, None] = {}
+        self.documents: Set[Any] = set()
+        self.tree: Optional[Dict[str, Any]] = None
+        # 概念樹已建立完成 (tree 可能為 None，表示查詢成功但沒有結果)
+        self.has_tree = False
+        # 已排入建樹佇列但尚未完成，避免重複排入
+        self.queued = False
+
+
+class EntityRegistry:
+    """跨文件的實體登錄表
+
+    實體以 normalize_entity 的結果識別，查詢與加入都是 O(1)。每個正規化實體的概念樹只建立一次，
+    再依原始寫法分送回各文件。建樹失敗或被中斷的實體不算完成，下次出現時會重新排入。
+    """
+
+    def __init__(self):
+        self._entities: Dict[str, RegisteredEntity] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entities)
+
+    def __contains__(self, text: str) -> bool:
+        return normalize_entity(text) in self._entities
+
+    def __iter__(self) -> Iterator[RegisteredEntity]:
+        return iter(list(self._entities.values()))
+
+    def get(self, text: str) -> Optional[RegisteredEntity]:
+        return self._entities.get(normalize_entity(text))
+
+    def add(self, category: str, text: str, document: Any = None) -> Tuple[str, bool]:
+        """登錄一個實體，回傳 (正規化鍵值, 是否為第一次出現)"""
+        key = normalize_entity(text)
+        with self._lock:
+            entity = self._entities.get(key)
+            is_new = entity is None
+            if is_new:
+                entity = self._entities[key] = RegisteredEntity(key, text)
+            entity.variants.add(text)
+            entity.categories[category] = None
+            if document is not None:
+                entity.documents.add(document)
+        return key, is_new
+
+    def add_categorized(self, categorized: Dict[str, List[str]], document: Any = None,
+                        skip: Iterable[str] = ('other',)) -> List[Tuple[str, str, str]]:
+        """登錄一篇文件的分類結果，回傳需要建立概念樹的 (類別, 鍵值, 原始寫法) 並標記為已排入
+
+        包括第一次出現的實體，以及先前建樹失敗或被中斷而還沒有完成的實體。
+        鍵值只用於去除重複，查詢知識庫時應使用第一次出現的原始寫法。
+        """
+        skip = set(skip)
+        queued = []
+        for category, names in categorized.items():
+            if category in skip:
+                continue
+            for name in names:
+                key, _ = self.add(category, name, document)
+                with self._lock:
+                    entity = self._entities[key]
+                    if entity.has_tree or entity.queued:
+                        continue
+                    entity.queued = True
+                queued.append((category, key, entity.surface))
+        return queued
+
+    def pending(self) -> Dict[str, List[str]]:
+        """尚未建立概念樹的實體，格式與 generate_trees 的輸入相同 (以第一次出現的原始寫法為名稱)"""
+        entities: Dict[str, List[str]] = {}
+        with self._lock:
+            for entity in self._entities.values():
+                if not entity.has_tree:
+                    category = next(iter(entity.categories))
+                    entities.setdefault(category, []).append(entity.surface)
+        return entities
+
+    def set_tree(self, key: str, tree: Optional[Dict[str, Any]]) -> None:
+        with self._lock:
+            entity = self._entities.get(key)
+            if entity is not None:
+                entity.tree = tree
+                entity.has_tree = True
+                entity.queued = False
+
+    def release(self, key: str) -> None:
+        """建樹失敗，保留為未完成，下次出現時重新排入"""
+        with self._lock:
+            entity = self._entities.get(key)
+            if entity is not None:
+                entity.queued = False
+
+    def release_queued(self) -> None:
+        """流程中止時，已排入但尚未完成的實體恢復為未完成"""
+        with self._lock:
+            for entity in self._entities.values():
+                entity.queued = False
+
+    def set_trees(self, trees: Dict[str, Dict[str, Any]], failed: Iterable[Tuple[str, str]] = ()) -> None:
+        """記錄 generate_trees 的結果 (以 pending() 的名稱為鍵)，沒有產生樹的待處理實體也標記為已完成，
+        failed 中的 (類別, 名稱) 除外"""
+        built = {
+            normalize_entity(name): tree
+            for category_trees in trees.values() for name, tree in category_trees.items()
+        }
+        failed_keys = {normalize_entity(name) for _, name in failed}
+        for category_names in self.pending().values():
+            for name in category_names:
+                key = normalize_entity(name)
+                if key not in failed_keys:
+                    self.set_tree(key, built.get(key))
+
+    def tree(self, text: str) -> Optional[Dict[str, Any]]:
+        entity = self.get(text)
+        return entity.tree if entity is not None else None
+
+    def fan_out(self, categorized: Dict[str, List[str]], skip: Iterable[str] = ('other',)) -> Dict[str, Any]:
+        """依文件中的原始寫法取回概念樹，格式與 generate_trees 的輸出相同"""
+        skip = set(skip)
+        trees: Dict[str, Any] = {}
+        for category, names in categorized.items():
+            if category in skip:
+                continue
+            for name in names:
+                tree = self.tree(name)
+                if tree:
+                    trees.setdefault(category, {})[name] = tree
+        return trees
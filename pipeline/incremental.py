@@ -0,0 +1,314 @@
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from config import (
+    NER_MODEL, NER_PIPELINE, KNOWLEDGE_BASE, HIERARCHY_QUERY_MODE, HIERARCHY_MAX_DEPTH,
+    HIERARCHY_RELATION_BUDGETS, HIERARCHY_MAX_RESULTS, HIERARCHY_LABEL_FILTER
+)
+from knowledge_bases.concept_filter import BUSINESS_KEYWORDS
+from knowledge_bases.concept_tree_manager import ConceptTreeManager
+from ner.entity_filter import EntityFilter
+from ner.ner_processor import NERProcessor
+from utils.text_processor import normalize_entity
+
+MANIFEST_VERSION = 3
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def fingerprint(value: Any) -> str:
+    """可 JSON 序列化的值的雜湊，dict 與 set 的順序不影響結果"""
+    return content_hash(json.dumps(value, ensure_ascii=False, sort_keys=True, default=sorted))
+
+
+def write_json_atomic(data: Any, path: Path) -> None:
+    """先寫入暫存檔再取代，中途中斷不會留下寫了一半的檔案"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + '.tmp')
+    with tmp_path.open('w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def load_documents(path: Path, pattern: str = '*.txt') -> Dict[str, str]:
+    """讀取輸入文件：目錄中的每個檔案為一篇文件 (以相對路徑為 ID)，單一檔案為一篇文件"""
+    path = Path(path)
+    if path.is_dir():
+        files = sorted(file for file in path.rglob(pattern) if file.is_file())
+        return {file.relative_to(path).as_posix(): file.read_text(encoding='utf-8') for file in files}
+    return {path.name: path.read_text(encoding='utf-8')}
+
+
+class Manifest:
+    """記錄每篇文件與每棵概念樹是由哪些輸入產生的
+
+    documents: 文件 ID -> {'hash': 內容雜湊, 'entities_hash': 實體集合雜湊, 'categorized': 分類結果}
+    trees: 正規化實體 -> {'hash': 建樹輸入的雜湊 (建樹失敗時為 None), 'surface': 查詢的寫法,
+    'category': 概念圖中的類別, 'documents': 出現的文件, 'has_tree'}；與完整執行相同，
+    同一正規化實體的各種寫法與類別共用一棵樹
+    """
+
+    def __init__(self, ner_fingerprint: str = '', tree_fingerprint: str = '',
+                 documents: Optional[Dict[str, Dict[str, Any]]] = None,
+                 trees: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.ner_fingerprint = ner_fingerprint
+        self.tree_fingerprint = tree_fingerprint
+        self.documents = documents or {}
+        self.trees = trees or {}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'version': MANIFEST_VERSION,
+            'ner_fingerprint': self.ner_fingerprint,
+            'tree_fingerprint': self.tree_fingerprint,
+            'documents': self.documents,
+            'trees': self.trees,
+        }
+
+    def save(self, path: Path) -> None:
+        write_json_atomic(self.to_dict(), path)
+
+    @classmethod
+    def load_if_exists(cls, path: Path) -> 'Manifest':
+        """讀取清單，不存在或版本不符時回傳空清單 (等同全部重新計算)"""
+        try:
+            with Path(path).open('r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return cls()
+        if data.get('version') != MANIFEST_VERSION:
+            return cls()
+        return cls(data['ner_fingerprint'], data['tree_fingerprint'], data['documents'], data['trees'])
+
+
+@dataclass
+class IncrementalReport:
+    documents_processed: List[str] = field(default_factory=list)
+    documents_reused: int = 0
+    documents_removed: List[str] = field(default_factory=list)
+    entity_sets_changed: List[str] = field(default_factory=list)
+    trees_built: List[str] = field(default_factory=list)
+    trees_reused: int = 0
+    trees_removed: List[str] = field(default_factory=list)
+    trees_failed: List[str] = field(default_factory=list)
+
+    def summary(self) -> str:
+        return (f"文件: 處理 {len(self.documents_processed)}、沿用 {self.documents_reused}、"
+                f"移除 {len(self.documents_removed)} (實體集合變動 {len(self.entity_sets_changed)})；"
+                f"概念樹: 重建 {len(self.trees_built)}、沿用 {self.trees_reused}、移除 {len(self.trees_removed)}、"
+                f"失敗 {len(self.trees_failed)} (下次執行時重試)")
+
+
+class IncrementalProcessor:
+    """增量處理：只對新增或內容變動的文件執行 NER，只為新增或輸入變動的實體重建概念樹
+
+    每次執行後就地更新已儲存的 NER 結果 ({文件 ID: 實體})、概念樹、二進位檔與概念圖，
+    最後才寫入清單；中途中斷時下一次執行會重新計算未記錄的部分。
+    NER 或建樹相關的設定改變時，對應的結果全部重新計算。
+    """
+
+    def __init__(self, ner_processor: Optional[NERProcessor] = None,
+                 entity_filter: Optional[EntityFilter] = None,
+                 tree_manager: Optional[ConceptTreeManager] = None,
+                 manifest_filename: str = 'manifest.json',
+                 trees_filename: str = 'concept_trees.json',
+                 binary_filename: str = 'concept_trees.bin',
+                 graph_filename: str = 'concept_graph.json',
+                 ner_filename: str = 'ner_results.json'):
+        self.ner_processor = ner_processor or NERProcessor()
+        self.entity_filter = entity_filter or EntityFilter()
+        self.tree_manager = tree_manager or ConceptTreeManager()
+        self.manifest_path = self.tree_manager.trees_dir / manifest_filename
+        self.trees_filename = trees_filename
+        self.binary_filename = binary_filename
+        self.graph_filename = graph_filename
+        self.ner_filename = ner_filename
+
+    def ner_fingerprint(self) -> str:
+        """影響 NER 與分類結果的設定"""
+        return fingerprint([NER_MODEL, list(NER_PIPELINE), self.ner_processor.medical_keywords,
+                            self.entity_filter.categories])
+
+    def tree_fingerprint(self) -> str:
+        """影響概念樹的設定"""
+        return fingerprint([KNOWLEDGE_BASE, HIERARCHY_QUERY_MODE, HIERARCHY_MAX_DEPTH,
+                            HIERARCHY_RELATION_BUDGETS, HIERARCHY_MAX_RESULTS, HIERARCHY_LABEL_FILTER,
+                            BUSINESS_KEYWORDS])
+
+    def _update_documents(self, manifest: Manifest, documents: Dict[str, str],
+                          ner_results: Dict[str, Any], report: IncrementalReport) -> None:
+        ner_fingerprint = self.ner_fingerprint()
+        if manifest.ner_fingerprint != ner_fingerprint:
+            manifest.documents = {}
+            manifest.ner_fingerprint = ner_fingerprint
+
+        for doc_id in sorted((set(manifest.documents) | set(ner_results)) - set(documents)):
+            manifest.documents.pop(doc_id, None)
+            ner_results.pop(doc_id, None)
+            report.documents_removed.append(doc_id)
+
+        changed = {
+            doc_id: text for doc_id, text in documents.items()
+            if manifest.documents.get(doc_id, {}).get('hash') != content_hash(text)
+            or doc_id not in ner_results
+        }
+        report.documents_reused = len(documents) - len(changed)
+        for doc_id, entities in zip(changed, self.ner_processor.process_texts(changed.values())):
+            categorized = self.entity_filter.filter_medical_entities(entities)
+            entities_hash = fingerprint(categorized)
+            if manifest.documents.get(doc_id, {}).get('entities_hash') != entities_hash:
+                report.entity_sets_changed.append(doc_id)
+            manifest.documents[doc_id] = {
+                'hash': content_hash(changed[doc_id]),
+                'entities_hash': entities_hash,
+                'categorized': categorized,
+            }
+            ner_results[doc_id] = entities
+            report.documents_processed.append(doc_id)
+
+    def _wanted_entities(self, manifest: Manifest) -> Dict[str, Dict[str, Any]]:
+        """所有文件中需要概念樹的實體，與 EntityRegistry 相同以 normalize_entity 合併各種寫法
+
+        鍵值 -> {'surface': 第一次出現的寫法 (用於查詢), 'category': 第一次出現的類別,
+                 'occurrences': {(類別, 寫法)}, 'documents': [文件 ID]}
+        """
+        wanted: Dict[str, Dict[str, Any]] = {}
+        for doc_id in sorted(manifest.documents):
+            for category, names in manifest.documents[doc_id]['categorized'].items():
+                if category == 'other':
+                    continue
+                for name in names:
+                    entity = wanted.setdefault(normalize_entity(name), {
+                        'surface': name, 'category': category, 'occurrences': {}, 'documents': [],
+                    })
+                    entity['occurrences'][category, name] = None
+                    if doc_id not in entity['documents']:
+                        entity['documents'].append(doc_id)
+        return wanted
+
+    def _previous_tree(self, trees: Dict[str, Any], entry: Optional[Dict[str, Any]],
+                       entity: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """上一次的概念樹：先找概念圖中的視圖，再找概念樹檔案中任一種寫法"""
+        if entry is not None and entry.get('has_tree'):
+            tree = self.tree_manager.concept_graph.tree_view(entry['category'], entry['surface'])
+            if tree is not None:
+                return tree
+        for category, name in entity['occurrences']:
+            tree = trees.get(category, {}).get(name)
+            if tree:
+                return tree
+        return None
+
+    def _update_trees(self, manifest: Manifest, trees: Dict[str, Any], report: IncrementalReport) -> Dict[str, Any]:
+        """更新清單與概念圖，回傳新的概念樹；不再被任何文件使用的樹從概念樹與概念圖中移除"""
+        graph = self.tree_manager.concept_graph
+        tree_fingerprint = self.tree_fingerprint()
+        if manifest.tree_fingerprint != tree_fingerprint:
+            manifest.trees = {}
+            manifest.tree_fingerprint = tree_fingerprint
+
+        wanted = self._wanted_entities(manifest)
+        for key in [key for key in manifest.trees if key not in wanted]:
+            del manifest.trees[key]
+
+        entity_trees: Dict[str, Optional[Dict[str, Any]]] = {}
+        rebuilt = set()
+        pending: Dict[str, List[str]] = {}
+        hashes = {}
+        for key, entity in wanted.items():
+            # 概念樹只由查詢的寫法決定，與類別無關
+            hashes[key] = fingerprint([entity['surface'], tree_fingerprint])
+            entry = manifest.trees.get(key)
+            if entry is not None and entry['hash'] == hashes[key]:
+                tree = graph.tree_view(entry['category'], entry['surface']) if entry['has_tree'] else None
+                # 概念圖中找不到記錄的樹時重新建立
+                if tree is not None or not entry['has_tree']:
+                    entry['category'] = entity['category']
+                    entry['documents'] = entity['documents']
+                    entity_trees[key] = tree
+                    report.trees_reused += 1
+                    continue
+            pending.setdefault(entity['category'], []).append(entity['surface'])
+
+        built, failed = self.tree_manager.build_trees_bulk(pending) if pending else ({}, set())
+        for key, entity in wanted.items():
+            if key in entity_trees:
+                continue
+            category, surface = entity['category'], entity['surface']
+            entry = manifest.trees.get(key)
+            rebuilt.add(key)
+            if (category, surface) in failed:
+                # 查詢失敗不記錄雜湊，下次執行時重新建立；原本的概念樹保留到成功為止
+                tree = self._previous_tree(trees, entry, entity)
+                report.trees_failed.append(surface)
+            else:
+                tree = built.get(category, {}).get(surface)
+                report.trees_built.append(surface)
+            manifest.trees[key] = {
+                'hash': None if (category, surface) in failed else hashes[key],
+                'surface': surface,
+                'category': category,
+                'documents': entity['documents'],
+                'has_tree': tree is not None,
+            }
+            entity_trees[key] = tree
+
+        # 概念圖中每個實體一個視圖 (第一次出現的類別與寫法)，與完整執行相同
+        views = {
+            (entity['category'], entity['surface']): key
+            for key, entity in wanted.items() if entity_trees.get(key)
+        }
+        removed = set()
+        for category, name in list(graph.iter_views()):
+            if (category, name) not in views:
+                graph.remove_entity(category, name)
+                removed.add((category, name))
+        for (category, name), key in views.items():
+            if key in rebuilt or name not in graph.views.get(category, {}):
+                graph.upsert_tree(category, name, entity_trees[key])
+
+        # 概念樹依各文件中的原始寫法分送，與 EntityRegistry.fan_out 相同
+        updated: Dict[str, Any] = {}
+        for key, entity in wanted.items():
+            tree = entity_trees.get(key)
+            if tree:
+                for category, name in entity['occurrences']:
+                    updated.setdefault(category, {})[name] = tree
+        removed.update(
+            (category, name) for category, category_trees in trees.items()
+            for name in category_trees if name not in updated.get(category, {})
+        )
+        report.trees_removed.extend(name for _, name in sorted(removed))
+        return updated
+
+    def run(self, documents: Dict[str, str]) -> IncrementalReport:
+        """處理 {文件 ID: 內容}，只重新計算變動的部分並更新已儲存的結果"""
+        report = IncrementalReport()
+        manifest = Manifest.load_if_exists(self.manifest_path)
+        ner_results = self.ner_processor.load_results(self.ner_filename)
+        if not isinstance(ner_results, dict):
+            # 非增量模式寫入的單篇結果沒有文件 ID，無法沿用
+            ner_results = {}
+        previous_trees = self.tree_manager.load_trees(self.trees_filename)
+        self.tree_manager.load_graph(self.graph_filename)
+
+        self._update_documents(manifest, documents, ner_results, report)
+        trees = self._update_trees(manifest, previous_trees, report)
+
+        self.ner_processor.save_results(ner_results, self.ner_filename)
+        # 概念樹沒有變動時不重寫整個 JSON 與二進位檔
+        trees_dir = self.tree_manager.trees_dir
+        if (trees != previous_trees or not (trees_dir / self.trees_filename).exists()
+                or not (trees_dir / self.binary_filename).exists()):
+            self.tree_manager.save_trees(trees, self.trees_filename)
+            self.tree_manager.save_trees_binary(trees, self.binary_filename)
+        self.tree_manager.save_graph(self.graph_filename)
+        manifest.save(self.manifest_path)
+        return report
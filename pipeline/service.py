@@ -0,0 +1,239 @@
+import json
+import os
+import socketserver
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+from config import NER_BATCH_SIZE, SERVICE_MAX_BODY_BYTES, SERVICE_MAX_DOCUMENTS
+from cache.memory_cache import get_shared_memory_cache
+from knowledge_bases.concept_tree_manager import ConceptTreeManager
+from knowledge_bases.federated import FederatedKnowledgeBase
+from ner.entity_filter import EntityFilter
+from ner.ner_processor import NERProcessor
+from pipeline.entity_registry import EntityRegistry
+
+STAGES = ('ner', 'filter', 'trees')
+
+
+class StageStats:
+    """各階段的處理次數與延遲 (毫秒)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.last_ms = 0.0
+
+    def record(self, elapsed_ms: float) -> None:
+        with self._lock:
+            self.count += 1
+            self.total_ms += elapsed_ms
+            self.max_ms = max(self.max_ms, elapsed_ms)
+            self.last_ms = elapsed_ms
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                'count': self.count,
+                'avg_ms': round(self.total_ms / self.count, 3) if self.count else 0.0,
+                'max_ms': round(self.max_ms, 3),
+                'last_ms': round(self.last_ms, 3),
+            }
+
+
+class PipelineService:
+    """常駐的 NER → EntityFilter → ConceptTreeManager 流程，模型、快取與連線在請求之間保留"""
+
+    def __init__(self, ner_processor: Optional[NERProcessor] = None,
+                 entity_filter: Optional[EntityFilter] = None,
+                 tree_manager: Optional[ConceptTreeManager] = None,
+                 graph_filename: str = 'concept_graph.json'):
+        self.ner_processor = ner_processor or NERProcessor()
+        self.entity_filter = entity_filter or EntityFilter()
+        self.tree_manager = tree_manager or ConceptTreeManager()
+        self.graph_filename = graph_filename
+        self.tree_manager.load_graph(graph_filename)
+        # 概念圖不是執行緒安全的，同時只允許一個請求更新
+        self._tree_lock = threading.Lock()
+        self.stage_stats = {stage: StageStats() for stage in STAGES + ('total',)}
+        self.started_at = time.time()
+        self.requests = 0
+        self.documents = 0
+        self.errors = 0
+        self._counter_lock = threading.Lock()
+        self.warm = False
+
+    def warm_up(self) -> None:
+        """預先載入模型與客戶端，第一個請求不需要等待"""
+        # 兩者都是延遲建立的屬性，讀取即會載入
+        self.ner_processor.nlp
+        self.tree_manager.knowledge_base
+        self.warm = True
+
+    @contextmanager
+    def _timed(self, stage: str, timings: Dict[str, float]):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            timings[stage] = round(elapsed_ms, 3)
+            self.stage_stats[stage].record(elapsed_ms)
+
+    def process(self, documents: List[str], build_trees: bool = True,
+                batch_size: int = NER_BATCH_SIZE) -> Dict[str, Any]:
+        """處理一批文件，回傳每篇文件的實體與分類，以及整批實體的概念樹"""
+        timings: Dict[str, float] = {}
+        with self._timed('total', timings):
+            with self._timed('ner', timings):
+                entities = list(self.ner_processor.process_texts(documents, batch_size=batch_size))
+
+            with self._timed('filter', timings):
+                categorized = [self.entity_filter.filter_medical_entities(doc_entities) for doc_entities in entities]
+
+            trees: Dict[str, Any] = {}
+            if build_trees:
+                with self._timed('trees', timings):
+                    # 整批文件中的同一個正規化實體只建立一次概念樹
+                    registry = EntityRegistry()
+                    for index, doc_categorized in enumerate(categorized):
+                        registry.add_categorized(doc_categorized, index)
+                    # 查詢知識庫不需要鎖，並行的請求可以同時建樹；只有更新概念圖時互斥
+                    built, failed = self.tree_manager.build_trees_bulk(registry.pending())
+                    with self._tree_lock:
+                        self.tree_manager.concept_graph.upsert_trees(built)
+                        registry.set_trees(built, failed)
+                    for doc_categorized in categorized:
+                        for category, category_trees in registry.fan_out(doc_categorized).items():
+                            trees.setdefault(category, {}).update(category_trees)
+
+        with self._counter_lock:
+            self.requests += 1
+            self.documents += len(documents)
+        return {
+            'documents': [
+                {'entities': doc_entities, 'categorized': doc_categorized}
+                for doc_entities, doc_categorized in zip(entities, categorized)
+            ],
+            'trees': trees,
+            'timings_ms': timings,
+        }
+
+    def record_error(self) -> None:
+        with self._counter_lock:
+            self.errors += 1
+
+    def health(self) -> Dict[str, Any]:
+        return {'status': 'ok', 'warm': self.warm, 'uptime_s': round(time.time() - self.started_at, 1)}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._counter_lock:
+            counters = {'requests': self.requests, 'documents': self.documents, 'errors': self.errors}
+        stats = dict(counters, stages={stage: stage_stats.snapshot() for stage, stage_stats in self.stage_stats.items()})
+        memory_cache = get_shared_memory_cache()
+        if memory_cache is not None:
+            stats['memory_cache'] = memory_cache.stats()
+        if isinstance(self.tree_manager._knowledge_base, FederatedKnowledgeBase):
+            stats['knowledge_bases'] = self.tree_manager._knowledge_base.status()
+        stats['concept_graph'] = {'nodes': len(self.tree_manager.concept_graph),
+                                  'edges': self.tree_manager.concept_graph.edge_count}
+        return stats
+
+    def save(self) -> None:
+        """保存累積的概念圖"""
+        with self._tree_lock:
+            self.tree_manager.save_graph(self.graph_filename)
+
+
+class PipelineRequestHandler(BaseHTTPRequestHandler):
+    """GET /health、GET /stats、POST /process ({"documents": [...]} 或 {"text": "..."})"""
+
+    service: PipelineService = None
+    protocol_version = 'HTTP/1.1'
+
+    def _send_json(self, status: int, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._send_json(200, self.service.health())
+        elif self.path == '/stats':
+            self._send_json(200, self.service.stats())
+        else:
+            self._send_json(404, {'error': f"找不到路徑: {self.path}"})
+
+    def do_POST(self):
+        if self.path != '/process':
+            self._send_json(404, {'error': f"找不到路徑: {self.path}"})
+            return
+
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            # rfile.read(-1) 會一直等到用戶端關閉連線
+            self.close_connection = True
+            self._send_json(400, {'error': "無效的 Content-Length"})
+            return
+        if length > SERVICE_MAX_BODY_BYTES:
+            self.close_connection = True
+            self._send_json(413, {'error': "請求內容過大"})
+            return
+        try:
+            request = json.loads(self.rfile.read(length) or b'{}')
+            documents = request['documents'] if 'documents' in request else [request['text']]
+            if not isinstance(documents, list) or not all(isinstance(doc, str) for doc in documents):
+                raise ValueError("documents 必須是字串陣列")
+        except (KeyError, TypeError, ValueError) as e:
+            self._send_json(400, {'error': f"無效的請求: {e}"})
+            return
+        if len(documents) > SERVICE_MAX_DOCUMENTS:
+            self._send_json(413, {'error': f"單次最多 {SERVICE_MAX_DOCUMENTS} 篇文件"})
+            return
+
+        try:
+            result = self.service.process(documents, build_trees=request.get('trees', True))
+        except Exception as e:
+            self.service.record_error()
+            self._send_json(500, {'error': str(e)})
+            return
+        self._send_json(200, result)
+
+    def address_string(self) -> str:
+        # Unix socket 的 client_address 是字串
+        if isinstance(self.client_address, tuple):
+            return super().address_string()
+        return 'unix'
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def server_bind(self):
+        if os.path.exists(self.server_address):
+            os.unlink(self.server_address)
+        super().server_bind()
+        # BaseHTTPRequestHandler 需要這兩個屬性
+        self.server_name = 'localhost'
+        self.server_port = 0
+
+
+def create_server(service: PipelineService, host: str = None, port: int = None,
+                  socket_path: str = None):
+    """建立 HTTP 伺服器，指定 socket_path 時改用 Unix socket"""
+    handler = type('BoundPipelineRequestHandler', (PipelineRequestHandler,), {'service': service})
+    if socket_path:
+        return ThreadingUnixHTTPServer(socket_path, handler)
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
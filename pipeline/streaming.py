@@ -0,0 +1,206 @@
+import queue
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from config import NER_BATCH_SIZE, PIPELINE_QUEUE_SIZE, PIPELINE_TREE_BATCH_SIZE, PIPELINE_TREE_WORKERS
+from knowledge_bases.concept_tree_manager import BUILD_FAILED, ConceptTreeManager
+from ner.entity_filter import EntityFilter
+from ner.ner_processor import NERProcessor
+from pipeline.entity_registry import EntityRegistry
+
+# 階段結束的標記
+_DONE = object()
+
+
+@dataclass
+class DocumentResult:
+    index: int
+    entities: List[Dict[str, Any]]
+    categorized: Dict[str, List[str]]
+
+
+@dataclass
+class TreeResult:
+    category: str
+    entity: str  # 正規化後的實體名稱 (normalize_entity)
+    tree: Optional[Dict[str, Any]] = None
+    # 查詢知識庫時使用的原始寫法
+    surface: str = ''
+    # 查詢失敗，實體在下次出現時重新建樹
+    failed: bool = False
+
+
+@dataclass
+class _StageError:
+    stage: str
+    error: BaseException
+
+
+class StreamingPipeline:
+    """NER → EntityFilter → 概念樹的串流流程
+
+    每個階段在各自的執行緒中執行，階段之間以有界佇列連接：下游來不及處理時上游會被阻塞，
+    整個語料因此能以固定的記憶體串流通過。查詢知識庫的建樹階段與 NER 同時進行。
+    """
+
+    def __init__(self, ner_processor: Optional[NERProcessor] = None,
+                 entity_filter: Optional[EntityFilter] = None,
+                 tree_manager: Optional[ConceptTreeManager] = None,
+                 queue_size: int = PIPELINE_QUEUE_SIZE,
+                 tree_workers: int = PIPELINE_TREE_WORKERS,
+                 tree_batch_size: int = PIPELINE_TREE_BATCH_SIZE,
+                 ner_batch_size: int = NER_BATCH_SIZE,
+                 registry: Optional[EntityRegistry] = None):
+        self.ner_processor = ner_processor or NERProcessor()
+        self.entity_filter = entity_filter or EntityFilter()
+        self.tree_manager = tree_manager or ConceptTreeManager()
+        self.queue_size = queue_size
+        self.tree_workers = tree_workers
+        self.tree_batch_size = tree_batch_size
+        self.ner_batch_size = ner_batch_size
+        # 跨文件、跨執行共用，同一個正規化實體只建立一次概念樹
+        self.registry = registry or EntityRegistry()
+
+    def _put(self, target: queue.Queue, item: Any, stop: threading.Event) -> bool:
+        """放入佇列，佇列已滿時等待；流程被中止時回傳 False"""
+        while not stop.is_set():
+            try:
+                target.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, source: queue.Queue, stop: threading.Event) -> Any:
+        """從佇列取出，流程被中止時回傳結束標記"""
+        while not stop.is_set():
+            try:
+                return source.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _ner_stage(self, texts: Iterable[str], output: queue.Queue, results: queue.Queue,
+                   stop: threading.Event) -> None:
+        try:
+            docs = self.ner_processor.process_texts(texts, batch_size=self.ner_batch_size)
+            for index, entities in enumerate(docs):
+                if not self._put(output, (index, entities), stop):
+                    return
+        except BaseException as e:
+            self._put(results, _StageError('ner', e), stop)
+        finally:
+            self._put(output, _DONE, stop)
+
+    def _filter_stage(self, source: queue.Queue, output: queue.Queue, results: queue.Queue,
+                      stop: threading.Event) -> None:
+        try:
+            while True:
+                item = self._get(source, stop)
+                if item is _DONE:
+                    break
+                index, entities = item
+                categorized = self.entity_filter.filter_medical_entities(entities)
+                if not self._put(results, DocumentResult(index, entities, categorized), stop):
+                    return
+                # 只有還沒有概念樹的正規化實體需要建立 (每個實體同時只排入一次)
+                for item in self.registry.add_categorized(categorized, index):
+                    if not self._put(output, item, stop):
+                        return
+        except BaseException as e:
+            self._put(results, _StageError('filter', e), stop)
+        finally:
+            for _ in range(self.tree_workers):
+                self._put(output, _DONE, stop)
+
+    def _tree_stage(self, source: queue.Queue, results: queue.Queue, stop: threading.Event) -> None:
+        try:
+            finished = False
+            while not finished and not stop.is_set():
+                batch = [self._get(source, stop)]
+                # 取出佇列中已經在等待的實體，一起預先查詢
+                while len(batch) < self.tree_batch_size:
+                    try:
+                        batch.append(source.get_nowait())
+                    except queue.Empty:
+                        break
+                done = sum(1 for item in batch if item is _DONE)
+                if done:
+                    finished = True
+                    batch = [item for item in batch if item is not _DONE]
+                    # 多取到的結束標記放回，讓其他建樹執行緒也能結束
+                    for _ in range(done - 1):
+                        self._put(source, _DONE, stop)
+                if not batch:
+                    continue
+                # 鍵值經過正規化 (NFKC、去括號、簡轉繁)，查詢時使用文件中的原始寫法
+                self.tree_manager.knowledge_base.prefetch(surface for _, _, surface in batch)
+                for category, key, surface in batch:
+                    tree = self.tree_manager.try_build_entity_tree(surface)
+                    if tree is BUILD_FAILED:
+                        result = TreeResult(category, key, surface=surface, failed=True)
+                    else:
+                        result = TreeResult(category, key, tree, surface=surface)
+                    if not self._put(results, result, stop):
+                        return
+        except BaseException as e:
+            self._put(results, _StageError('trees', e), stop)
+        finally:
+            self._put(results, _DONE, stop)
+
+    def run(self, texts: Iterable[str]) -> Iterator[Union[DocumentResult, TreeResult]]:
+        """依完成順序產生每篇文件的 DocumentResult 與每個實體的 TreeResult
+
+        建立出的概念樹會加入 tree_manager 的概念圖。提前停止迭代時所有階段都會結束。
+        同一個 StreamingPipeline 同時只能執行一個 run()。
+        """
+        stop = threading.Event()
+        entity_queue: queue.Queue = queue.Queue(self.queue_size)
+        tree_queue: queue.Queue = queue.Queue(self.queue_size)
+        results: queue.Queue = queue.Queue(self.queue_size)
+        threads = [
+            threading.Thread(target=self._ner_stage, args=(texts, entity_queue, results, stop), daemon=True),
+            threading.Thread(target=self._filter_stage, args=(entity_queue, tree_queue, results, stop), daemon=True),
+        ] + [
+            threading.Thread(target=self._tree_stage, args=(tree_queue, results, stop), daemon=True)
+            for _ in range(self.tree_workers)
+        ]
+        for thread in threads:
+            thread.start()
+
+        try:
+            remaining = self.tree_workers
+            while remaining:
+                item = results.get()
+                if item is _DONE:
+                    remaining -= 1
+                elif isinstance(item, _StageError):
+                    raise RuntimeError(f"串流流程的 {item.stage} 階段失敗") from item.error
+                else:
+                    if isinstance(item, TreeResult) and item.failed:
+                        self.registry.release(item.entity)
+                    elif isinstance(item, TreeResult):
+                        self.registry.set_tree(item.entity, item.tree)
+                        if item.tree:
+                            # 概念圖只在這個執行緒中更新
+                            self.tree_manager.concept_graph.upsert_tree(item.category, item.surface, item.tree)
+                    yield item
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join(timeout=1)
+            # 中止時還在佇列中的實體下次執行時重新排入
+            self.registry.release_queued()
+
+    def collect(self, texts: Iterable[str]) -> Tuple[List[DocumentResult], Dict[str, Any]]:
+        """執行整個流程，回傳依輸入順序排列的文件結果，以及與 generate_trees 相同格式的概念樹"""
+        documents = [item for item in self.run(texts) if isinstance(item, DocumentResult)]
+        documents.sort(key=lambda document: document.index)
+
+        # 每個正規化實體的概念樹依原始寫法分送回各文件
+        trees: Dict[str, Any] = {}
+        for document in documents:
+            for category, category_trees in self.registry.fan_out(document.categorized).items():
+                trees.setdefault(category, {}).update(category_trees)
+        return documents, trees
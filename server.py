@@ -0,0 +1,35 @@
+import argparse
+import signal
+
+from config import SERVICE_HOST, SERVICE_PORT
+from pipeline.service import PipelineService, create_server
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve the NER -> filter -> concept tree pipeline over HTTP')
+    parser.add_argument('--host', default=SERVICE_HOST, help='Address to bind')
+    parser.add_argument('--port', type=int, default=SERVICE_PORT, help='Port to bind')
+    parser.add_argument('--socket', help='Serve on this Unix socket path instead of TCP')
+    parser.add_argument('--no-warmup', action='store_true', help='Load the model and clients on the first request')
+    args = parser.parse_args()
+
+    service = PipelineService()
+    if not args.no_warmup:
+        print("載入模型與知識庫客戶端...")
+        service.warm_up()
+
+    server = create_server(service, args.host, args.port, args.socket)
+    print(f"服務已啟動: {args.socket or f'http://{args.host}:{args.port}'}")
+    # SIGTERM 與 Ctrl+C 相同，停止前保存概念圖
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        # 保存服務期間累積的概念圖
+        service.save()
+        print("\n服務已停止，概念圖已儲存到 data/trees/concept_graph.json")
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,14 @@
+from pathlib import Path
+import sys
+
+DEMO_DIR = Path(__file__).resolve().parent
+# 以 python tree_merge/demo.py 或在 tree_merge 目錄下直接執行時，專案根目錄不在 sys.path 中
+if str(DEMO_DIR.parent) not in sys.path:
+    sys.path.insert(0, str(DEMO_DIR.parent))
+
+from tree_merge.merger import TreeMerger
+from tree_merge.tree_io import read_tree, write_tree
+
 class TreeNode:
     def __init__(self, val=""):
         self.val = val
@@ -88,60 +99,20 @@ print_tree_visual(tree1)
 print("\n第二棵樹 (治療部位分類):")
 print_tree_visual(tree2)
 
-# 使用先前定義的合併算法
+# 使用 merger 模組的合併引擎
 def merge_trees(root1, root2):
-    # 用於存儲共同節點的集合
-    common_nodes = set()
-    
-    def create_node_map(root, node_map):
-        if not root:
-            return
-        node_map[root.val] = root
-        for child in root.children:
-            create_node_map(child, node_map)
-    
-    def find_common_nodes(map1, map2):
-        return set(map1.keys()) & set(map2.keys())
-    
-    def merge_from_node(node1, node2, merged_nodes):
-        if not node1 or not node2:
-            return node1 or node2
-            
-        if node1.val in merged_nodes:
-            return node1
-            
-        merged_nodes.add(node1.val)
-        merged_node = TreeNode(node1.val)
-        
-        # 如果節點在兩棵樹中都存在，標記為共同節點
-        if node1.val == node2.val:
-            common_nodes.add(node1.val)
-        
-        children_values = set()
-        children_nodes = []
-        
-        for child1 in node1.children:
-            if child1.val not in children_values:
-                children_values.add(child1.val)
-                matching_child2 = next((c for c in node2.children if c.val == child1.val), None)
-                children_nodes.append(merge_from_node(child1, matching_child2, merged_nodes))
-        
-        for child2 in node2.children:
-            if child2.val not in children_values:
-                children_values.add(child2.val)
-                children_nodes.append(merge_from_node(child2, child2, merged_nodes))
-        
-        merged_node.children = children_nodes
-        return merged_node
-    
+    """合併兩棵樹，回傳 (合併後的樹, 共同節點集合)"""
     if not root1 or not root2:
-        return root1 or root2, common_nodes
+        return root1 or root2, set()
         
     if root1.val != root2.val:
-        return None, common_nodes
-        
-    merged_nodes = set()
-    return merge_from_node(root1, root2, merged_nodes), common_nodes
+        return None, set()
+    
+    merger = TreeMerger()
+    merger.add_tree(root1)
+    merger.add_tree(root2)
+    merged = merger.to_tree(merger.nodes[root1.val], node_factory=TreeNode)
+    return merged, merger.common_nodes()
 
 # 合併兩棵樹並印出結果
 merged_tree, common_nodes = merge_trees(tree1, tree2)
@@ -149,49 +120,12 @@ print("\n合併後的樹 (標記 [*] 為共同節點):")
 print_tree_visual(merged_tree, common_nodes)
 
 def save_tree_to_file(root, filename):
-    """將樹結構保存到文件中"""
-    def write_node(node, level, file):
-        indent = "    " * level
-        file.write(f"{indent}{node.val}\n")
-        for child in node.children:
-            write_node(child, level + 1, file)
-            
-    with open(filename, 'w', encoding='utf-8') as f:
-        write_node(root, 0, f)
+    """將樹結構保存到文件中，相對路徑以 demo 所在目錄為準"""
+    write_tree(root, DEMO_DIR / filename)
 
 def load_tree_from_file(filename):
-    """從文件中讀取樹結構"""
-    def count_indent(line):
-        return len(line) - len(line.lstrip())
-    
-    def create_node_from_line(line):
-        return TreeNode(line.strip())
-    
-    with open(filename, 'r', encoding='utf-8') as f:
-        lines = [line.rstrip() for line in f.readlines() if line.strip()]
-    
-    if not lines:
-        return None
-    
-    root = create_node_from_line(lines[0])
-    stack = [(root, 0)]
-    
-    for line in lines[1:]:
-        indent = count_indent(line)
-        level = indent // 4  # 每個縮排級別為4個空格
-        node = create_node_from_line(line)
-        
-        # 找到正確的父節點
-        while stack and stack[-1][1] >= level:
-            stack.pop()
-        
-        if stack:
-            parent = stack[-1][0]
-            parent.children.append(node)
-        
-        stack.append((node, level))
-    
-    return root
+    """從文件中讀取樹結構，相對路徑以 demo 所在目錄為準"""
+    return read_tree(DEMO_DIR / filename, TreeNode)
 
 # 新增主程式部分
 if __name__ == "__main__":
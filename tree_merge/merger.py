@@ -0,0 +1,173 @@
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+
+class MergedNode:
+    """合併結果中的節點，同一標籤在所有來源中只會有一個節點"""
+
+    __slots__ = ('label', 'children', 'parents', 'sources')
+
+    def __init__(self, label: str):
+        self.label = label
+        # 以標籤為鍵的子節點與父節點，查找為 O(1)，並保留加入順序
+        self.children: Dict[str, 'MergedNode'] = {}
+        self.parents: Dict[str, 'MergedNode'] = {}
+        self.sources: Set[str] = set()
+
+    def __repr__(self) -> str:
+        return f"MergedNode({self.label!r})"
+
+
+def _label_of(node: Any) -> str:
+    if isinstance(node, dict):
+        return node['name']
+    if hasattr(node, 'val'):
+        return node.val
+    return node.name
+
+
+def _children_of(node: Any) -> List[Any]:
+    if isinstance(node, dict):
+        return node.get('children', [])
+    return node.children
+
+
+class TreeMerger:
+    """一次合併任意多棵樹
+
+    節點以標籤識別，同一標籤出現在不同父節點下時會保留所有父節點，合併結果因此為 DAG。
+    每個節點記錄出現過的來源，可用來找出共同節點。樹可逐棵加入，不需要同時保留在記憶體中。
+    """
+
+    def __init__(self):
+        self.nodes: Dict[str, MergedNode] = {}
+        self.sources: List[str] = []
+
+    def _node(self, label: str) -> MergedNode:
+        node = self.nodes.get(label)
+        if node is None:
+            node = self.nodes[label] = MergedNode(label)
+        return node
+
+    def _register_source(self, source: Optional[str]) -> str:
+        if source is None:
+            source = f"tree{len(self.sources) + 1}"
+        if source not in self.sources:
+            self.sources.append(source)
+        return source
+
+    def add_node(self, label: str, parent: Optional[str], source: str) -> MergedNode:
+        node = self._node(label)
+        node.sources.add(source)
+        if parent is not None and parent != label:
+            parent_node = self._node(parent)
+            parent_node.children.setdefault(label, node)
+            node.parents.setdefault(parent, parent_node)
+        return node
+
+    def add_tree(self, root: Any, source: Optional[str] = None,
+                 label_of: Callable[[Any], str] = _label_of,
+                 children_of: Callable[[Any], List[Any]] = _children_of) -> str:
+        """加入一棵樹 (TreeNode、ConceptNode 或 tree_to_dict 格式)，回傳來源名稱"""
+        source = self._register_source(source)
+        if root is None:
+            return source
+        stack: List[Tuple[Any, Optional[str]]] = [(root, None)]
+        while stack:
+            node, parent = stack.pop()
+            label = label_of(node)
+            self.add_node(label, parent, source)
+            for child in reversed(children_of(node)):
+                stack.append((child, label))
+        return source
+
+    def add_events(self, events: Iterable[Tuple[int, str]], source: Optional[str] = None) -> str:
+        """以 (深度, 標籤) 事件串流加入一棵樹，不需要先建立節點物件"""
+        source = self._register_source(source)
+        path: List[str] = []
+        for depth, label in events:
+            del path[depth:]
+            self.add_node(label, path[-1] if path else None, source)
+            path.append(label)
+        return source
+
+    def add_trees(self, trees: Iterable[Any], sources: Optional[Iterable[str]] = None) -> None:
+        sources = iter(sources) if sources is not None else None
+        for tree in trees:
+            self.add_tree(tree, next(sources) if sources is not None else None)
+
+    def roots(self) -> List[MergedNode]:
+        return [node for node in self.nodes.values() if not node.parents]
+
+    def is_dag(self) -> bool:
+        """是否有節點出現在多個父節點之下"""
+        return any(len(node.parents) > 1 for node in self.nodes.values())
+
+    def provenance(self, label: str) -> Set[str]:
+        node = self.nodes.get(label)
+        return set(node.sources) if node else set()
+
+    def common_nodes(self, min_sources: int = 2) -> Set[str]:
+        """出現在至少 min_sources 個來源中的節點"""
+        return {label for label, node in self.nodes.items() if len(node.sources) >= min_sources}
+
+    def walk(self, root: MergedNode, expand_shared: bool = False) -> Iterator[Tuple[int, MergedNode]]:
+        """前序走訪 (深度, 節點)
+
+        expand_shared 為 False 時，共用節點的子樹只在第一次出現時展開，之後只輸出節點本身。
+        """
+        expanded: Set[str] = set()
+        # 目前的祖先路徑，用來避免來源樹之間互相矛盾造成的循環
+        path: List[str] = []
+        on_path: Set[str] = set()
+        stack: List[Tuple[int, MergedNode]] = [(0, root)]
+        while stack:
+            depth, node = stack.pop()
+            while len(path) > depth:
+                on_path.discard(path.pop())
+            yield depth, node
+            if not expand_shared and node.label in expanded:
+                continue
+            expanded.add(node.label)
+            path.append(node.label)
+            on_path.add(node.label)
+            for child in reversed(list(node.children.values())):
+                if child.label not in on_path:
+                    stack.append((depth + 1, child))
+
+    def to_tree(self, root: Optional[MergedNode] = None, node_factory: Callable[[str], Any] = None,
+                expand_shared: bool = False) -> Any:
+        """將合併結果展開成樹，node_factory 建立具有 children 屬性的節點"""
+        if root is None:
+            roots = self.roots()
+            if not roots:
+                return None
+            root = roots[0]
+        if node_factory is None:
+            return self.to_dict(root, expand_shared)
+
+        built: List[Any] = []
+        for depth, node in self.walk(root, expand_shared):
+            item = node_factory(node.label)
+            del built[depth:]
+            if built:
+                built[-1].children.append(item)
+            built.append(item)
+        return built[0]
+
+    def to_dict(self, root: MergedNode, expand_shared: bool = False) -> Dict[str, Any]:
+        """輸出 tree_to_dict 格式"""
+        built: List[Dict[str, Any]] = []
+        for depth, node in self.walk(root, expand_shared):
+            item = {'name': node.label, 'level': depth, 'children': []}
+            del built[depth:]
+            if built:
+                built[-1]['children'].append(item)
+            built.append(item)
+        return built[0]
+
+
+def merge_trees(trees: Iterable[Any], sources: Optional[Iterable[str]] = None) -> TreeMerger:
+    """合併多棵樹並回傳 TreeMerger"""
+    merger = TreeMerger()
+    merger.add_trees(trees, sources)
+    return merger
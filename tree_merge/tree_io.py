@@ -0,0 +1,115 @@
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple, Union
+
+try:
+    from .merger import TreeMerger, _children_of, _label_of
+except ImportError:
+    # 以腳本方式在 tree_merge 目錄下執行時
+    from merger import TreeMerger, _children_of, _label_of
+
+INDENT_WIDTH = 4
+WRITE_BUFFER_LINES = 8192
+
+PathLike = Union[str, Path]
+
+
+def iter_indented(filename: PathLike, indent_width: int = INDENT_WIDTH) -> Iterator[Tuple[int, str]]:
+    """逐行讀取縮排格式的樹，產生 (深度, 標籤) 事件
+
+    深度依實際的父節點計算，縮排跳級時會接在最近一個較淺的節點之下。
+    除了目前路徑上的縮排層級之外不保留任何資料。
+    """
+    levels: List[int] = []
+    with open(filename, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip()
+            label = line.lstrip()
+            if not label:
+                continue
+            level = (len(line) - len(label)) // indent_width
+            while levels and levels[-1] >= level:
+                levels.pop()
+            yield len(levels), label
+            levels.append(level)
+
+
+def build_tree(events: Iterable[Tuple[int, str]], node_factory: Callable[[str], Any]) -> Optional[Any]:
+    """以事件串流建立樹，node_factory 建立具有 children 屬性的節點，只保留第一棵樹"""
+    path: List[Any] = []
+    for depth, label in events:
+        if depth == 0 and path:
+            break
+        node = node_factory(label)
+        del path[depth:]
+        if path:
+            path[-1].children.append(node)
+        path.append(node)
+    return path[0] if path else None
+
+
+def read_tree(filename: PathLike, node_factory: Callable[[str], Any],
+              indent_width: int = INDENT_WIDTH) -> Optional[Any]:
+    """從文件中讀取樹結構"""
+    return build_tree(iter_indented(filename, indent_width), node_factory)
+
+
+def iter_tree(root: Any, label_of: Callable[[Any], str] = _label_of,
+              children_of: Callable[[Any], List[Any]] = _children_of) -> Iterator[Tuple[int, str]]:
+    """前序走訪樹，產生 (深度, 標籤) 事件"""
+    if root is None:
+        return
+    stack = [(0, root)]
+    while stack:
+        depth, node = stack.pop()
+        yield depth, label_of(node)
+        for child in reversed(children_of(node)):
+            stack.append((depth + 1, child))
+
+
+def write_events(events: Iterable[Tuple[int, str]], filename: PathLike,
+                 indent_width: int = INDENT_WIDTH, buffer_lines: int = WRITE_BUFFER_LINES) -> int:
+    """將 (深度, 標籤) 事件寫成縮排格式，累積一批行後一次寫入，回傳寫入的行數"""
+    unit = " " * indent_width
+    indents: List[str] = [""]
+    buffer: List[str] = []
+    count = 0
+    with open(filename, 'w', encoding='utf-8') as f:
+        for depth, label in events:
+            while len(indents) <= depth:
+                indents.append(indents[-1] + unit)
+            buffer.append(f"{indents[depth]}{label}\n")
+            if len(buffer) >= buffer_lines:
+                f.writelines(buffer)
+                count += len(buffer)
+                buffer.clear()
+        f.writelines(buffer)
+        count += len(buffer)
+    return count
+
+
+def write_tree(root: Any, filename: PathLike, indent_width: int = INDENT_WIDTH) -> int:
+    """將樹結構保存到文件中"""
+    return write_events(iter_tree(root), filename, indent_width)
+
+
+def merge_files(filenames: Iterable[PathLike], merger: Optional[TreeMerger] = None,
+                indent_width: int = INDENT_WIDTH) -> TreeMerger:
+    """直接由檔案串流合併多棵樹，來源名稱為檔名"""
+    merger = merger or TreeMerger()
+    for filename in filenames:
+        merger.add_events(iter_indented(filename, indent_width), Path(filename).name)
+    return merger
+
+
+def write_merged(merger: TreeMerger, filename: PathLike, root: Optional[str] = None,
+                 expand_shared: bool = False, indent_width: int = INDENT_WIDTH) -> int:
+    """將合併結果寫成縮排格式，未指定根節點時使用第一個根節點"""
+    if root is None:
+        roots = merger.roots()
+        if not roots:
+            return write_events((), filename, indent_width)
+        start = roots[0]
+    else:
+        start = merger.nodes[root]
+    events = ((depth, node.label) for depth, node in merger.walk(start, expand_shared))
+    return write_events(events, filename, indent_width)
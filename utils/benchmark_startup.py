@@ -0,0 +1,74 @@
+from pathlib import Path
+import argparse
+import subprocess
+import sys
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+# 各入口與常用模組，逐一在新的 Python 程序中匯入
+DEFAULT_MODULES = [
+    'config',
+    'cache.cache_manager',
+    'ner.entity_filter',
+    'ner.ner_processor',
+    'knowledge_bases.wikidata_client',
+    'knowledge_bases.concept_tree_manager',
+    'tree_merge.tree_io',
+    'clean_empty_cache',
+    'main',
+]
+
+_TIMER = "import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+
+
+def measure_import(module, repeat=5):
+    """在新程序中匯入模組，回傳最短的匯入時間 (秒)"""
+    timings = []
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, '-c', _TIMER.format(module=module)],
+                                cwd=PROJECT_ROOT, capture_output=True, text=True)
+        if result.returncode != 0:
+            error = result.stderr.strip().splitlines()
+            raise RuntimeError(error[-1] if error else f"匯入失敗: {module}")
+        timings.append(float(result.stdout.strip().splitlines()[-1]))
+    return min(timings)
+
+
+def slowest_imports(module, top=10):
+    """以 -X importtime 找出匯入時累計耗時最多的模組，回傳 [(秒, 模組)]"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=PROJECT_ROOT, capture_output=True, text=True)
+    entries = []
+    for line in result.stderr.splitlines():
+        # 格式: "import time: self [us] | cumulative | imported package"
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split('|', 2)
+        if name.strip() != module:
+            entries.append((int(cumulative) / 1e6, name.strip()))
+    return sorted(entries, reverse=True)[:top]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Measure import time of the entry points in fresh interpreters')
+    parser.add_argument('modules', nargs='*', default=DEFAULT_MODULES, help='Modules to import')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per module; the fastest is reported')
+    parser.add_argument('--budget', type=float, default=1.0, help='Seconds; modules above it are flagged')
+    parser.add_argument('--top', type=int, default=0, help='Also list the N slowest nested imports of each module')
+    args = parser.parse_args()
+
+    over_budget = 0
+    for module in args.modules:
+        try:
+            seconds = measure_import(module, args.repeat)
+        except RuntimeError as e:
+            print(f"{module:<40} 失敗: {e}")
+            over_budget += 1
+            continue
+        flag = '' if seconds <= args.budget else '  (超過預算)'
+        over_budget += seconds > args.budget
+        print(f"{module:<40} {seconds * 1000:8.1f} ms{flag}")
+        for cumulative, name in slowest_imports(module, args.top) if args.top else []:
+            print(f"    {name:<36} {cumulative * 1000:8.1f} ms")
+
+    sys.exit(1 if over_budget else 0)
@@ -0,0 +1,42 @@
+from pathlib import Path
+import argparse
+import time
+import sys
+
+# 可以用 python utils/build_local_index.py 直接執行，此時專案根目錄不在 sys.path 中
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from config import LOCAL_INDEX_PATH, LABEL_INDEX_PATH
+from knowledge_bases.label_index import LabelIndex
+from knowledge_bases.local_index import HierarchyIndexBuilder
+
+def build_local_index(dumps, output: Path = LOCAL_INDEX_PATH, label_output: Path = LABEL_INDEX_PATH):
+    """從 Wikidata/DBpedia dump 建立離線上下位索引"""
+    start = time.time()
+    builder = HierarchyIndexBuilder()
+    for dump in dumps:
+        print(f"讀取 {dump}")
+        builder.add_dump(dump)
+    
+    index = builder.build()
+    index.save(output)
+    print(f"已建立 {len(index)} 個節點的索引: {output} ({time.time() - start:.1f} 秒)")
+    
+    if label_output:
+        label_index = LabelIndex.from_hierarchy_index(index)
+        label_index.save(label_output)
+        print(f"已建立 {len(label_index)} 個標籤的標籤索引: {label_output}")
+    return index
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Build the offline hierarchy index from dump files')
+    parser.add_argument('dumps', nargs='+', type=Path,
+                        help='Wikidata JSON (.json/.jsonl) or N-Triples (.nt) dumps, optionally .gz/.bz2 compressed')
+    parser.add_argument('--output', type=Path, default=LOCAL_INDEX_PATH, help='Index file to write')
+    parser.add_argument('--label-output', type=Path, default=LABEL_INDEX_PATH, help='Label index file to write')
+    parser.add_argument('--no-labels', action='store_true', help='Skip building the label index')
+    args = parser.parse_args()
+    
+    build_local_index(args.dumps, args.output, None if args.no_labels else args.label_output)
@@ -0,0 +1,42 @@
+from pathlib import Path
+import argparse
+import sys
+
+# 可以用 python utils/build_synonyms.py 直接執行，此時專案根目錄不在 sys.path 中
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from config import LOCAL_INDEX_PATH, SYNONYMS_PATH
+from knowledge_bases.local_index import HierarchyIndex
+from knowledge_bases.synonym_index import SynonymIndex
+
+def build_synonyms(output, index_path=None, harvest=None):
+    """合併現有同義詞表、離線索引的別名與 Wikidata altLabel，寫入 output"""
+    synonyms = SynonymIndex.load_if_exists(output)
+    before = len(synonyms)
+    
+    if index_path:
+        synonyms.merge(SynonymIndex.from_hierarchy_index(HierarchyIndex.load(index_path)))
+        print(f"已由離線索引加入別名: {index_path}")
+    
+    if harvest:
+        # 延後匯入，只使用離線索引時不需要 SPARQL 客戶端
+        from knowledge_bases.wikidata_client import WikidataClient
+        client = WikidataClient(synonym_index=synonyms)
+        added = client.harvest_synonyms(harvest)
+        print(f"已由 Wikidata altLabel 取得 {added} 個別名")
+    
+    synonyms.save(output)
+    print(f"同義詞表共 {len(synonyms)} 組 (新增 {len(synonyms) - before} 組): {output}")
+    return synonyms
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Build the synonym table used to canonicalize entity names before querying')
+    parser.add_argument('--output', type=Path, default=SYNONYMS_PATH, help='Synonym JSON file to update')
+    parser.add_argument('--from-index', nargs='?', type=Path, const=LOCAL_INDEX_PATH, default=None,
+                        help='Add label/alias groups from the offline hierarchy index')
+    parser.add_argument('--harvest', nargs='+', metavar='TERM', help='Fetch skos:altLabel aliases of these terms from Wikidata')
+    args = parser.parse_args()
+    
+    build_synonyms(args.output, args.from_index, args.harvest)
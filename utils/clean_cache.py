@@ -1,77 +1,56 @@
-import json
-import os
 from pathlib import Path
 import argparse
+import sys
 
-def clean_cache(preview=False):
-    # 取得 cache 目錄路徑
-    cache_dir = Path('data/cache')
-    
-    # 確保目錄存在
-    if not cache_dir.exists():
-        print("Cache directory not found")
-        return
-    
-    # 計數器
-    removed = 0
-    processed = 0
-    
-    # 遍歷所有 json 檔案
-    for file_path in cache_dir.glob('*.json'):
-        processed += 1
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                
-            # 檢查是否缺少 'value' key
-            if 'value' not in data:
-                if preview:
-                    print(f"Would remove: {file_path.name}")
-                else:
-                    file_path.unlink()
-                    print(f"Removed: {file_path.name}")
-                removed += 1
-                
-        except (json.JSONDecodeError, KeyError) as e:
-            print(f"Error processing {file_path.name}: {str(e)}")
-            
-    print(f"\nProcessed {processed} files")
-    print(f"{'Would remove' if preview else 'Removed'} {removed} files")
+# 與舊版相同可以用 python utils/clean_cache.py 直接執行，此時專案根目錄不在 sys.path 中
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from config import CACHE_BACKEND, CACHE_DIR, CACHE_MAX_BYTES, CACHE_MAX_ENTRIES, CACHE_SCAN_WORKERS
+from cache.backends import create_backend
+from cache.maintenance import create_maintainer
 
-def clean_empty_cache():
-    """清理空的快取檔案"""
-    cache_dir = Path('data/cache')
+def clean_cache(cache_dir: Path = CACHE_DIR, backend: str = CACHE_BACKEND, preview: bool = False,
+                expired: bool = True, empty: bool = False, corrupt: bool = True,
+                max_bytes=CACHE_MAX_BYTES, max_entries=CACHE_MAX_ENTRIES,
+                compact: bool = False, workers: int = CACHE_SCAN_WORKERS):
+    """清除過期、空結果與損毀的快取，並依配額淘汰最久未使用的項目"""
+    cache_dir = Path(cache_dir)
     if not cache_dir.exists():
-        print("快取目錄不存在")
-        return
-    
-    cleaned_count = 0
-    for file_path in cache_dir.glob('*.json'):
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                
-            # 檢查是否為空結果
-            if (isinstance(data, dict) and 
-                'results' in data and 
-                'bindings' in data['results'] and 
-                len(data['results']['bindings']) == 0):
-                
-                # 刪除檔案
-                file_path.unlink()
-                cleaned_count += 1
-                print(f"已刪除空快取: {file_path.name}")
-                
-        except (json.JSONDecodeError, KeyError) as e:
-            print(f"處理檔案 {file_path.name} 時發生錯誤: {str(e)}")
-            continue
-    
-    print(f"\n清理完成! 共刪除 {cleaned_count} 個空快取檔案")
+        print(f"快取目錄不存在: {cache_dir}")
+        return None
+
+    maintainer = create_maintainer(create_backend(backend, cache_dir), max_bytes=max_bytes,
+                                   max_entries=max_entries, workers=workers)
+    report = maintainer.sweep(expired=expired, empty=empty, corrupt=corrupt, compact=compact, dry_run=preview)
+    if preview:
+        for label, keys in (('過期', report.expired), ('空結果', report.empty),
+                            ('損毀', report.corrupt), ('超出配額', report.evicted)):
+            for key in keys:
+                print(f"將刪除 ({label}): {key}")
+    print(report.summary())
+    return report
+
+def clean_empty_cache(cache_dir: Path = CACHE_DIR, backend: str = CACHE_BACKEND):
+    """清理空的快取項目"""
+    return clean_cache(cache_dir, backend, expired=False, empty=True, corrupt=False,
+                       max_bytes=None, max_entries=None)
 
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description='Clean cache files')
-    parser.add_argument('--preview', action='store_true', help='Preview files to be removed without actually removing them')
+    parser = argparse.ArgumentParser(description='Sweep expired, empty and corrupt cache entries and enforce size quotas')
+    parser.add_argument('--cache-dir', type=Path, default=CACHE_DIR, help='Cache directory')
+    parser.add_argument('--backend', choices=('json', 'sqlite'), default=CACHE_BACKEND, help='Cache backend')
+    parser.add_argument('--preview', action='store_true', help='Preview entries to be removed without actually removing them')
+    parser.add_argument('--empty', action='store_true', help='Also remove cached results without bindings')
+    parser.add_argument('--keep-expired', action='store_true', help='Do not remove expired entries')
+    parser.add_argument('--keep-corrupt', action='store_true', help='Do not remove unreadable entries')
+    parser.add_argument('--max-bytes', type=int, default=CACHE_MAX_BYTES, help='Evict least recently used entries above this total size')
+    parser.add_argument('--max-entries', type=int, default=CACHE_MAX_ENTRIES, help='Evict least recently used entries above this count')
+    parser.add_argument('--compact', action='store_true', help='Rewrite legacy JSON files / release free SQLite pages after sweeping')
+    parser.add_argument('--workers', type=int, default=CACHE_SCAN_WORKERS, help='Parallel scan threads (JSON backend)')
     args = parser.parse_args()
-    
-    clean_cache(preview=args.preview)
-    clean_empty_cache()
\ No newline at end of file
+
+    clean_cache(args.cache_dir, args.backend, preview=args.preview, expired=not args.keep_expired,
+                empty=args.empty, corrupt=not args.keep_corrupt, max_bytes=args.max_bytes,
+                max_entries=args.max_entries, compact=args.compact, workers=args.workers)
@@ -0,0 +1,113 @@
+from collections import deque
+from typing import Dict, Iterable, List, Mapping, Optional, Set, Tuple
+
+
+class KeywordMatcher:
+    """Aho-Corasick 多關鍵詞比對器，建立一次後以單次線性掃描找出文字中的所有關鍵詞
+
+    關鍵詞可以分屬多個類別，類別依建立時的順序排列。
+    """
+
+    def __init__(self, keywords: Iterable[str] = (), categories: Optional[Mapping[str, Iterable[str]]] = None):
+        self.keywords: List[str] = []
+        self.categories: List[str] = []
+        # 關鍵詞編號 -> 所屬類別編號
+        self._keyword_categories: List[Set[int]] = []
+        self._keyword_ids: Dict[str, int] = {}
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # 狀態 -> 在此結束的關鍵詞編號 (包含沿失敗連結可達的關鍵詞)
+        self._output: List[Tuple[int, ...]] = [()]
+
+        for keyword in keywords:
+            self._add(keyword)
+        for category, category_keywords in (categories or {}).items():
+            category_id = len(self.categories)
+            self.categories.append(category)
+            for keyword in category_keywords:
+                self._keyword_categories[self._add(keyword)].add(category_id)
+        self._build()
+
+    @classmethod
+    def from_categories(cls, categories: Mapping[str, Iterable[str]]) -> 'KeywordMatcher':
+        return cls(categories=categories)
+
+    def _add(self, keyword: str) -> int:
+        if not keyword:
+            raise ValueError("關鍵詞不可為空字串")
+        keyword_id = self._keyword_ids.get(keyword)
+        if keyword_id is not None:
+            return keyword_id
+        keyword_id = len(self.keywords)
+        self._keyword_ids[keyword] = keyword_id
+        self.keywords.append(keyword)
+        self._keyword_categories.append(set())
+
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(())
+            state = next_state
+        self._output[state] += (keyword_id,)
+        return keyword_id
+
+    def _build(self) -> None:
+        """以廣度優先順序建立失敗連結，並合併失敗連結上的輸出"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] += self._output[self._fail[next_state]]
+
+    def _scan(self, text: str):
+        goto = self._goto
+        fail = self._fail
+        output = self._output
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state]:
+                yield position, output[state]
+
+    def find_all(self, text: str) -> List[Tuple[int, int, str]]:
+        """回傳所有出現位置 [(start, end, 關鍵詞)]，可重疊"""
+        found = []
+        for position, keyword_ids in self._scan(text):
+            for keyword_id in keyword_ids:
+                keyword = self.keywords[keyword_id]
+                found.append((position + 1 - len(keyword), position + 1, keyword))
+        return found
+
+    def matches(self, text: str) -> Set[str]:
+        """文字中出現的所有關鍵詞"""
+        return {self.keywords[keyword_id] for _, keyword_ids in self._scan(text) for keyword_id in keyword_ids}
+
+    def contains_any(self, text: str) -> bool:
+        for _ in self._scan(text):
+            return True
+        return False
+
+    def match_categories(self, text: str) -> List[str]:
+        """文字中出現的所有類別，依建立時的類別順序排列"""
+        category_ids = set()
+        for _, keyword_ids in self._scan(text):
+            for keyword_id in keyword_ids:
+                category_ids.update(self._keyword_categories[keyword_id])
+        return [self.categories[category_id] for category_id in sorted(category_ids)]
+
+    def first_category(self, text: str) -> Optional[str]:
+        """依建立時順序第一個出現的類別"""
+        categories = self.match_categories(text)
+        return categories[0] if categories else None
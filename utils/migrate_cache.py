@@ -0,0 +1,180 @@
+import hashlib
+import json
+import re
+import sys
+import time
+from pathlib import Path
+import argparse
+
+# 可以用 python utils/migrate_cache.py 直接執行，此時專案根目錄不在 sys.path 中
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from config import CACHE_DIR, CACHE_EXPIRY, SYNONYMS_PATH
+from cache.backends import SQLiteBackend
+
+# 舊版 WikidataClient 以實體名稱的 md5 為鍵值，變數名稱為 related / relatedLabel
+LEGACY_WIKIDATA_FILE = re.compile(r'wikidata_(broader|narrower)_([0-9a-f]{32})')
+LEGACY_WIKIDATA_VARIABLES = {'related': 'item', 'relatedLabel': 'itemLabel'}
+# 用來比對舊檔案鍵值的實體名稱來源
+NAME_SOURCES = (
+    PROJECT_ROOT / 'data' / 'ner' / 'ner_results.json',
+    PROJECT_ROOT / 'data' / 'trees' / 'concept_trees.json',
+    SYNONYMS_PATH,
+)
+
+def iter_json_cache_records(cache_dir: Path, skip_expired: bool = True):
+    """讀取舊格式的 JSON 快取檔案，產生 (key, value, timestamp, ttl)"""
+    now = time.time()
+    for file_path in cache_dir.glob('*.json'):
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (json.JSONDecodeError, OSError) as e:
+            print(f"無法讀取 {file_path.name}: {str(e)}")
+            continue
+
+        if isinstance(data, dict) and 'timestamp' in data and 'data' in data:
+            timestamp = data['timestamp']
+            ttl = data.get('ttl', CACHE_EXPIRY)
+            value = data['data']
+        else:
+            # 直接存放查詢結果的舊檔案，以修改時間作為寫入時間
+            timestamp = file_path.stat().st_mtime
+            ttl = CACHE_EXPIRY
+            value = data
+
+        if skip_expired and now > timestamp + ttl:
+            continue
+
+        yield file_path, (file_path.stem, value, timestamp, ttl)
+
+def migrate_cache(source_dir: Path, db_path: Path, batch_size: int = 1000,
+                  skip_expired: bool = True, delete_source: bool = False):
+    """將 JSON 快取檔案匯入 SQLite 後端"""
+    backend = SQLiteBackend(db_path)
+    migrated = 0
+    batch = []
+    migrated_files = []
+
+    def flush():
+        nonlocal migrated
+        backend.set_many(batch)
+        migrated += len(batch)
+        if delete_source:
+            for path in migrated_files:
+                path.unlink(missing_ok=True)
+        batch.clear()
+        migrated_files.clear()
+
+    for file_path, record in iter_json_cache_records(source_dir, skip_expired):
+        batch.append(record)
+        migrated_files.append(file_path)
+        if len(batch) >= batch_size:
+            flush()
+
+    if batch:
+        flush()
+
+    backend.close()
+    print(f"已匯入 {migrated} 筆快取到 {db_path}")
+    return migrated
+
+def _collect_strings(data, names: set) -> None:
+    """收集 NER 結果、概念樹與同義詞表中所有的字串，多出的字串只是不會對應到任何檔案"""
+    stack = [data]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            names.add(item)
+            # 建樹前會去掉括號內的說明
+            names.add(re.sub(r'\([^)]*\)', '', item).strip())
+        elif isinstance(item, dict):
+            stack.extend(item)
+            stack.extend(item.values())
+        elif isinstance(item, list):
+            stack.extend(item)
+
+def load_entity_names(paths) -> set:
+    names = set()
+    for path in paths:
+        path = Path(path)
+        if not path.exists():
+            continue
+        if path.suffix == '.json':
+            with open(path, 'r', encoding='utf-8') as f:
+                _collect_strings(json.load(f), names)
+        else:
+            with open(path, 'r', encoding='utf-8') as f:
+                names.update(line.strip() for line in f if line.strip())
+    names.discard('')
+    return names
+
+def _legacy_to_current(results):
+    """將舊版結果的 related / relatedLabel 換成目前查詢使用的 item / itemLabel"""
+    head = results.get('head', {})
+    return {
+        'head': dict(head, vars=[LEGACY_WIKIDATA_VARIABLES.get(var, var) for var in head.get('vars', [])]),
+        'results': {'bindings': [
+            {LEGACY_WIKIDATA_VARIABLES.get(var, var): term for var, term in binding.items()}
+            for binding in results.get('results', {}).get('bindings', [])
+        ]},
+    }
+
+def migrate_legacy_wikidata_cache(source_dir: Path, names, client=None,
+                                  skip_expired: bool = True, delete_source: bool = False):
+    """將舊版 wikidata_{broader,narrower}_<md5(名稱)> 快取改寫成目前查詢的快取鍵值
+
+    md5 無法還原名稱，只有出現在 names 中的實體能對應回查詢；寫入目前設定的快取後端並保留原本的寫入時間。
+    """
+    if client is None:
+        from knowledge_bases.wikidata_client import WikidataClient
+        client = WikidataClient()
+    by_hash = {hashlib.md5(name.encode('utf-8')).hexdigest(): name for name in names}
+
+    records = []
+    migrated_files = []
+    unmatched = 0
+    for file_path, (key, value, timestamp, ttl) in iter_json_cache_records(source_dir, skip_expired):
+        match = LEGACY_WIKIDATA_FILE.fullmatch(key)
+        if match is None:
+            continue
+        name = by_hash.get(match.group(2))
+        if name is None or not isinstance(value, dict):
+            unmatched += 1
+            continue
+        new_key, results, new_ttl = client.hierarchy_cache_record(name, match.group(1), _legacy_to_current(value))
+        # 舊檔案沒有記錄 ttl；查無結果時改用較短的有效期限，與目前的寫入方式相同
+        records.append((new_key, results, timestamp, min(ttl, new_ttl)))
+        migrated_files.append(file_path)
+
+    backend = client.cache_manager.backend
+    backend.set_many(records)
+    if delete_source:
+        for path in migrated_files:
+            path.unlink(missing_ok=True)
+    print(f"已改寫 {len(records)} 筆舊版 Wikidata 快取，{unmatched} 筆找不到對應的實體名稱")
+    return len(records)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Migrate JSON cache files into the SQLite cache backend')
+    parser.add_argument('--source', type=Path, default=CACHE_DIR, help='Directory containing *.json cache files')
+    parser.add_argument('--target', type=Path, default=CACHE_DIR / 'cache.sqlite3', help='SQLite database path')
+    parser.add_argument('--batch-size', type=int, default=1000, help='Number of entries written per transaction')
+    parser.add_argument('--include-expired', action='store_true', help='Also import entries that have already expired')
+    parser.add_argument('--delete', action='store_true', help='Delete JSON files after they are imported')
+    parser.add_argument('--legacy-wikidata', action='store_true',
+                        help='Re-key old wikidata_{broader,narrower}_<md5> files to the current query cache keys '
+                             'in the configured backend instead of importing into SQLite')
+    parser.add_argument('--names', type=Path, action='append', default=[],
+                        help='Extra JSON file or text file (one name per line) of entity names used to match '
+                             'legacy files; NER results, concept trees and synonyms are always used')
+    args = parser.parse_args()
+
+    if args.legacy_wikidata:
+        migrate_legacy_wikidata_cache(args.source, load_entity_names(list(NAME_SOURCES) + args.names),
+                                      skip_expired=not args.include_expired, delete_source=args.delete)
+    else:
+        migrate_cache(args.source, args.target, args.batch_size,
+                      skip_expired=not args.include_expired, delete_source=args.delete)
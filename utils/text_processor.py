@@ -0,0 +1,46 @@
+import re
+import unicodedata
+from functools import lru_cache
+
+# opencc 為選用套件，第一次轉換時才載入
+_converter = None
+_converter_loaded = False
+
+# 沒有安裝 opencc 時使用的簡轉繁對照，只涵蓋醫療與機構名稱常見的字
+_S2T_FALLBACK = str.maketrans(
+    '医疗诊肤师学术药护团机构会长业专门临产销营经务问顾国际东华湾卫这设协员证书检验养剂妆纹颜'
+    '龄级类质网电线发关复杂许让议论调厅楼层体预约优价钱费奖监处罚执资讯运动减皱艺荣获讲课创办总',
+    '醫療診膚師學術藥護團機構會長業專門臨產銷營經務問顧國際東華灣衛這設協員證書檢驗養劑妝紋顏'
+    '齡級類質網電線發關複雜許讓議論調廳樓層體預約優價錢費獎監處罰執資訊運動減皺藝榮獲講課創辦總',
+)
+
+_PARENTHETICAL = re.compile(r'\([^)]*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+
+def to_traditional(text: str) -> str:
+    """簡體轉繁體，優先使用 opencc"""
+    global _converter, _converter_loaded
+    if not _converter_loaded:
+        try:
+            from opencc import OpenCC
+            _converter = OpenCC('s2t')
+        except ImportError:
+            _converter = None
+        _converter_loaded = True
+    if _converter is not None:
+        return _converter.convert(text)
+    return text.translate(_S2T_FALLBACK)
+
+
+@lru_cache(maxsize=65536)
+def normalize_entity(text: str) -> str:
+    """實體名稱的正規化鍵值
+
+    全形轉半形 (NFKC)、移除括號內的補充說明 (與 ConceptTreeManager.build_trees 相同)、
+    簡體轉繁體並合併空白，不同寫法的同一實體會得到相同的鍵值。
+    """
+    text = unicodedata.normalize('NFKC', text)
+    text = _PARENTHETICAL.sub('', text)
+    text = to_traditional(text)
+    return _WHITESPACE.sub(' ', text).strip()
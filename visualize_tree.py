@@ -2,24 +2,45 @@ import json
 from graphviz import Digraph
 from pathlib import Path
 import re
+import sys
+from knowledge_bases.tree_store import TreeStoreReader
 
 def clean_name(name):
     """清理名稱，移除特殊字符"""
     return re.sub(r'[^\w\s-]', '', name)
 
-def create_tree_visualization(output_path='visualization'):
+def iter_trees(binary_path='data/trees/concept_trees.bin', category=None, entity=None):
+    """依序產生 (類別, 概念, 樹)，優先使用二進位檔，只解碼需要的樹"""
+    with TreeStoreReader(binary_path) as reader:
+        categories = [category] if category else reader.categories()
+        for current in categories:
+            entities = [entity] if entity else reader.entities(current)
+            for name in entities:
+                tree = reader.tree(current, name)
+                if tree:
+                    yield current, name, tree
+
+def create_tree_visualization(output_path='visualization', category=None, entity=None):
     """創建概念樹的視覺化圖形"""
     
-    # 讀取 JSON 數據
-    try:
-        with open('data/trees/concept_trees.json', 'r', encoding='utf-8') as f:
-            data = json.load(f)
-    except FileNotFoundError:
-        print("錯誤: 找不到 data/trees/concept_trees.json 檔案")
-        return
-    except json.JSONDecodeError:
-        print("錯誤: JSON 檔案格式不正確")
-        return
+    if Path('data/trees/concept_trees.bin').exists():
+        trees = iter_trees(category=category, entity=entity)
+    else:
+        # 讀取 JSON 數據
+        try:
+            with open('data/trees/concept_trees.json', 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            print("錯誤: 找不到 data/trees/concept_trees.json 檔案")
+            return
+        except json.JSONDecodeError:
+            print("錯誤: JSON 檔案格式不正確")
+            return
+        trees = (
+            (current, name, tree)
+            for current, category_data in data.items() if not category or current == category
+            for name, tree in category_data.items() if not entity or name == entity
+        )
     
     # 確保輸出目錄存在
     Path(output_path).mkdir(parents=True, exist_ok=True)
@@ -55,35 +76,38 @@ def create_tree_visualization(output_path='visualization'):
         for i, child in enumerate(node.get('children', [])):
             add_nodes(dot, child, current_id, f"{prefix}_{i}")
     
-    # 為每個主要類別創建單獨的圖
-    for category, category_data in data.items():
-        print(f"\n處理類別: {category}")
+    # 為每個概念樹創建單獨的圖
+    current_category = None
+    for tree_category, concept, tree in trees:
+        if tree_category != current_category:
+            current_category = tree_category
+            print(f"\n處理類別: {tree_category}")
+        
+        print(f"  生成概念樹: {concept}")
+        
+        # 創建新的圖形
+        dot = Digraph(comment=f'{tree_category} - {concept}')
+        dot.attr(rankdir='TB')  # 從上到下的布局
+        
+        # 設定圖形屬性
+        dot.attr('node', 
+                shape='box',
+                style='rounded',
+                fontname='Microsoft JhengHei')  # 使用正黑體
+        
+        # 添加所有節點
+        add_nodes(dot, tree)
         
-        for concept, tree in category_data.items():
-            print(f"  生成概念樹: {concept}")
-            
-            # 創建新的圖形
-            dot = Digraph(comment=f'{category} - {concept}')
-            dot.attr(rankdir='TB')  # 從上到下的布局
-            
-            # 設定圖形屬性
-            dot.attr('node', 
-                    shape='box',
-                    style='rounded',
-                    fontname='Microsoft JhengHei')  # 使用正黑體
-            
-            # 添加所有節點
-            add_nodes(dot, tree)
-            
-            # 保存圖形
-            output_file = f"{output_path}/{category}_{clean_name(concept)}"
-            try:
-                dot.render(output_file, format='png', cleanup=True)
-                print(f"    已生成圖形: {output_file}.png")
-            except Exception as e:
-                print(f"    生成圖形時發生錯誤: {str(e)}")
+        # 保存圖形
+        output_file = f"{output_path}/{tree_category}_{clean_name(concept)}"
+        try:
+            dot.render(output_file, format='png', cleanup=True)
+            print(f"    已生成圖形: {output_file}.png")
+        except Exception as e:
+            print(f"    生成圖形時發生錯誤: {str(e)}")
 
 if __name__ == "__main__":
     print("開始生成概念樹視覺化...")
-    create_tree_visualization()
+    # 可指定類別與概念，只繪製單一概念樹
+    create_tree_visualization('visualization', *sys.argv[1:3])
     print("\n完成!")
\ No newline at end of file